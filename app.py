@@ -3,16 +3,12 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 from PIL import Image
-import pytesseract
-import pdf2image
 import io
-import re
 import json
 import os
 from datetime import datetime
-import base64
-from typing import Dict, List, Tuple, Optional
-import hashlib
+from typing import Dict, Iterator, List, Tuple, Optional
+import time
 # Configure poppler path for different environments
 import os
 if os.path.exists("/usr/bin/pdftoppm"):
@@ -21,51 +17,12 @@ elif os.path.exists("/usr/local/bin/pdftoppm"):
     os.environ["PATH"] += os.pathsep + "/usr/local/bin"
     
 
-# FIXED: Updated langchain imports for newer versions
-# FIXED: Updated langchain imports for newer versions
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-    from langchain_community.vectorstores import FAISS
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-    from langchain.chains import RetrievalQA
-    from langchain.prompts import PromptTemplate
-except ImportError:
-    try:
-        from langchain.embeddings import HuggingFaceEmbeddings
-        from langchain.vectorstores import FAISS
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-        from langchain.chains import RetrievalQA
-        from langchain.prompts import PromptTemplate
-    except ImportError:
-        # Fallback if langchain not installed
-        HuggingFaceEmbeddings = None
-        FAISS = None
-        RecursiveCharacterTextSplitter = None
-        RetrievalQA = None
-        PromptTemplate = None
-
-        FAISS = None
-        RecursiveCharacterTextSplitter = None
-        RetrievalQA = None
-        PromptTemplate = None
-
-
-try:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-except ImportError:
-    try:
-        from langchain.schema.document import Document
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-    except ImportError:
-        from langchain_core.documents import Document
-        from langchain_text_splitters import RecursiveCharacterTextSplitter
+# Process start, shared across reruns; used to report time to first render
+@st.cache_resource
+def get_startup_timings():
+    return {'started': time.perf_counter(), 'first_render': None}
 
-try:
-    from langchain.chains import RetrievalQA
-    from langchain.prompts import PromptTemplate
-except ImportError:
-    RetrievalQA = None
-    PromptTemplate = None
+startup_timings = get_startup_timings()
 
 # Configure page
 st.set_page_config(
@@ -81,31 +38,19 @@ if 'parsed_values' not in st.session_state:
 if 'correction_mode' not in st.session_state:
     st.session_state.correction_mode = False
 if 'analysis_history' not in st.session_state:
+    # Ids of reports this session saved to the result store (most recent last)
     st.session_state.analysis_history = []
 if 'current_category' not in st.session_state:
     st.session_state.current_category = "all"
-def extract_text_from_document(uploaded_file):
-    """Extract text from various document formats"""
-    text = ""
-    try:
-        if uploaded_file.type == "application/pdf":
-            try:
-                images = pdf2image.convert_from_bytes(uploaded_file.read())
-                for img in images:
-                    text += pytesseract.image_to_string(img) + "\n"
-            except Exception as pdf_error:
-                if "poppler" in str(pdf_error).lower() or "page count" in str(pdf_error).lower():
-                    st.error("⚠️ PDF processing requires poppler. Please enter values manually or upload an image.")
-                    return ""
-                raise pdf_error
-        else:
-            image = Image.open(uploaded_file)
-            text = pytesseract.image_to_string(image)
-        return text
-    except Exception as e:
-        st.error(f"Error processing document: {str(e)}")
-        return ""
-        
+if 'analysis_memo' not in st.session_state:
+    st.session_state.analysis_memo = None
+if 'ocr_jobs' not in st.session_state:
+    # This session's background extraction jobs: active ones plus the most recent finished
+    st.session_state.ocr_jobs = []
+if 'profile_capture' not in st.session_state:
+    # Running ProfileCapture of this session's Extract -> Analyze cycle
+    st.session_state.profile_capture = None
+    st.session_state.profile_metadata = {}
 # Custom CSS
 st.markdown("""
 <style>
@@ -219,200 +164,342 @@ st.markdown("""
 
 # Import reference data
 from medical_reference import REFERENCE_RANGES, TEST_CATEGORIES, CRITICAL_VALUES
+from lab_parser import merge_lab_values, parse_lab_values
+from reference_engine import reference_bounds, CATEGORY_INDEX, CATEGORY_ORDER, OTHER_CATEGORY
+from ocr_cache import OCRCache
+from ocr_pipeline import ocr_image, iter_pdf_text
+from image_preprocessing import PREPROCESS_STEPS
+from memo import LRUMemo, stable_hash
+from rule_engine import RULE_ENGINE
+from telemetry import TELEMETRY, start_metrics_server
+from profiling import PROFILE_DIR, ProfileCapture, document_fingerprint
+from ocr_jobs import OCRJobQueue
+from result_store import ResultStore, to_timestamp
+from delta_engine import patient_trends
 
-# Initialize RAG system with error handling
+# Initialize RAG system with error handling. The embedding model and index load
+# on a background thread, so rule-based analysis is usable while RAG warms up.
 @st.cache_resource
 def get_rag_system():
+    if os.environ.get("MEDLAB_RAG", "1") == "0":
+        return None
     try:
         from rag_components import MedLabRAG
-        return MedLabRAG()
+        return MedLabRAG(background=True, retrieval=os.environ.get("MEDLAB_RAG_RETRIEVAL", "dense"),
+                         corpus_dir=os.environ.get("MEDLAB_CORPUS_DIR"),
+                         index_type=os.environ.get("MEDLAB_RAG_INDEX", "flat"),
+                         index_params=json.loads(os.environ.get("MEDLAB_RAG_INDEX_PARAMS", "{}")))
     except Exception as e:
         st.warning(f"RAG system initialization failed: {e}. Running in basic mode.")
         return None
 
 rag_system = get_rag_system()
 
-def extract_text_from_document(uploaded_file):
+# Seconds an analysis waits for a warming RAG system before falling back
+RAG_WAIT_SECONDS = float(os.environ.get("MEDLAB_RAG_WAIT", "2"))
+
+def rag_state() -> str:
+    return rag_system.state if rag_system else 'off'
+
+# OCR settings; part of the OCR cache key so changing them invalidates entries
+OCR_SETTINGS = {
+    'dpi': int(os.environ.get("MEDLAB_OCR_DPI", "200")),
+    'grayscale': os.environ.get("MEDLAB_OCR_GRAYSCALE", "0") == "1",
+    'text_layer': os.environ.get("MEDLAB_PDF_TEXT_LAYER", "1") == "1",
+    # OpenCV steps run before Tesseract (see image_preprocessing.PREPROCESS_STEPS); none by default
+    'preprocess': {
+        step: step in os.environ.get("MEDLAB_OCR_PREPROCESS", "").split(",")
+        for step in PREPROCESS_STEPS
+    },
+    'lang': None,
+    'config': '',
+}
+
+# Parallel OCR; neither setting changes the extracted text
+OCR_WORKERS = int(os.environ.get("MEDLAB_OCR_WORKERS", os.cpu_count() or 1))
+OCR_PAGE_TIMEOUT = float(os.environ.get("MEDLAB_OCR_PAGE_TIMEOUT", "0"))
+# Pages rendered and OCR'd together; bounds peak memory on long PDFs
+PDF_PAGE_WINDOW = int(os.environ.get("MEDLAB_PDF_WINDOW", min(OCR_WORKERS, 8)))
+# Pages and documents are OCR'd concurrently by separate tesseract processes;
+# one OpenMP thread each avoids oversubscription. Set once here, before any
+# tesseract process starts, rather than from inside ocr_pipeline
+os.environ.setdefault('OMP_THREAD_LIMIT', '1')
+
+@st.cache_resource
+def get_ocr_cache():
+    try:
+        return OCRCache(
+            directory=os.environ.get("MEDLAB_OCR_CACHE_DIR", ".ocr_cache"),
+            max_bytes=int(os.environ.get("MEDLAB_OCR_CACHE_MB", "256")) * 1024 * 1024
+        )
+    except Exception as e:
+        print(f"OCR cache disabled: {e}")
+        return None
+
+ocr_cache = get_ocr_cache()
+
+# Patient results over time, shared by all sessions; sessions keep only report ids
+SESSION_HISTORY_SIZE = int(os.environ.get("MEDLAB_SESSION_HISTORY", "50"))
+
+@st.cache_resource
+def get_result_store():
+    try:
+        return ResultStore(os.environ.get("MEDLAB_RESULTS_DB", "medlab_results.sqlite3"))
+    except Exception as e:
+        print(f"Result store disabled: {e}")
+        return None
+
+# Prometheus /metrics and JSON /trace endpoints; setting the port also turns timing spans on
+@st.cache_resource
+def get_metrics_server():
+    port = int(os.environ.get("MEDLAB_METRICS_PORT", "0"))
+    if not port:
+        return None
+    TELEMETRY.enabled = True
+    try:
+        return start_metrics_server(TELEMETRY, port, host=os.environ.get("MEDLAB_METRICS_HOST", "127.0.0.1"))
+    except OSError as e:
+        print(f"Metrics server disabled: {e}")
+        return None
+
+metrics_server = get_metrics_server()
+
+# Opt-in profiling of one Extract -> Analyze cycle (see profiling.py)
+PROFILING_ENABLED = os.environ.get("MEDLAB_PROFILE", "0") == "1"
+
+def start_profile_capture(uploaded_files) -> bool:
+    """Start profiling this session's run; documents are described only by type, size and hash"""
+    capture = ProfileCapture()
+    if not capture.start():
+        st.warning("Another profile capture is running; extracting without profiling")
+        return False
+    st.session_state.profile_capture = capture
+    st.session_state.profile_metadata = {
+        'documents': [{'type': f.type, 'bytes': f.size, 'sha256_12': document_fingerprint(f.getvalue())}
+                      for f in uploaded_files],
+        'settings': {'ocr_workers': 1, 'ocr_cache': False, 'dpi': OCR_SETTINGS['dpi'],
+                     'preprocess': OCR_SETTINGS['preprocess'], 'rag': rag_state()},
+    }
+    return True
+
+def finish_profile_capture():
+    """Stop this session's capture, if any, and write its artifacts"""
+    capture = st.session_state.profile_capture
+    if capture is None:
+        return
+    st.session_state.profile_capture = None
+    metadata = {**st.session_state.profile_metadata, 'parameters': len(st.session_state.parsed_values)}
+    paths = capture.stop(metadata)
+    if paths:
+        st.sidebar.success(f"Profile written to {paths['pstats']}")
+        st.sidebar.caption(f"Allocations: {paths['allocations']}; summary: {paths['summary']}")
+
+def save_to_history(patient_id: str, parsed_values: Dict, taken_at, gender: str, age: int) -> int:
+    """Store the current values for a patient and remember the report id in this session"""
+    report_id = get_result_store().add_report(patient_id, parsed_values, taken_at=taken_at,
+                                            gender=gender, age=age, source='app')
+    st.session_state.analysis_history = (st.session_state.analysis_history + [report_id])[-SESSION_HISTORY_SIZE:]
+    return report_id
+
+# Memoized analyses: a small LRU per session in front of one shared by all sessions
+ANALYSIS_CACHE_SIZE = int(os.environ.get("MEDLAB_ANALYSIS_CACHE", "256"))
+SESSION_ANALYSIS_CACHE_SIZE = int(os.environ.get("MEDLAB_SESSION_ANALYSIS_CACHE", "8"))
+
+@st.cache_resource
+def get_analysis_memo():
+    return LRUMemo(maxsize=ANALYSIS_CACHE_SIZE)
+
+analysis_memo = get_analysis_memo()
+
+def iter_document_extraction(uploaded_file, workers: Optional[int] = None,
+                             use_cache: bool = True) -> Iterator[Tuple[int, int, str, Dict, List[str]]]:
+    """Extract and parse a document incrementally.
+    
+    Yields (pages_done, page_count, text_so_far, parsed_so_far, page_sources)
+    after every window of PDF pages; images yield once. Intermediate windows
+    are parsed on their own and merged into the values so far, earlier pages
+    winning; the last yield re-parses the whole text, so it equals parsing
+    the document at once (as a cache hit does), including values that run
+    across a page break. page_sources
+    records how each page was read: 'text' (embedded PDF text layer), 'ocr'
+    or 'cache'. workers overrides OCR_WORKERS; use_cache=False neither reads
+    nor fills the OCR cache.
+    """
+    data = uploaded_file.getvalue()
+    cache_key = None
+    if ocr_cache is not None and use_cache:
+        cache_key = OCRCache.make_key(data, {'type': uploaded_file.type, **OCR_SETTINGS})
+        cached = ocr_cache.get(cache_key)
+        if cached is not None:
+            yield 1, 1, cached, parse_lab_values(cached), ['cache']
+            return
+    
+    text = ""
+    if uploaded_file.type == "application/pdf":
+        parsed, page_sources = {}, []
+        for first, page_count, pages, sources in iter_pdf_text(
+                data, dpi=OCR_SETTINGS['dpi'], grayscale=OCR_SETTINGS['grayscale'],
+                window=PDF_PAGE_WINDOW, lang=OCR_SETTINGS['lang'], config=OCR_SETTINGS['config'],
+                workers=workers or OCR_WORKERS, timeout=OCR_PAGE_TIMEOUT, preprocess=OCR_SETTINGS['preprocess'],
+                use_text_layer=OCR_SETTINGS['text_layer']):
+            window_text = "".join(page + "\n" for page in pages)
+            # The previous window's last non-blank line is scanned again in case
+            # a label and its value are split across the page break; OCR'd
+            # pages end in "\n\f", hence the rstrip
+            tail = text.rstrip()
+            carry = tail[tail.rfind("\n") + 1:] + "\n" if tail else ""
+            text += window_text
+            if first + len(pages) < page_count:
+                parsed = merge_lab_values(parsed, parse_lab_values(carry + window_text))
+            else:
+                parsed = parse_lab_values(text)
+            page_sources.extend(sources)
+            yield first + len(pages), page_count, text, parsed, page_sources
+    else:
+        image = Image.open(io.BytesIO(data))
+        if OCR_SETTINGS['grayscale']:
+            image = image.convert('L')
+        text = ocr_image(image, lang=OCR_SETTINGS['lang'], config=OCR_SETTINGS['config'],
+                         timeout=OCR_PAGE_TIMEOUT, preprocess=OCR_SETTINGS['preprocess'])
+        yield 1, 1, text, parse_lab_values(text), ['ocr']
+    
+    if cache_key is not None:
+        ocr_cache.put(cache_key, text)
+
+@TELEMETRY.timed('extract_text_from_document')
+def extract_text_from_document(uploaded_file, progress=None, workers: Optional[int] = None, use_cache: bool = True):
     """Extract text from various document formats"""
     text = ""
     try:
-        if uploaded_file.type == "application/pdf":
-            images = pdf2image.convert_from_bytes(uploaded_file.read())
-            for img in images:
-                text += pytesseract.image_to_string(img) + "\n"
-        else:
-            image = Image.open(uploaded_file)
-            text = pytesseract.image_to_string(image)
+        for pages_done, page_count, text, parsed, page_sources in iter_document_extraction(
+                uploaded_file, workers=workers, use_cache=use_cache):
+            if progress:
+                progress(pages_done, page_count, parsed, page_sources)
         return text
     except Exception as e:
-        st.error(f"Error processing document: {str(e)}")
+        st.error(extraction_error_message(str(e)))
         return ""
 
-def parse_lab_values(text: str) -> Dict:
-    """Advanced parsing for all blood investigation types"""
-    parsed_data = {}
-    
-    # Comprehensive patterns for all test types
-    patterns = {
-        # Hematology
-        'RBC': r'(?:RBC|Red Blood Cell)[\s:]*(\d+\.?\d*)\s*(?:x?10\^?12|million)?',
-        'Hemoglobin': r'(?:Hemoglobin|Hb|HGB)[\s:]*(\d+\.?\d*)\s*(?:g/dL|g/L)?',
-        'Hematocrit': r'(?:Hematocrit|Hct|HCT)[\s:]*(\d+\.?\d*)\s*%?',
-        'MCV': r'(?:MCV)[\s:]*(\d+\.?\d*)\s*(?:fL)?',
-        'MCH': r'(?:MCH)[\s:]*(\d+\.?\d*)\s*(?:pg)?',
-        'MCHC': r'(?:MCHC)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
-        'RDW': r'(?:RDW)[\s:]*(\d+\.?\d*)\s*%?',
-        'WBC': r'(?:WBC|White Blood Cell)[\s:]*(\d+\.?\d*)\s*(?:x?10\^?9)?',
-        'Platelets': r'(?:Platelets|PLT)[\s:]*(\d+)\s*(?:x?10\^?9)?',
-        'MPV': r'(?:MPV)[\s:]*(\d+\.?\d*)\s*(?:fL)?',
-        'Neutrophils': r'(?:Neutrophils|Neutrophil|NEUT|ANC)[\s:]*(\d+\.?\d*)',
-        'Lymphocytes': r'(?:Lymphocytes|Lymphocyte|LYMPH)[\s:]*(\d+\.?\d*)',
-        'Monocytes': r'(?:Monocytes|Monocyte|MONO)[\s:]*(\d+\.?\d*)',
-        'Eosinophils': r'(?:Eosinophils|Eosinophil|EO)[\s:]*(\d+\.?\d*)',
-        'Basophils': r'(?:Basophils|Basophil|BASO)[\s:]*(\d+\.?\d*)',
-        'Reticulocytes': r'(?:Reticulocytes|Retic)[\s:]*(\d+\.?\d*)',
-        'Blasts': r'(?:Blasts|Blast)[\s:]*(\d+\.?\d*)',
-        
-        # Liver Function
-        'ALT': r'(?:ALT|SGPT|Alanine Aminotransferase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
-        'AST': r'(?:AST|SGOT|Aspartate Aminotransferase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
-        'ALP': r'(?:ALP|Alkaline Phosphatase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
-        'GGT': r'(?:GGT|Gamma GT)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
-        'Total_Bilirubin': r'(?:Total Bilirubin|T\.?\s*Bili)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Direct_Bilirubin': r'(?:Direct Bilirubin|Conjugated)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Indirect_Bilirubin': r'(?:Indirect Bilirubin|Unconjugated)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Total_Protein': r'(?:Total Protein|T\.?\s*Protein)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
-        'Albumin': r'(?:Albumin|Alb)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
-        'Globulin': r'(?:Globulin)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
-        'A_G_Ratio': r'(?:A/G Ratio|Albumin/Globulin)[\s:]*(\d+\.?\d*)',
-        
-        # Kidney Function
-        'Creatinine': r'(?:Creatinine|Creat)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'BUN': r'(?:BUN|Blood Urea Nitrogen|Urea)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'eGFR': r'(?:eGFR|Estimated GFR)[\s:]*(\d+\.?\d*)\s*(?:mL/min)?',
-        'Uric_Acid': r'(?:Uric Acid|Urate)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Sodium': r'(?:Sodium|Na)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
-        'Potassium': r'(?:Potassium|K)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
-        'Chloride': r'(?:Chloride|Cl)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
-        'Bicarbonate': r'(?:Bicarbonate|CO2|HCO3)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
-        'Calcium': r'(?:Calcium|Ca)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Phosphorus': r'(?:Phosphorus|Phosphate|P)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Magnesium': r'(?:Magnesium|Mg)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        
-        # Diabetes
-        'Glucose_Fasting': r'(?:Fasting Glucose|FBS|Fasting Blood Sugar)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Glucose_Random': r'(?:Random Glucose|RBS)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'HbA1c': r'(?:HbA1c|A1c|Glycated Hemoglobin)[\s:]*(\d+\.?\d*)\s*%?',
-        'Insulin': r'(?:Insulin|Fasting Insulin)[\s:]*(\d+\.?\d*)\s*(?:μU/mL)?',
-        'C_Peptide': r'(?:C-Peptide|C Peptide)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        
-        # Thyroid
-        'TSH': r'(?:TSH|Thyroid Stimulating Hormone)[\s:]*(\d+\.?\d*)\s*(?:μIU/mL)?',
-        'T3': r'(?:T3|Triiodothyronine|Total T3)[\s:]*(\d+\.?\d*)\s*(?:ng/dL)?',
-        'T4': r'(?:T4|Thyroxine|Total T4)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
-        'Free_T3': r'(?:Free T3|FT3)[\s:]*(\d+\.?\d*)\s*(?:pg/mL)?',
-        'Free_T4': r'(?:Free T4|FT4)[\s:]*(\d+\.?\d*)\s*(?:ng/dL)?',
-        'Anti_TPO': r'(?:Anti-TPO|TPO Antibodies)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
-        'Anti_Thyroglobulin': r'(?:Anti-Thyroglobulin|Tg Antibodies)[\s:]*(\d+\.?\d*)',
-        
-        # Lipid Profile
-        'Total_Cholesterol': r'(?:Total Cholesterol|T\.?\s*Chol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'HDL': r'(?:HDL|HDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'LDL': r'(?:LDL|LDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Triglycerides': r'(?:Triglycerides|TG)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'VLDL': r'(?:VLDL)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'Non_HDL_Cholesterol': r'(?:Non-HDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        
-        # Rheumatology/Immunology
-        'RF': r'(?:RF|Rheumatoid Factor)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
-        'Anti_CCP': r'(?:Anti-CCP|CCP Antibodies)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
-        'ANA': r'(?:ANA|Antinuclear Antibody)[\s:]*([<>\d:\s\w]+)',
-        'dsDNA': r'(?:Anti-dsDNA|dsDNA)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
-        'ESR': r'(?:ESR|Erythrocyte Sedimentation Rate)[\s:]*(\d+\.?\d*)\s*(?:mm/hr)?',
-        'CRP': r'(?:CRP|C-Reactive Protein)[\s:]*(\d+\.?\d*)\s*(?:mg/L)?',
-        'ASO': r'(?:ASO|Anti-Streptolysin O)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
-        
-        # Coagulation
-        'PT': r'(?:PT|Prothrombin Time)[\s:]*(\d+\.?\d*)\s*(?:seconds)?',
-        'INR': r'(?:INR|International Normalized Ratio)[\s:]*(\d+\.?\d*)',
-        'aPTT': r'(?:aPTT|APTT|Activated Partial Thromboplastin Time)[\s:]*(\d+\.?\d*)\s*(?:seconds)?',
-        'Fibrinogen': r'(?:Fibrinogen)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
-        'D_Dimer': r'(?:D-Dimer|Dimer)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+def extraction_error_message(error: str) -> str:
+    if "poppler" in error.lower() or "page count" in error.lower():
+        return "⚠️ PDF processing requires poppler. Please enter values manually or upload an image."
+    return f"Error processing document: {error}"
+
+def page_source_summary(page_sources: List[str]) -> str:
+    return ", ".join(
+        f"{page_sources.count(source)} page(s) via {label}"
+        for source, label in [('text', 'PDF text layer'), ('ocr', 'OCR'), ('cache', 'cache')]
+        if source in page_sources
+    )
+
+# Background extraction, shared by all sessions: OCR_JOB_WORKERS documents at a time
+OCR_JOB_WORKERS = int(os.environ.get("MEDLAB_OCR_JOBS", "2"))
+# Finished jobs listed per session
+OCR_JOB_HISTORY = 5
+
+@st.cache_resource
+def get_ocr_job_queue():
+    return OCRJobQueue(iter_document_extraction, workers=OCR_JOB_WORKERS)
+
+ocr_job_queue = get_ocr_job_queue()
+
+def submit_extraction_jobs(uploaded_files):
+    for uploaded_file in uploaded_files:
+        st.session_state.ocr_jobs.append(
+            ocr_job_queue.submit(uploaded_file.name, uploaded_file.type, uploaded_file.getvalue()))
+
+def apply_finished_jobs():
+    """Merge the values of this session's newly finished jobs, in completion order.
+    
+    Runs in the script thread: workers never touch session state. Values
+    of cancelled or failed jobs are discarded.
+    """
+    jobs = st.session_state.ocr_jobs
+    for job in sorted((j for j in jobs if not j.active and not j.applied), key=lambda j: j.finished):
+        if job.status == 'done' and job.parsed:
+            st.session_state.parsed_values.update(job.parsed)
+            invalidate_analysis()
+        job.applied = True
+    recent = [j for j in jobs if not j.active][-OCR_JOB_HISTORY:]
+    st.session_state.ocr_jobs = [j for j in jobs if j.active or j in recent]
+
+def extract_profiled(uploaded_files):
+    """Extract in the script thread under the profiler, which only sees this thread"""
+    # Single-threaded and uncached while profiling, so OCR shows up in the profile
+    profiling = start_profile_capture(uploaded_files)
+    all_sources = []
+    for uploaded_file in uploaded_files:
+        progress_bar = st.progress(0.0, text=f"Processing {uploaded_file.name} with OCR...")
+        page_sources = []
         
-        # Tumor Markers
-        'AFP': r'(?:AFP|Alpha-Fetoprotein)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'CEA': r'(?:CEA|Carcinoembryonic Antigen)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'CA_125': r'(?:CA-125|CA 125)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
-        'CA_19_9': r'(?:CA 19-9|CA19-9)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
-        'PSA': r'(?:PSA|Prostate Specific Antigen)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'CA_15_3': r'(?:CA 15-3|CA15-3)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
+        def show_progress(pages_done, page_count, parsed, sources, page_sources=page_sources, bar=progress_bar):
+            page_sources[:] = sources
+            bar.progress(pages_done / page_count,
+                         text=f"Page {pages_done}/{page_count} - {len(parsed)} parameters found")
         
-        # Vitamins
-        'Vitamin_D': r'(?:Vitamin D|25-OH Vitamin D|25\(OH\)D)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'Vitamin_B12': r'(?:Vitamin B12|B12|Cobalamin)[\s:]*(\d+\.?\d*)\s*(?:pg/mL)?',
-        'Folate': r'(?:Folate|Folic Acid)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'Iron': r'(?:Iron|Serum Iron)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
-        'Ferritin': r'(?:Ferritin)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
-        'TIBC': r'(?:TIBC|Total Iron Binding Capacity)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
-        'Transferrin_Saturation': r'(?:Transferrin Saturation|TSAT)[\s:]*(\d+\.?\d*)\s*%?',
-    }
-    
-    for param, pattern in patterns.items():
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        if matches:
-            try:
-                val = matches[0]
-                if isinstance(val, tuple):
-                    val = val[0]
-                val = str(val).replace('<', '').replace('>', '').strip()
-                parsed_data[param] = float(val) if val.replace('.','').isdigit() else val
-            except:
-                parsed_data[param] = matches[0]
-    
-    return parsed_data
+        text = extract_text_from_document(uploaded_file, progress=show_progress,
+                                          workers=1 if profiling else None, use_cache=not profiling)
+        progress_bar.empty()
+        all_sources.extend(page_sources)
+        if text:
+            parsed = parse_lab_values(text)
+            st.session_state.parsed_values.update(parsed)
+            invalidate_analysis()
+            st.success(f"{uploaded_file.name}: extracted {len(parsed)} parameters")
+            st.caption(page_source_summary(page_sources))
+    if profiling:
+        st.session_state.profile_metadata['pages'] = {
+            source: all_sources.count(source) for source in set(all_sources)}
 
+def ocr_jobs_panel():
+    """Outcome of this session's recent jobs, plus live progress while any is queued or running"""
+    for job in st.session_state.ocr_jobs:
+        if job.active:
+            continue
+        info = job.snapshot()
+        if info['status'] == 'done':
+            st.caption(f"✅ {info['name']}: {info['parameters']} parameters in {info['seconds']}s"
+                       + (f" ({page_source_summary(info['page_sources'])})" if info['page_sources'] else ""))
+        elif info['status'] == 'cancelled':
+            st.caption(f"⏹️ {info['name']}: cancelled after {info['pages_done']}/{info['page_count']} "
+                       "page(s); partial values discarded")
+        else:
+            st.error(f"{info['name']}: {extraction_error_message(info['error'])}")
+    if any(job.active for job in st.session_state.ocr_jobs):
+        ocr_job_progress()
+
+@st.fragment(run_every=1.0)
+def ocr_job_progress():
+    """Poll this session's active jobs; rerun the whole app once one finishes so its values are merged"""
+    jobs = st.session_state.ocr_jobs
+    if any(not job.active and not job.applied for job in jobs):
+        st.rerun()
+    for job in jobs:
+        if not job.active:
+            continue
+        info = job.snapshot()
+        fraction = 0.0
+        if info['status'] == 'queued':
+            text = f"{info['name']}: queued ({ocr_job_queue.position(job)} ahead)"
+        elif info['page_count']:
+            fraction = info['pages_done'] / info['page_count']
+            text = (f"{info['name']}: page {info['pages_done']}/{info['page_count']} - "
+                    f"{info['parameters']} parameters found")
+        else:
+            text = f"{info['name']}: processing with OCR..."
+        st.progress(fraction, text=text)
+        if info['cancel_requested']:
+            st.caption("Cancelling after the current page(s)...")
+        else:
+            st.button("✖ Cancel", key=f"cancel_ocr_job_{info['id']}", on_click=job.cancel)
+
+@TELEMETRY.timed('categorize_tests')
 def categorize_tests(tests: Dict) -> Dict[str, Dict]:
     """Categorize tests by medical system"""
-    categorized = {
-        'Hematology': {},
-        'Liver_Function': {},
-        'Kidney_Function': {},
-        'Metabolic': {},
-        'Endocrine': {},
-        'Lipid_Profile': {},
-        'Immunology_Rheumatology': {},
-        'Coagulation': {},
-        'Tumor_Markers': {},
-        'Vitamins_Minerals': {},
-        'Other': {}
-    }
-    
-    category_map = {
-        'Hematology': ['RBC', 'Hemoglobin', 'Hematocrit', 'MCV', 'MCH', 'MCHC', 'RDW', 
-                      'WBC', 'Platelets', 'MPV', 'Neutrophils', 'Lymphocytes', 'Monocytes',
-                      'Eosinophils', 'Basophils', 'Reticulocytes', 'Blasts'],
-        'Liver_Function': ['ALT', 'AST', 'ALP', 'GGT', 'Total_Bilirubin', 'Direct_Bilirubin',
-                          'Indirect_Bilirubin', 'Total_Protein', 'Albumin', 'Globulin', 'A_G_Ratio'],
-        'Kidney_Function': ['Creatinine', 'BUN', 'eGFR', 'Uric_Acid', 'Sodium', 'Potassium',
-                           'Chloride', 'Bicarbonate', 'Calcium', 'Phosphorus', 'Magnesium'],
-        'Metabolic': ['Glucose_Fasting', 'Glucose_Random', 'HbA1c', 'Insulin', 'C_Peptide'],
-        'Endocrine': ['TSH', 'T3', 'T4', 'Free_T3', 'Free_T4', 'Anti_TPO', 'Anti_Thyroglobulin'],
-        'Lipid_Profile': ['Total_Cholesterol', 'HDL', 'LDL', 'Triglycerides', 'VLDL', 'Non_HDL_Cholesterol'],
-        'Immunology_Rheumatology': ['RF', 'Anti_CCP', 'ANA', 'dsDNA', 'ESR', 'CRP', 'ASO'],
-        'Coagulation': ['PT', 'INR', 'aPTT', 'Fibrinogen', 'D_Dimer'],
-        'Tumor_Markers': ['AFP', 'CEA', 'CA_125', 'CA_19_9', 'PSA', 'CA_15_3'],
-        'Vitamins_Minerals': ['Vitamin_D', 'Vitamin_B12', 'Folate', 'Iron', 'Ferritin', 'TIBC', 'Transferrin_Saturation']
-    }
+    categorized = {category: {} for category in CATEGORY_ORDER}
     
     for test, value in tests.items():
-        found = False
-        for category, test_list in category_map.items():
-            if test in test_list:
-                categorized[category][test] = value
-                found = True
-                break
-        if not found:
-            categorized['Other'][test] = value
+        categorized[CATEGORY_INDEX.get(test, OTHER_CATEGORY)][test] = value
     
     return {k: v for k, v in categorized.items() if v}
 
@@ -435,17 +522,12 @@ def check_critical_values(tests: Dict) -> List[Dict]:
 
 def get_status_class(test: str, value: float, gender: str = 'male') -> Tuple[str, str, str]:
     """Determine status and styling for a test value"""
-    if test not in REFERENCE_RANGES:
+    bounds = reference_bounds(test, gender)
+    if bounds is None:
         return "normal", "✓", "Unknown reference"
     
-    ref = REFERENCE_RANGES[test]
-    unit = ref.get('unit', '')
-    
-    # Handle gender-specific ranges
-    if 'male' in ref and 'female' in ref:
-        low, high = ref[gender]
-    else:
-        low, high = ref['range']
+    low, high = bounds
+    unit = REFERENCE_RANGES[test].get('unit', '')
     
     if value < low:
         return "abnormal-low", "↓", f"Low (Ref: {low}-{high} {unit})"
@@ -485,285 +567,19 @@ def display_parameter_card(test: str, value, category: str, gender: str = 'male'
             new_value = st.number_input(f"Correct {test}", value=float(value), key=f"edit_{test}", label_visibility="collapsed")
             if new_value != value:
                 st.session_state.parsed_values[test] = new_value
+                invalidate_analysis()
     
     with col3:
         if editable:
             if st.button("🗑️", key=f"del_{test}"):
                 del st.session_state.parsed_values[test]
+                invalidate_analysis()
                 st.rerun()
 
-def analyze_hematology_patterns(tests: Dict) -> List[str]:
-    """Recognize hematology patterns"""
-    patterns = []
-    
-    # Anemia classification
-    if 'Hemoglobin' in tests and 'MCV' in tests:
-        hgb = tests['Hemoglobin']
-        mcv = tests['MCV']
-        
-        if hgb < 12:
-            if mcv < 80:
-                patterns.append("🔴 Microcytic anemia - consider iron deficiency, thalassemia, or anemia of chronic disease")
-            elif mcv > 100:
-                patterns.append("🔴 Macrocytic anemia - consider B12/folate deficiency, liver disease, MDS, or hemolysis")
-            else:
-                patterns.append("🟡 Normocytic anemia - consider acute blood loss, hemolysis, or early iron deficiency")
-    
-    # RDW interpretation
-    if 'RDW' in tests and tests['RDW'] > 14.5:
-        patterns.append("📊 Elevated RDW suggests anisocytosis - seen in iron deficiency, mixed deficiencies, or post-transfusion")
-    
-    # Thrombocytopenia patterns
-    if 'Platelets' in tests and tests['Platelets'] < 150:
-        if 'MPV' in tests:
-            if tests['MPV'] > 11.5:
-                patterns.append("🔴 Thrombocytopenia with high MPV suggests peripheral destruction (ITP, TTP)")
-            else:
-                patterns.append("🔴 Thrombocytopenia with normal/low MPV suggests bone marrow failure or sequestration")
-        else:
-            patterns.append("🟡 Thrombocytopenia - verify with peripheral smear for pseudothrombocytopenia")
-    
-    # Leukocytosis patterns
-    if 'WBC' in tests:
-        wbc = tests['WBC']
-        if wbc > 11:
-            if 'Neutrophils' in tests and tests['Neutrophils'] > 70:
-                patterns.append("🟡 Neutrophilic leukocytosis suggests bacterial infection, inflammation, or stress")
-            elif 'Lymphocytes' in tests and tests['Lymphocytes'] > 40:
-                patterns.append("🟡 Lymphocytosis suggests viral infection, lymphoid malignancy, or pertussis")
-        elif wbc < 4:
-            patterns.append("🔴 Leukopenia - increased infection risk, consider viral infection or bone marrow suppression")
-    
-    # Blasts detection
-    if 'Blasts' in tests and tests['Blasts'] > 0:
-        patterns.append(f"🚨 CRITICAL: {tests['Blasts']}% blasts detected - possible acute leukemia requiring immediate hematology referral")
-    
-    return patterns
-
-def analyze_liver_patterns(tests: Dict) -> List[str]:
-    """Recognize liver disease patterns"""
-    patterns = []
-    
-    # Hepatocellular vs cholestatic
-    if 'ALT' in tests and 'ALP' in tests:
-        alt = tests['ALT']
-        alp = tests['ALP']
-        
-        if alt > 40 and alp < 120:
-            patterns.append("🔴 Hepatocellular pattern - suggests viral hepatitis, drug-induced injury, or ischemic hepatitis")
-        elif alp > 120 and alt < 40:
-            patterns.append("🔴 Cholestatic pattern - suggests biliary obstruction, primary biliary cholangitis, or drug-induced cholestasis")
-        elif alt > 40 and alp > 120:
-            patterns.append("🟡 Mixed hepatocellular-cholestatic pattern - suggests alcoholic hepatitis or acute viral hepatitis")
-    
-    # Bilirubin fractionation
-    if 'Total_Bilirubin' in tests and 'Direct_Bilirubin' in tests:
-        total = tests['Total_Bilirubin']
-        direct = tests['Direct_Bilirubin']
-        
-        if total > 1.2:
-            if direct / total > 0.5:
-                patterns.append("🔴 Conjugated hyperbilirubinemia - suggests hepatocellular disease or biliary obstruction")
-            else:
-                patterns.append("🟡 Unconjugated hyperbilirubinemia - suggests hemolysis, Gilbert syndrome, or ineffective erythropoiesis")
-    
-    # Synthetic function
-    if 'Albumin' in tests and tests['Albumin'] < 3.5:
-        patterns.append("📉 Hypoalbuminemia suggests decreased synthetic function - chronic liver disease, malnutrition, or nephrotic syndrome")
-    
-    if 'INR' in tests and tests['INR'] > 1.2:
-        patterns.append("🔴 Elevated INR suggests impaired coagulation factor synthesis - severe liver disease or vitamin K deficiency")
-    
-    return patterns
-
-def analyze_kidney_patterns(tests: Dict) -> List[str]:
-    """Recognize kidney disease patterns"""
-    patterns = []
-    
-    # AKI vs CKD indicators
-    if 'Creatinine' in tests:
-        creat = tests['Creatinine']
-        if creat > 1.2:
-            patterns.append(f"🔴 Elevated creatinine ({creat}) suggests reduced GFR")
-            
-            if 'BUN' in tests:
-                bun = tests['BUN']
-                ratio = bun / creat
-                if ratio > 20:
-                    patterns.append("📊 BUN:Creatinine ratio >20 suggests prerenal azotemia (dehydration, CHF, GI bleeding)")
-                elif ratio < 10:
-                    patterns.append("📊 BUN:Creatinine ratio <10 suggests intrinsic renal disease or liver disease")
-    
-    if 'eGFR' in tests:
-        egfr = tests['eGFR']
-        if egfr < 60:
-            stage = "G3a-G5" if egfr < 60 else "G3b" if egfr < 45 else "G4" if egfr < 30 else "G5"
-            patterns.append(f"🔴 eGFR {egfr} indicates CKD {stage} - evaluate for complications")
-    
-    # Electrolyte disturbances
-    if 'Potassium' in tests:
-        k = tests['Potassium']
-        if k > 5.0:
-            patterns.append(f"🚨 Hyperkalemia ({k}) - risk of cardiac arrhythmia, requires urgent management")
-        elif k < 3.5:
-            patterns.append(f"🟡 Hypokalemia ({k}) - consider diuretic use, GI losses, or renal wasting")
-    
-    return patterns
-
-def analyze_metabolic_patterns(tests: Dict) -> List[str]:
-    """Analyze diabetes and metabolic patterns"""
-    patterns = []
-    
-    if 'HbA1c' in tests:
-        a1c = tests['HbA1c']
-        if a1c >= 6.5:
-            patterns.append(f"🔴 HbA1c {a1c}% meets criteria for diabetes mellitus")
-        elif a1c >= 5.7:
-            patterns.append(f"🟡 HbA1c {a1c}% indicates prediabetes - lifestyle intervention recommended")
-    
-    if 'Glucose_Fasting' in tests:
-        glucose = tests['Glucose_Fasting']
-        if glucose >= 126:
-            patterns.append(f"🔴 Fasting glucose {glucose} mg/dL meets diabetes criteria")
-        elif glucose >= 100:
-            patterns.append(f"🟡 Impaired fasting glucose ({glucose}) - prediabetes")
-    
-    return patterns
-
-def analyze_thyroid_patterns(tests: Dict) -> List[str]:
-    """Analyze thyroid function patterns"""
-    patterns = []
-    
-    if 'TSH' in tests:
-        tsh = tests['TSH']
-        
-        if tsh > 4.5:
-            if 'Free_T4' in tests:
-                if tests['Free_T4'] < 0.8:
-                    patterns.append("🔴 Primary hypothyroidism - elevated TSH with low FT4")
-                else:
-                    patterns.append("🟡 Subclinical hypothyroidism - elevated TSH with normal FT4")
-            
-            if 'Anti_TPO' in tests and tests['Anti_TPO'] > 35:
-                patterns.append("📊 Positive Anti-TPO suggests autoimmune (Hashimoto's) thyroiditis")
-                
-        elif tsh < 0.4:
-            if 'Free_T4' in tests:
-                if tests['Free_T4'] > 1.8:
-                    patterns.append("🔴 Primary hyperthyroidism - suppressed TSH with elevated FT4")
-                else:
-                    patterns.append("🟡 Subclinical hyperthyroidism - suppressed TSH with normal FT4")
-    
-    return patterns
-
-def analyze_lipid_patterns(tests: Dict) -> List[str]:
-    """Analyze lipid abnormalities"""
-    patterns = []
-    
-    if 'LDL' in tests and tests['LDL'] > 100:
-        patterns.append(f"🟡 Elevated LDL ({tests['LDL']}) - increased cardiovascular risk")
-    
-    if 'HDL' in tests and tests['HDL'] < 40:
-        patterns.append("🟡 Low HDL - cardiovascular risk factor")
-    
-    if 'Triglycerides' in tests and tests['Triglycerides'] > 150:
-        if tests['Triglycerides'] > 500:
-            patterns.append(f"🔴 Severe hypertriglyceridemia ({tests['Triglycerides']}) - pancreatitis risk")
-        else:
-            patterns.append("🟡 Elevated triglycerides - metabolic syndrome component")
-    
-    return patterns
-
-def analyze_rheumatology_patterns(tests: Dict) -> List[str]:
-    """Analyze autoimmune and rheumatology patterns"""
-    patterns = []
-    
-    # Rheumatoid Arthritis
-    if 'RF' in tests and tests['RF'] > 20:
-        patterns.append("📊 Positive RF supports rheumatoid arthritis diagnosis")
-    if 'Anti_CCP' in tests and tests['Anti_CCP'] > 20:
-        patterns.append("📊 Anti-CCP positive - highly specific for rheumatoid arthritis")
-    
-    # Lupus
-    if 'ANA' in tests:
-        patterns.append("📊 Positive ANA - if clinically suspected, check specific autoantibodies (dsDNA, Sm, RNP)")
-    if 'dsDNA' in tests and isinstance(tests['dsDNA'], (int, float)) and tests['dsDNA'] > 100:
-        patterns.append("🔴 Elevated anti-dsDNA - specific for systemic lupus erythematosus")
-    
-    # Inflammation
-    if 'ESR' in tests and tests['ESR'] > 20:
-        patterns.append(f"📊 Elevated ESR ({tests['ESR']}) indicates active inflammation")
-    if 'CRP' in tests and tests['CRP'] > 10:
-        patterns.append(f"📊 Elevated CRP ({tests['CRP']}) suggests acute inflammation or infection")
-    
-    return patterns
-
+@TELEMETRY.timed('generate_differential_diagnosis')
 def generate_differential_diagnosis(categorized_tests: Dict, gender: str, age: int) -> List[Dict]:
     """Generate prioritized differential diagnoses"""
-    diagnoses = []
-    
-    # Hematology diagnoses
-    if 'Hematology' in categorized_tests:
-        heme = categorized_tests['Hematology']
-        
-        if 'Blasts' in heme and isinstance(heme['Blasts'], (int, float)) and heme['Blasts'] > 5:
-            diagnoses.append({
-                'condition': 'Acute Leukemia',
-                'probability': 'High',
-                'urgency': 'Critical',
-                'supporting_evidence': [f"{heme['Blasts']}% blasts in peripheral blood"],
-                'next_step': 'Urgent hematology referral, bone marrow biopsy, flow cytometry'
-            })
-        
-        if 'Hemoglobin' in heme and isinstance(heme['Hemoglobin'], (int, float)) and heme['Hemoglobin'] < 7:
-            diagnoses.append({
-                'condition': 'Severe Anemia',
-                'probability': 'Confirmed',
-                'urgency': 'High',
-                'supporting_evidence': [f"Hemoglobin {heme['Hemoglobin']} g/dL"],
-                'next_step': 'Transfusion consideration, iron studies, B12/folate, reticulocyte count'
-            })
-    
-    # Metabolic diagnoses
-    if 'Metabolic' in categorized_tests:
-        metab = categorized_tests['Metabolic']
-        
-        if 'HbA1c' in metab and isinstance(metab['HbA1c'], (int, float)) and metab['HbA1c'] >= 6.5:
-            diagnoses.append({
-                'condition': 'Diabetes Mellitus',
-                'probability': 'High',
-                'urgency': 'Moderate',
-                'supporting_evidence': [f"HbA1c {metab['HbA1c']}%"],
-                'next_step': 'Confirm with repeat testing, ophthalmology referral, urine microalbumin, lipid panel'
-            })
-    
-    # Kidney diagnoses
-    if 'Kidney_Function' in categorized_tests:
-        renal = categorized_tests['Kidney_Function']
-        
-        if 'eGFR' in renal and isinstance(renal['eGFR'], (int, float)) and renal['eGFR'] < 30:
-            diagnoses.append({
-                'condition': 'Stage 4-5 Chronic Kidney Disease',
-                'probability': 'High',
-                'urgency': 'High',
-                'supporting_evidence': [f"eGFR {renal['eGFR']} mL/min"],
-                'next_step': 'Nephrology referral, renal ultrasound, anemia workup, bone metabolism assessment'
-            })
-    
-    # Liver diagnoses
-    if 'Liver_Function' in categorized_tests:
-        liver = categorized_tests['Liver_Function']
-        
-        if 'Total_Bilirubin' in liver and isinstance(liver['Total_Bilirubin'], (int, float)) and liver['Total_Bilirubin'] > 3:
-            diagnoses.append({
-                'condition': 'Jaundice/Hepatic Dysfunction',
-                'probability': 'High',
-                'urgency': 'Moderate',
-                'supporting_evidence': [f"Bilirubin {liver['Total_Bilirubin']} mg/dL"],
-                'next_step': 'Hepatitis serologies, abdominal ultrasound, INR, albumin'
-            })
-    
-    return sorted(diagnoses, key=lambda x: {'Critical': 0, 'High': 1, 'Moderate': 2, 'Low': 3}.get(x['urgency'], 4))
+    return RULE_ENGINE.diagnoses(categorized_tests)
 
 def generate_recommendations(categorized_tests: Dict, diagnoses: List[Dict]) -> List[str]:
     """Generate next step recommendations"""
@@ -793,14 +609,21 @@ def generate_recommendations(categorized_tests: Dict, diagnoses: List[Dict]) ->
     
     return list(dict.fromkeys(recommendations))  # Remove duplicates
 
-def generate_comprehensive_analysis(categorized_tests: Dict, gender: str, age: int) -> Dict:
-    """Generate comprehensive analysis"""
+@TELEMETRY.timed('generate_comprehensive_analysis')
+def generate_comprehensive_analysis(categorized_tests: Dict, gender: str, age: int,
+                                    history: Optional[Dict] = None, taken_at: Optional[float] = None) -> Dict:
+    """Generate comprehensive analysis.
+    
+    history (test -> (times, values) from the result store) adds delta
+    checks of the current values, collected at taken_at, to 'trends'.
+    """
     analysis = {
         'summary': [],
         'categories': {},
         'diagnoses': [],
         'next_steps': [],
-        'critical_alerts': []
+        'critical_alerts': [],
+        'trends': {'changes': [], 'alerts': [], 'aki_stage': 0}
     }
     
     # Check critical values
@@ -813,32 +636,18 @@ def generate_comprehensive_analysis(categorized_tests: Dict, gender: str, age: i
         analysis['critical_alerts'] = criticals
     
     # Category-specific analysis
-    category_analyzers = {
-        'Hematology': analyze_hematology_patterns,
-        'Liver_Function': analyze_liver_patterns,
-        'Kidney_Function': analyze_kidney_patterns,
-        'Metabolic': analyze_metabolic_patterns,
-        'Endocrine': analyze_thyroid_patterns,
-        'Lipid_Profile': analyze_lipid_patterns,
-        'Immunology_Rheumatology': analyze_rheumatology_patterns
-    }
-    
     for category, tests in categorized_tests.items():
-        if not tests or category not in category_analyzers:
+        if not tests or category not in RULE_ENGINE.pattern_rules:
             continue
         
-        patterns = category_analyzers[category](tests)
+        patterns = RULE_ENGINE.patterns(category, tests)
         
         # Count abnormalities
         abnormalities = []
         for test, value in tests.items():
-            if isinstance(value, (int, float)) and test in REFERENCE_RANGES:
-                ref = REFERENCE_RANGES[test]
-                if 'male' in ref and 'female' in ref:
-                    low, high = ref[gender]
-                else:
-                    low, high = ref['range']
-                
+            bounds = reference_bounds(test, gender)
+            if isinstance(value, (int, float)) and bounds is not None:
+                low, high = bounds
                 if value < low or value > high:
                     abnormalities.append({
                         'test': test,
@@ -858,10 +667,17 @@ def generate_comprehensive_analysis(categorized_tests: Dict, gender: str, age: i
     analysis['diagnoses'] = generate_differential_diagnosis(categorized_tests, gender, age)
     analysis['next_steps'] = generate_recommendations(categorized_tests, analysis['diagnoses'])
     
+    # Changes since the patient's previous results
+    if history:
+        analysis['trends'] = patient_trends(history, all_values, taken_at)
+        if analysis['trends']['alerts']:
+            analysis['summary'].append(f"Trends: {len(analysis['trends']['alerts'])} delta-check alerts")
+    
     # RAG enhancement if available
     if rag_system and hasattr(rag_system, 'enhance_analysis'):
         try:
-            rag_insights = rag_system.enhance_analysis(categorized_tests, analysis)
+            rag_insights = rag_system.enhance_analysis(categorized_tests, analysis, timeout=RAG_WAIT_SECONDS,
+                                                       gender=gender)
             analysis['rag_insights'] = rag_insights
         except:
             analysis['rag_insights'] = "RAG analysis temporarily unavailable"
@@ -870,48 +686,156 @@ def generate_comprehensive_analysis(categorized_tests: Dict, gender: str, age: i
     
     return analysis
 
+def session_analysis_memo() -> LRUMemo:
+    if st.session_state.analysis_memo is None:
+        st.session_state.analysis_memo = LRUMemo(maxsize=SESSION_ANALYSIS_CACHE_SIZE)
+    return st.session_state.analysis_memo
+
+def invalidate_analysis():
+    """Drop this session's memoized analyses after parsed_values changes"""
+    session_analysis_memo().clear()
+
+def get_analysis(parsed_values: Dict, gender: str, age: int, analysis_depth: str,
+                 history: Optional[Dict] = None, taken_at: Optional[float] = None, fresh: bool = False) -> Dict:
+    """generate_comprehensive_analysis, memoized per session and across sessions.
+    
+    The key is a stable hash of the inputs, so reruns triggered by unrelated
+    widgets reuse the previous result instead of repeating the rule engine
+    and the RAG lookup. fresh=True recomputes and stores the result.
+    """
+    history_points = {test: (times.astype(np.int64).tolist(), values.tolist())
+                      for test, (times, values) in (history or {}).items()}
+    key = stable_hash(parsed_values, gender, age, analysis_depth, rag_state(),
+                      rag_system.index_generation if rag_system else 0, history_points, taken_at)
+    session_memo = session_analysis_memo()
+    analysis = None if fresh else session_memo.get(key)
+    if analysis is None:
+        analysis = None if fresh else analysis_memo.get(key)
+        if analysis is None:
+            analysis = generate_comprehensive_analysis(categorize_tests(parsed_values), gender, age,
+                                                       history, taken_at)
+            # Don't pin a transient RAG failure or warm-up fallback for every later session
+            if rag_state() != 'warming' and analysis['rag_insights'] != "RAG analysis temporarily unavailable":
+                analysis_memo.put(key, analysis)
+        session_memo.put(key, analysis)
+    return analysis
+
+def rag_status_badge():
+    if rag_state() == 'ready':
+        timing = (f"{rag_system.retrieval.title()} retrieval; index {rag_system.index_source} in "
+                  f"{rag_system.startup_seconds:.2f}s; ready {rag_system.ready_seconds:.2f}s after start")
+        st.markdown(f'<div class="rag-status" title="{timing}">🧠 RAG Active</div>', unsafe_allow_html=True)
+    elif rag_system and rag_system.active_retrieval() == 'lexical':
+        st.markdown('<div class="rag-status" style="background: #0ea5e9;" title="Embedding model unavailable; '
+                    'BM25 keyword retrieval">📚 Lexical RAG</div>', unsafe_allow_html=True)
+    else:
+        st.markdown('<div class="rag-status" style="background: #f59e0b;">⚡ Basic Mode</div>', unsafe_allow_html=True)
+
+def performance_panel():
+    """Stage timings of this process (all sessions) with Prometheus and trace downloads"""
+    with st.expander("⏱️ Performance"):
+        rows = TELEMETRY.summary()
+        if not rows:
+            st.caption("No stages timed yet")
+            return
+        st.dataframe(pd.DataFrame(rows).set_index('stage'))
+        st.download_button("📥 Prometheus Metrics", TELEMETRY.prometheus_text(),
+                           file_name="medlab_metrics.prom", mime="text/plain")
+        st.download_button("📥 JSON Trace", TELEMETRY.chrome_trace_json(),
+                           file_name=f"medlab_trace_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                           mime="application/json", help="Open in chrome://tracing or ui.perfetto.dev")
+        if st.button("Reset Timings"):
+            TELEMETRY.reset()
+            st.rerun()
+
+@st.fragment(run_every=1.0)
+def rag_warming_badge():
+    """Poll the background warm-up; rerun the whole app once RAG is ready"""
+    if rag_state() != 'warming':
+        st.rerun()
+    st.markdown('<div class="rag-status" style="background: #6366f1;" title="Keyword retrieval until the '
+                'embedding model has loaded">⏳ RAG Warming Up</div>', unsafe_allow_html=True)
+
 def main():
+    apply_finished_jobs()
+    
     st.markdown('<h1 class="main-header">🧬 MedLab AI Analyzer</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Comprehensive Blood Investigation Analysis with AI-Powered Intelligence</p>', unsafe_allow_html=True)
     
     # RAG Status indicator
-    if rag_system:
-        st.markdown('<div class="rag-status">🧠 RAG Active</div>', unsafe_allow_html=True)
+    if rag_state() == 'warming':
+        rag_warming_badge()
     else:
-        st.markdown('<div class="rag-status" style="background: #f59e0b;">⚡ Basic Mode</div>', unsafe_allow_html=True)
+        rag_status_badge()
     
     # Sidebar
     with st.sidebar:
         st.header("Patient Demographics")
         gender = st.selectbox("Gender", ["Male", "Female"])
         age = st.number_input("Age", min_value=0, max_value=120, value=35)
+        patient_id = st.text_input("Patient ID", help="Saved results are kept per patient for trend analysis").strip()
+        # Opened on first use, so importing app (batch_cli, benchmarks) creates no database
+        result_store = get_result_store() if patient_id else None
+        collected = st.date_input("Collection Date", value=datetime.now().date())
         
         st.header("Data Input")
         input_method = st.radio("Input Method", ["Upload Document", "Manual Entry"])
         
         if input_method == "Upload Document":
-            uploaded_file = st.file_uploader("Upload Lab Report", 
-                                           type=['pdf', 'png', 'jpg', 'jpeg'])
+            uploaded_files = st.file_uploader("Upload Lab Report", 
+                                            type=['pdf', 'png', 'jpg', 'jpeg'], accept_multiple_files=True,
+                                            help="Reports are extracted in the background; several can be queued")
+            profile_next = PROFILING_ENABLED and st.checkbox(
+                "🧪 Profile Extract → Analyze",
+                help="Capture cProfile and tracemalloc data for the next extraction and analysis. "
+                     f"Only code locations, timings and sizes are written to {PROFILE_DIR}/")
             
-            if uploaded_file and st.button("🔍 Extract Data"):
-                with st.spinner("Processing document with OCR..."):
-                    text = extract_text_from_document(uploaded_file)
-                    if text:
-                        parsed = parse_lab_values(text)
-                        st.session_state.parsed_values.update(parsed)
-                        st.success(f"Extracted {len(parsed)} parameters")
+            if uploaded_files and st.button("🔍 Extract Data"):
+                if profile_next:
+                    extract_profiled(uploaded_files)
+                else:
+                    submit_extraction_jobs(uploaded_files)
+        ocr_jobs_panel()
         
         st.header("Analysis Options")
         analysis_depth = st.select_slider("Analysis Depth", 
                                         options=["Screening", "Standard", "Comprehensive", "Academic"])
         generate_report = st.button("📊 Generate Full Report")
+        if result_store and patient_id and st.session_state.parsed_values:
+            if st.button("💾 Save to Patient History"):
+                save_to_history(patient_id, st.session_state.parsed_values, collected, gender.lower(), age)
+                st.success(f"Saved {len(st.session_state.parsed_values)} values for {patient_id}")
+            st.caption(f"{result_store.report_count(patient_id)} report(s) stored for this patient")
+        
+        session_stats, global_stats = session_analysis_memo().stats(), analysis_memo.stats()
+        st.caption(
+            f"Analysis cache: {session_stats['hits']} session hits, "
+            f"{global_stats['hits']}/{global_stats['hits'] + global_stats['misses']} shared hits, "
+            f"{global_stats['size']}/{global_stats['maxsize']} entries"
+        )
+        if rag_system and rag_system.corpus_dir and st.button("🔄 Update Knowledge Base"):
+            with st.spinner("Ingesting documents..."):
+                summary = rag_system.ingest_corpus(rag_system.corpus_dir, workers=rag_system.ingest_workers)
+            st.success(f"{summary['changed']} changed, {summary['removed']} removed file(s); "
+                       f"{summary['chunks']} chunks embedded in {summary['seconds']}s")
+        
+        if rag_state() == 'ready':
+            rag_stats = rag_system.cache_stats()
+            signatures = rag_stats.pop('signatures')
+            st.caption(", ".join(
+                f"{name.title()} cache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evicted"
+                for name, stats in rag_stats.items()
+            ))
+            st.caption(f"Signature table: {signatures['size']} precomputed, "
+                       f"{signatures['hits']} hits, {signatures['misses']} live searches")
     
     # Main content area
     if st.session_state.parsed_values:
         st.markdown("---")
         
         # Tabs for organization
-        tab1, tab2, tab3, tab4 = st.tabs(["📋 Review & Correct", "🔬 Analysis", "🩺 Diagnoses", "📑 Report"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(["📋 Review & Correct", "🔬 Analysis", "🩺 Diagnoses", "📑 Report",
+                                                "📈 History"])
         
         with tab1:
             st.subheader("Extracted Values - Review and Correct")
@@ -939,14 +863,23 @@ def main():
                         if st.form_submit_button("Add"):
                             st.session_state.parsed_values[new_test] = new_value
                             st.session_state.correction_mode = False
+                            invalidate_analysis()
                             st.rerun()
         
         with tab2:
             if categorized:
                 st.subheader("Category-Based Analysis")
                 
+                # Prior results of this patient, collected before the current report
+                history, taken_at = None, None
+                if result_store and patient_id:
+                    taken_at = to_timestamp(collected)
+                    history = result_store.history(patient_id, tests=list(st.session_state.parsed_values),
+                                                   end=taken_at - 1)
+                
                 # Run comprehensive analysis
-                analysis = generate_comprehensive_analysis(categorized, gender.lower(), age)
+                analysis = get_analysis(st.session_state.parsed_values, gender.lower(), age, analysis_depth,
+                                        history, taken_at, fresh=st.session_state.profile_capture is not None)
                 
                 # Display critical alerts first
                 if analysis['critical_alerts']:
@@ -975,6 +908,15 @@ def main():
                                 for abnorm in cat_analysis['abnormalities']:
                                     st.markdown(f"- **{abnorm['test']}**: {abnorm['value']} ({abnorm['direction']})")
                 
+                # Changes since previous results
+                trends = analysis['trends']
+                if trends['changes']:
+                    icon = "🔴" if trends['alerts'] else "📈"
+                    with st.expander(f"{icon} Changes Since Previous Results", expanded=bool(trends['alerts'])):
+                        for alert in trends['alerts']:
+                            st.markdown(f"- {alert}")
+                        st.dataframe(pd.DataFrame(trends['changes']), hide_index=True)
+                
                 # RAG insights
                 if 'rag_insights' in analysis:
                     with st.expander("🧠 AI-Enhanced Insights", expanded=True):
@@ -1026,6 +968,22 @@ def main():
                 st.write(f"Abnormal findings: {sum(len(cat.get('abnormalities', [])) for cat in analysis['categories'].values())}")
                 st.write(f"Critical alerts: {len(analysis['critical_alerts'])}")
                 st.write(f"Potential diagnoses identified: {len(analysis['diagnoses'])}")
+        
+        with tab5:
+            if not result_store or not patient_id:
+                st.info("Enter a Patient ID in the sidebar to save results and view trends")
+            else:
+                history = result_store.history(patient_id)
+                if not history:
+                    st.info(f"No stored results for {patient_id} yet - use 💾 Save to Patient History")
+                else:
+                    st.subheader(f"Result History - {patient_id}")
+                    current = [test for test in st.session_state.parsed_values if test in history]
+                    selected = st.multiselect("Parameters", sorted(history), default=current[:4])
+                    for test in selected:
+                        times, values = history[test]
+                        st.markdown(f"**{test}** ({len(values)} results)")
+                        st.line_chart(pd.DataFrame({test: values}, index=pd.DatetimeIndex(times)))
 
     else:
         st.info("👆 Upload a lab report or enter values manually to begin analysis")
@@ -1052,6 +1010,18 @@ def main():
                 <p>Thyroid, adrenal, pituitary function</p>
             </div>
             """, unsafe_allow_html=True)
+    
+    # Last, so the timings include this run's analysis
+    if TELEMETRY.enabled:
+        with st.sidebar:
+            performance_panel()
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Ends the profiled cycle after the analysis tab has run, even if the run failed
+        finish_profile_capture()
+    if startup_timings['first_render'] is None:
+        startup_timings['first_render'] = time.perf_counter() - startup_timings['started']
+        print(f"Time to first render: {startup_timings['first_render']:.2f}s (RAG: {rag_state()})")
@@ -0,0 +1,246 @@
+# batch_cli.py
+# Headless batch processing of lab reports into JSON Lines
+#
+# Usage:
+#   python batch_cli.py reports/ "scans/**/*.pdf" -o results.jsonl \
+#       --demographics patients.csv --workers 8
+#
+# Each input file becomes one JSON line with its parsed values, categorized
+# tests and comprehensive analysis. Completed files are recorded in a
+# checkpoint so an interrupted run can be resumed with the same command.
+# With --store, parsed values are also added to a patient result store.
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+from ocr_jobs import MemoryUpload
+
+# Reports written to the result store per transaction
+STORE_BATCH_SIZE = 200
+
+SUPPORTED_TYPES = {
+    '.pdf': 'application/pdf',
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+}
+
+
+def find_reports(inputs: List[str]) -> List[str]:
+    """Expand directories (recursively) and glob patterns into report paths"""
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '**', '*'), recursive=True)
+        else:
+            matches = glob.glob(item, recursive=True) or [item]
+        for path in sorted(matches):
+            if os.path.isfile(path) and os.path.splitext(path)[1].lower() in SUPPORTED_TYPES:
+                paths.append(os.path.abspath(path))
+    return list(dict.fromkeys(paths))
+
+
+def load_demographics(path: Optional[str]) -> Dict[str, Tuple[str, int, Optional[str], Optional[str]]]:
+    """Read a sidecar CSV keyed by file name.
+
+    Columns file, gender and age are required; patient and date
+    (collection date, ISO format) are optional and may be blank.
+    """
+    demographics = {}
+    if not path:
+        return demographics
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            gender = row.get('gender', '').strip().lower()
+            if gender not in ('male', 'female'):
+                raise ValueError(f"{path}: invalid gender {row.get('gender')!r} for {row.get('file')}")
+            demographics[os.path.basename(row['file'].strip())] = (
+                gender, int(float(row['age'])), (row.get('patient') or '').strip() or None,
+                (row.get('date') or '').strip() or None)
+    return demographics
+
+
+def checkpoint_key(path: str) -> str:
+    """Identify a file version by path, size and modification time"""
+    stat = os.stat(path)
+    return f"{path}\t{stat.st_size}\t{stat.st_mtime_ns}"
+
+
+def load_checkpoint(path: Optional[str]) -> Set[str]:
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def load_app(use_rag: bool):
+    """Import app.py outside Streamlit and wait for its RAG system to load"""
+    if not use_rag:
+        os.environ['MEDLAB_RAG'] = '0'
+    # The app runs in Streamlit's bare mode here; silence its per-call
+    # warnings. Config is parsed first because parsing resets the log level.
+    from streamlit import config, logger
+    config.get_config_options()
+    config.set_option('global.showWarningOnDirectExecution', False)
+    logger.set_log_level('error')
+    import app
+    # Batch output should not depend on how fast the model happened to load
+    if app.rag_system:
+        app.rag_system.wait_ready()
+    return app
+
+
+def _init_worker(use_rag: bool):
+    """Import the app once per worker process"""
+    global app
+    # Parallelism comes from the process pool; keep each worker single-threaded
+    os.environ['MEDLAB_OCR_WORKERS'] = '1'
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+    app = load_app(use_rag)
+
+
+def read_upload(path: str) -> MemoryUpload:
+    with open(path, 'rb') as f:
+        data = f.read()
+    return MemoryUpload(os.path.basename(path), SUPPORTED_TYPES[os.path.splitext(path)[1].lower()], data)
+
+
+def process_report(task: Tuple[str, str, str, int, str, Optional[str]]) -> Dict:
+    """Run extraction, parsing, categorization and analysis for one file"""
+    path, key, gender, age, patient, taken_at = task
+    start = time.perf_counter()
+    record = {'file': path, 'patient': patient, 'taken_at': taken_at, 'gender': gender, 'age': age}
+    try:
+        text, parsed, page_sources = "", {}, []
+        for _, _, text, parsed, page_sources in app.iter_document_extraction(read_upload(path)):
+            pass
+        categorized = app.categorize_tests(parsed)
+        record.update({
+            'page_sources': list(page_sources),
+            'parsed_values': parsed,
+            'categorized': categorized,
+            'analysis': app.generate_comprehensive_analysis(categorized, gender, age) if categorized else None,
+            'error': None,
+        })
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+    record['elapsed_s'] = round(time.perf_counter() - start, 3)
+    record['_checkpoint'] = key
+    return record
+
+
+def run(args) -> int:
+    reports = find_reports(args.inputs)
+    demographics = load_demographics(args.demographics)
+    checkpoint_path = args.checkpoint or (f"{args.output}.done" if args.output else None)
+    done = load_checkpoint(checkpoint_path)
+
+    tasks = []
+    for path in reports:
+        key = checkpoint_key(path)
+        if key in done:
+            continue
+        gender, age, patient, taken_at = demographics.get(os.path.basename(path),
+                                                          (args.gender, args.age, None, None))
+        # Without a patient column each file is its own patient
+        patient = patient or os.path.splitext(os.path.basename(path))[0]
+        tasks.append((path, key, gender, age, patient, taken_at))
+
+    print(f"{len(reports)} reports found, {len(reports) - len(tasks)} already done, "
+          f"{len(tasks)} to process with {args.workers} workers", file=sys.stderr)
+
+    out = open(args.output, 'a', encoding='utf-8') if args.output else sys.stdout
+    checkpoint = open(checkpoint_path, 'a', encoding='utf-8') if checkpoint_path else None
+    store = None
+    if args.store:
+        from result_store import ResultStore
+        store = ResultStore(args.store)
+    # Stored reports waiting for the next bulk insert, with their result
+    # lines and checkpoint keys. The lines are held back too: written on
+    # arrival, a hard kill before the flush would leave them in the output
+    # without checkpoint entries, and the resumed run would append them again
+    pending, pending_lines, pending_keys = [], [], []
+
+    def flush_store():
+        if pending_lines:
+            out.write(''.join(pending_lines))
+            out.flush()
+        if pending:
+            store.add_reports(pending)
+        if checkpoint and pending_keys:
+            checkpoint.write(''.join(key + '\n' for key in pending_keys))
+            checkpoint.flush()
+        pending.clear()
+        pending_lines.clear()
+        pending_keys.clear()
+
+    start = time.perf_counter()
+    processed = failed = pages = 0
+    try:
+        with multiprocessing.Pool(args.workers, initializer=_init_worker, initargs=(args.rag,)) as pool:
+            for record in pool.imap_unordered(process_report, tasks):
+                key = record.pop('_checkpoint')
+                line = json.dumps(record, default=str) + '\n'
+                # Record completion only after the result line (and stored
+                # values) are on disk; failed files stay out of the
+                # checkpoint and are retried
+                if store and record['error'] is None:
+                    pending.append({'patient': record['patient'], 'values': record['parsed_values'],
+                                    'taken_at': record['taken_at'] or os.path.getmtime(record['file']),
+                                    'gender': record['gender'], 'age': record['age'], 'source': record['file']})
+                    pending_lines.append(line)
+                    pending_keys.append(key)
+                    if len(pending) >= STORE_BATCH_SIZE:
+                        flush_store()
+                else:
+                    out.write(line)
+                    out.flush()
+                    if checkpoint and record['error'] is None:
+                        checkpoint.write(key + '\n')
+                        checkpoint.flush()
+                processed += 1
+                failed += record['error'] is not None
+                pages += len(record.get('page_sources', []))
+    finally:
+        if store:
+            flush_store()
+            store.close()
+        if out is not sys.stdout:
+            out.close()
+        if checkpoint:
+            checkpoint.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {processed} reports ({failed} failed, {pages} pages) in {elapsed:.1f}s: "
+          f"{processed / elapsed if elapsed else 0:.2f} reports/s, "
+          f"{pages / elapsed if elapsed else 0:.2f} pages/s", file=sys.stderr)
+    return 1 if failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Batch-analyse lab reports into JSON Lines")
+    parser.add_argument('inputs', nargs='+', help="Report files, directories or glob patterns")
+    parser.add_argument('-o', '--output', help="JSONL output file (appended to); default stdout")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT.done)")
+    parser.add_argument('--demographics', help="CSV with columns file, gender, age")
+    parser.add_argument('--gender', default='male', choices=['male', 'female'],
+                        help="Gender for files missing from the demographics CSV")
+    parser.add_argument('--age', type=int, default=35,
+                        help="Age for files missing from the demographics CSV")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--no-rag', dest='rag', action='store_false',
+                        help="Skip RAG enhancement (rule-based analysis only)")
+    parser.add_argument('--store', metavar='DB',
+                        help="Also add parsed values to this SQLite patient result store")
+    return run(parser.parse_args(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
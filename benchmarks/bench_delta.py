@@ -0,0 +1,58 @@
+# benchmarks/bench_delta.py
+# Delta-check throughput of delta_frame() on a synthetic longitudinal cohort
+#
+# Each patient gets a series of reports a few days apart for every test in
+# DELTA_LIMITS plus Creatinine, as random walks from mid-reference values.
+#
+# Usage: python benchmarks/bench_delta.py [--patients N] [--reports R] [--seed S]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from delta_engine import DAY_SECONDS, DELTA_LIMITS, delta_frame
+from reference_engine import reference_bounds
+
+
+def synthetic_results(patients: int, reports: int, seed: int) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    tests = list(DELTA_LIMITS) + ['Creatinine']
+    gaps = rng.uniform(0.5, 10, size=(patients, reports)) * DAY_SECONDS
+    times = np.cumsum(gaps, axis=1).ravel()
+    frames = []
+    for test in tests:
+        low, high = reference_bounds(test) or (0, 1)
+        middle = (low + high) / 2 or 1
+        walk = middle * (1 + np.cumsum(rng.normal(0, 0.08, size=(patients, reports)), axis=1))
+        frames.append(pd.DataFrame({'patient': np.repeat(np.arange(patients), reports), 'test': test,
+                                    'taken_at': times, 'value': np.abs(walk).ravel()}))
+    return pd.concat(frames, ignore_index=True).sample(frac=1, random_state=seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--patients', type=int, default=10_000)
+    parser.add_argument('--reports', type=int, default=10)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = synthetic_results(args.patients, args.reports, args.seed)
+    start = time.perf_counter()
+    deltas = delta_frame(results)
+    elapsed = time.perf_counter() - start
+
+    creatinine = deltas[deltas['test'] == 'Creatinine']
+    print(f"{len(results)} results ({args.patients} patients x {args.reports} reports)")
+    print(f"  delta_frame: {elapsed:.2f}s, {len(results) / elapsed:,.0f} results/s")
+    print(f"  delta flags: {int(deltas['delta_flag'].sum())}, "
+          f"AKI stages 1/2/3: {[int((creatinine['aki_stage'] == s).sum()) for s in (1, 2, 3)]}")
+
+
+if __name__ == "__main__":
+    main()
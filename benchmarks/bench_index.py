@@ -0,0 +1,83 @@
+# benchmarks/bench_index.py
+# FAISS index types: build time, memory, query latency and recall@k vs flat search
+#
+# Uses a synthetic clustered corpus of embedding-sized vectors, so it runs
+# without the embedding model. Index parameters are vector_index defaults
+# unless overridden, e.g. --param nprobe=32 --param ef_search=128.
+#
+# Usage: python benchmarks/bench_index.py [--vectors N] [--dim D] [--queries Q] [--k K]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import INDEX_TYPES, build_index, index_bytes, index_kind
+
+
+def synthetic_vectors(count: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors scattered around random topic centres, like sentence embeddings"""
+    centres = rng.normal(size=(clusters, dim))
+    vectors = centres[rng.integers(0, clusters, size=count)] + 0.6 * rng.normal(size=(count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--vectors', type=int, default=200_000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--clusters', type=int, default=500)
+    parser.add_argument('--queries', type=int, default=1000)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--types', nargs='+', default=list(INDEX_TYPES), choices=INDEX_TYPES)
+    parser.add_argument('--param', action='append', default=[], metavar='NAME=VALUE',
+                        help="Override a vector_index.DEFAULT_INDEX_PARAMS entry")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    params = {name: int(value) for name, value in (p.split('=', 1) for p in args.param)}
+    rng = np.random.default_rng(args.seed)
+    corpus = synthetic_vectors(args.vectors, args.dim, args.clusters, rng)
+    queries = synthetic_vectors(args.queries, args.dim, args.clusters, rng)
+
+    truth, fell_back = None, False
+    print(f"{args.vectors:,} x {args.dim} vectors, {args.queries} queries, k={args.k}")
+    print(f"{'type':>5} {'build s':>8} {'MB':>8} {'p50 ms':>8} {'p99 ms':>8} {'recall':>7}")
+    for index_type in ['flat'] + [t for t in args.types if t != 'flat']:
+        start = time.perf_counter()
+        index = build_index(corpus, index_type, params)
+        build = time.perf_counter() - start
+
+        latencies, found = [], []
+        for query in queries:
+            start = time.perf_counter()
+            _, ids = index.search(query[None, :], args.k)
+            latencies.append(time.perf_counter() - start)
+            found.append(ids[0])
+        found = np.array(found)
+        if truth is None:
+            truth = found
+        if index_type not in args.types:
+            continue
+
+        p50, p99 = np.percentile(np.array(latencies) * 1000, [50, 99])
+        label = index_type if index_kind(index) == index_type else f"{index_type}*"
+        fell_back |= label.endswith('*')
+        print(f"{label:>5} {build:>8.2f} {index_bytes(index) / 2 ** 20:>8.1f} {p50:>8.3f} {p99:>8.3f} "
+              f"{recall_at_k(found, truth):>7.1%}")
+    if fell_back:
+        print("* corpus below min_train; a flat index was built instead")
+
+
+if __name__ == "__main__":
+    main()
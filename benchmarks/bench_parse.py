@@ -0,0 +1,93 @@
+# benchmarks/bench_parse.py
+# Compares the single-pass lab scanner against the per-pattern regex parser
+#
+# Usage: python benchmarks/bench_parse.py [--repeat N] [--seed S]
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lab_parser import LAB_PATTERNS, parse_lab_values
+from medical_reference import REFERENCE_RANGES
+
+
+def legacy_parse_lab_values(text: str) -> Dict:
+    """Previous implementation: one re.findall over the text per parameter"""
+    parsed_data = {}
+    for param, pattern in LAB_PATTERNS.items():
+        matches = re.findall(pattern, text, re.IGNORECASE)
+        if matches:
+            try:
+                val = matches[0]
+                if isinstance(val, tuple):
+                    val = val[0]
+                val = str(val).replace('<', '').replace('>', '').strip()
+                parsed_data[param] = float(val) if val.replace('.', '').isdigit() else val
+            except:
+                parsed_data[param] = matches[0]
+    return parsed_data
+
+
+FILLER = [
+    "Patient Name: ******  Sample ID: {sid}  Collected: 2024-03-{day:02d} 08:{minute:02d}",
+    "Referring Physician: Dr. ******  Department of Laboratory Medicine",
+    "Method: Automated analyser. Results verified by the signing pathologist.",
+    "Interpretation should be correlated with clinical findings.",
+    "---------------------------------------------------------------",
+]
+
+
+def synthetic_page(rng: random.Random) -> str:
+    """Build one page of report text with a random subset of parameters"""
+    lines = [rng.choice(FILLER).format(sid=rng.randint(10000, 99999),
+                                       day=rng.randint(1, 28),
+                                       minute=rng.randint(0, 59))]
+    for test in rng.sample(sorted(REFERENCE_RANGES), k=25):
+        ref = REFERENCE_RANGES[test]
+        low, high = ref.get('range') or ref.get('male') or ref.get('non-smoker')
+        value = round(rng.uniform(low * 0.7, high * 1.3 + 1), 1)
+        sep = rng.choice([': ', ' ', '  ', ':'])
+        lines.append(f"{test.replace('_', ' ')}{sep}{value} {ref['unit']}   Ref: {low}-{high}")
+        if rng.random() < 0.3:
+            lines.append(rng.choice(FILLER).format(sid=0, day=1, minute=0))
+    return "\n".join(lines)
+
+
+def synthetic_report(pages: int, seed: int) -> str:
+    rng = random.Random(seed)
+    return "\n\f\n".join(synthetic_page(rng) for _ in range(pages))
+
+
+def time_call(func, text: str, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(text)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'chars':>9} {'legacy ms':>10} {'scanner ms':>11} {'speedup':>8}")
+    for pages in (1, 10, 100):
+        text = synthetic_report(pages, args.seed)
+        assert parse_lab_values(text) == legacy_parse_lab_values(text), "result mismatch"
+        repeat = max(3, args.repeat // (pages // 10 or 1))
+        legacy = min(time_call(legacy_parse_lab_values, text, repeat)) * 1000
+        scanner = min(time_call(parse_lab_values, text, repeat)) * 1000
+        print(f"{pages:>6} {len(text):>9} {legacy:>10.2f} {scanner:>11.2f} {legacy / scanner:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+# benchmarks/bench_pipeline.py
+# End-to-end benchmark of every pipeline stage on synthetic lab reports
+#
+# Reports come from synthetic_reports.generate_reports (seeded, so runs are
+# comparable). Per stage it records latency percentiles and throughput, peak
+# traced memory (in a separate pass, since tracing slows everything down)
+# and, for parsing, recall/precision against the generated values. Results
+# are written as JSON; --compare prints the change against an earlier run.
+#
+# Stages: extract (PDF/PNG formats only), parse, categorize, rules (pattern
+# rules per category), diagnosis, analysis (generate_comprehensive_analysis,
+# which includes rules and diagnosis) and, with --rag, rag (enhance_analysis).
+# PNG and scanned-PDF formats need tesseract (and poppler for PDFs); formats
+# whose tools are missing are skipped.
+#
+# Usage: python benchmarks/bench_pipeline.py [--reports N] [--seed S]
+#            [--formats text,pdf,png] [--noise 0.01] [--rag]
+#            [--output results.json] [--compare baseline.json]
+
+import argparse
+import json
+import math
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import batch_cli
+from ocr_jobs import MemoryUpload
+from synthetic_reports import FORMATS, LAYOUTS, generate_reports
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+PERCENTILES = (50, 90, 95, 99)
+STAGES = ('extract', 'parse', 'categorize', 'rules', 'diagnosis', 'analysis', 'rag')
+
+# External tools each format needs besides Python packages
+FORMAT_TOOLS = {'text': (), 'pdf': (), 'png': ('tesseract',), 'scan_pdf': ('tesseract', 'pdftoppm')}
+
+
+def load_app(use_rag: bool):
+    """Import app.py as batch_cli.py does, with a private OCR cache"""
+    os.environ['MEDLAB_OCR_CACHE_DIR'] = tempfile.mkdtemp(prefix='bench_ocr_cache_')
+    return batch_cli.load_app(use_rag)
+
+
+def run_stages(app, report: Dict, use_rag: bool) -> List:
+    """(stage, thunk) pairs for one report, in pipeline order; each thunk
+    stores its output in the shared state the later stages read
+    """
+    state = {'text': report['text']}
+
+    def extract():
+        upload = MemoryUpload(report['id'], report['mime'], report['data'])
+        for _, _, state['text'], _, _ in app.iter_document_extraction(upload):
+            pass
+
+    def parse():
+        state['parsed'] = app.parse_lab_values(state['text'])
+
+    def categorize():
+        state['categorized'] = app.categorize_tests(state['parsed'])
+
+    def rules():
+        for category, tests in state['categorized'].items():
+            if category in app.RULE_ENGINE.pattern_rules:
+                app.RULE_ENGINE.patterns(category, tests)
+
+    def diagnosis():
+        app.generate_differential_diagnosis(state['categorized'], report['gender'], report['age'])
+
+    def analysis():
+        state['analysis'] = app.generate_comprehensive_analysis(state['categorized'], report['gender'],
+                                                                report['age'])
+
+    def rag():
+        app.rag_system.enhance_analysis(state['categorized'], state['analysis'], gender=report['gender'])
+
+    stages = [('extract', extract)] if report['data'] is not None else []
+    stages += [('parse', parse), ('categorize', categorize), ('rules', rules), ('diagnosis', diagnosis),
+               ('analysis', analysis)]
+    if use_rag:
+        stages.append(('rag', rag))
+    return stages, state
+
+
+def _close(a: float, b) -> bool:
+    return isinstance(b, (int, float)) and math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9)
+
+
+def score_parse(truth: Dict, parsed: Dict) -> Dict[str, int]:
+    """True positives (right test and value), false positives (unexpected
+    test or wrong value) and false negatives (expected test missing or wrong)
+    """
+    tp = sum(1 for test, value in truth.items() if _close(value, parsed.get(test)))
+    return {'tp': tp, 'fp': len(parsed) - tp, 'fn': len(truth) - tp}
+
+
+def accuracy(counts: Dict[str, int]) -> Dict:
+    tp, fp, fn = counts['tp'], counts['fp'], counts['fn']
+    return {**counts,
+            'recall': round(tp / (tp + fn), 4) if tp + fn else None,
+            'precision': round(tp / (tp + fp), 4) if tp + fp else None}
+
+
+def latency_summary(timings: List[float]) -> Dict:
+    ms = np.array(timings) * 1000
+    return {
+        'count': len(ms),
+        'mean_ms': round(float(ms.mean()), 4),
+        **{f'p{p}_ms': round(float(np.percentile(ms, p)), 4) for p in PERCENTILES},
+        'max_ms': round(float(ms.max()), 4),
+        'throughput_per_s': round(len(ms) / (ms.sum() / 1000), 1) if ms.sum() else None,
+    }
+
+
+def measure_memory(app, reports: List[Dict], use_rag: bool) -> Dict[str, int]:
+    """Largest traced allocation peak of each stage over the reports, in bytes"""
+    peaks: Dict[str, int] = {}
+    tracemalloc.start()
+    try:
+        for report in reports:
+            stages, _ = run_stages(app, report, use_rag)
+            for stage, run in stages:
+                tracemalloc.reset_peak()
+                base = tracemalloc.get_traced_memory()[0]
+                run()
+                peaks[stage] = max(peaks.get(stage, 0), tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+    return peaks
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(args, progress: Callable[[str], None] = print) -> Dict:
+    missing = {fmt: [tool for tool in FORMAT_TOOLS[fmt] if shutil.which(tool) is None] for fmt in args.formats}
+    formats = [fmt for fmt in args.formats if not missing[fmt]]
+    for fmt in args.formats:
+        if missing[fmt]:
+            progress(f"Skipping {fmt}: {', '.join(missing[fmt])} not found")
+    if not formats:
+        sys.exit("No runnable formats")
+
+    app = load_app(args.rag)
+    if args.rag and not app.rag_system:
+        sys.exit("RAG system failed to initialize")
+    start = time.perf_counter()
+    reports = list(generate_reports(args.reports, args.seed, args.layouts, formats, args.noise,
+                                    args.abnormal_rate, args.tests, args.pages))
+    progress(f"Generated {len(reports)} reports in {time.perf_counter() - start:.1f}s")
+
+    # Warm-up: first calls compile regexes, import lazily loaded modules, etc.
+    for report in reports[:min(5, len(reports))]:
+        for _, run in run_stages(app, report, args.rag)[0]:
+            run()
+
+    timings: Dict[str, List[float]] = {}
+    counts = {'overall': {'tp': 0, 'fp': 0, 'fn': 0}}
+    wall = time.perf_counter()
+    for report in reports:
+        stages, state = run_stages(app, report, args.rag)
+        for stage, run in stages:
+            start = time.perf_counter()
+            run()
+            timings.setdefault(stage, []).append(time.perf_counter() - start)
+        score = score_parse(report['truth'], state['parsed'])
+        for group in ('overall', f"layout:{report['layout']}", f"format:{report['format']}"):
+            totals = counts.setdefault(group, {'tp': 0, 'fp': 0, 'fn': 0})
+            for key, value in score.items():
+                totals[key] += value
+    wall = time.perf_counter() - wall
+
+    memory_reports = reports[:args.memory_reports]
+    progress(f"Tracing memory over {len(memory_reports)} reports")
+    peaks = measure_memory(app, memory_reports, args.rag)
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'args': {**vars(args), 'formats': formats},
+            'skipped_formats': {fmt: tools for fmt, tools in missing.items() if tools},
+        },
+        'reports': len(reports),
+        'wall_seconds': round(wall, 3),
+        'reports_per_second': round(len(reports) / wall, 1),
+        'stages': {stage: {**latency_summary(timings[stage]), 'peak_traced_bytes': peaks.get(stage)}
+                   for stage in STAGES if stage in timings},
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'parse_accuracy': {group: accuracy(counts[group]) for group in sorted(counts, key=lambda g: (g != 'overall', g))},
+    }
+
+
+def print_results(results: Dict, baseline: Optional[Dict] = None):
+    print(f"{results['reports']} reports, {results['reports_per_second']} reports/s end to end, "
+          f"max RSS {results['max_rss_kb'] / 1024:.0f} MB")
+    header = f"{'stage':>11} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>10} {'peak KB':>9}"
+    print(header + ("   p50 vs baseline" if baseline else ""))
+    for stage, summary in results['stages'].items():
+        peak = summary['peak_traced_bytes']
+        line = (f"{stage:>11} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} {summary['p99_ms']:>9.3f} "
+                f"{summary['throughput_per_s'] or 0:>10.1f} {(peak or 0) / 1024:>9.1f}")
+        before = (baseline or {}).get('stages', {}).get(stage)
+        if before and before['p50_ms']:
+            line += f"   {summary['p50_ms'] / before['p50_ms']:.2f}x"
+        print(line)
+    print(f"{'parse':>11} {'recall':>9} {'precision':>10}")
+    for group, scores in results['parse_accuracy'].items():
+        line = f"{group:>18} {scores['recall'] if scores['recall'] is not None else '-':>9} " \
+               f"{scores['precision'] if scores['precision'] is not None else '-':>10}"
+        before = (baseline or {}).get('parse_accuracy', {}).get(group)
+        if before and before['recall'] is not None and scores['recall'] is not None:
+            line += f"   recall {scores['recall'] - before['recall']:+.4f}"
+        print(line)
+
+
+def _list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reports', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--layouts', type=_list, default=list(LAYOUTS))
+    parser.add_argument('--formats', type=_list, default=['text', 'pdf'],
+                        help=f"comma-separated subset of {','.join(FORMATS)}")
+    parser.add_argument('--noise', type=float, default=0.0, help="OCR-style error rate per character")
+    parser.add_argument('--abnormal-rate', type=float, default=0.3)
+    parser.add_argument('--tests', type=int, default=25, help="tests per report")
+    parser.add_argument('--pages', type=int, default=1)
+    parser.add_argument('--memory-reports', type=int, default=50)
+    parser.add_argument('--rag', action='store_true', help="include MedLabRAG.enhance_analysis")
+    parser.add_argument('--output', help="JSON results path (default benchmarks/results/pipeline-<time>.json)")
+    parser.add_argument('--compare', help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    results = run_benchmark(args)
+    print_results(results, baseline)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"pipeline-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
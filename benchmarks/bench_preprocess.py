@@ -0,0 +1,85 @@
+# benchmarks/bench_preprocess.py
+# OCR time and parameter recall with and without each preprocessing step
+#
+# Renders synthetic reports as degraded "phone photos" (high resolution,
+# skewed, unevenly lit, noisy) and OCRs them with each preprocessing
+# configuration. Requires the tesseract binary.
+#
+# Usage: python benchmarks/bench_preprocess.py [--pages N] [--seed S]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parse import synthetic_page
+from image_preprocessing import DEFAULT_PREPROCESSING, PREPROCESS_STEPS
+from lab_parser import parse_lab_values
+from ocr_pipeline import ocr_image
+
+
+def render_photo(text: str, rng: random.Random) -> Image.Image:
+    """Render report text, then degrade it like a handheld phone photo"""
+    font = ImageFont.load_default(size=64)
+    lines = text.split("\n")
+    page = Image.new('L', (3000, 160 + 90 * len(lines)), 255)
+    draw = ImageDraw.Draw(page)
+    for i, line in enumerate(lines):
+        draw.text((120, 80 + i * 90), line, fill=20, font=font)
+
+    page = page.rotate(rng.uniform(-6, 6), resample=Image.BICUBIC, expand=True, fillcolor=255)
+    pixels = np.asarray(page, dtype=np.float32)
+    h, w = pixels.shape
+    # Light falls off towards one corner
+    gradient = np.linspace(1.0, rng.uniform(0.55, 0.8), w)[None, :] * np.linspace(1.0, 0.85, h)[:, None]
+    noise = np.random.default_rng(rng.randint(0, 2 ** 32 - 1)).normal(0, 12, pixels.shape)
+    pixels = np.clip(pixels * gradient + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(1.2))
+
+
+def recall(truth: dict, parsed: dict) -> float:
+    if not truth:
+        return 1.0
+    return sum(parsed.get(k) == v for k, v in truth.items()) / len(truth)
+
+
+def configurations():
+    none = {step: False for step in PREPROCESS_STEPS}
+    yield 'none', none
+    for step in PREPROCESS_STEPS:
+        yield step, {**none, step: True}
+    yield 'default', {step: DEFAULT_PREPROCESSING[step] for step in PREPROCESS_STEPS}
+    yield 'all', {step: True for step in PREPROCESS_STEPS}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    samples = []
+    for _ in range(args.pages):
+        text = synthetic_page(rng)
+        samples.append((render_photo(text, rng), parse_lab_values(text)))
+
+    print(f"{'config':>10} {'ms/page':>9} {'recall':>7}")
+    for name, steps in configurations():
+        elapsed, scores = 0.0, []
+        for image, truth in samples:
+            start = time.perf_counter()
+            text = ocr_image(image, preprocess=steps)
+            elapsed += time.perf_counter() - start
+            scores.append(recall(truth, parse_lab_values(text)))
+        print(f"{name:>10} {elapsed / len(samples) * 1000:>9.0f} {np.mean(scores):>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
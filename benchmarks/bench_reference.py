@@ -0,0 +1,80 @@
+# benchmarks/bench_reference.py
+# Cohort flagging: vectorized ReferenceTable vs a per-value Python loop
+#
+# Usage: python benchmarks/bench_reference.py [--patients N] [--seed S]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from medical_reference import REFERENCE_RANGES, CRITICAL_VALUES
+from reference_engine import flag_results, reference_bounds
+
+
+def synthetic_cohort(patients: int, seed: int) -> pd.DataFrame:
+    """Patients x tests values spread around each reference range, ~20% missing"""
+    rng = np.random.default_rng(seed)
+    data = {'sex': rng.choice(['male', 'female'], size=patients)}
+    for test in REFERENCE_RANGES:
+        low, high = reference_bounds(test, 'male')
+        span = max(high - low, 1.0)
+        values = rng.uniform(low - 0.5 * span, high + 0.5 * span, size=patients)
+        values[rng.random(patients) < 0.2] = np.nan
+        data[test] = values
+    return pd.DataFrame(data)
+
+
+def loop_flags(cohort: pd.DataFrame) -> int:
+    """Per-value baseline mirroring get_status_class / check_critical_values"""
+    flagged = 0
+    for record in cohort.to_dict('records'):
+        sex = record.pop('sex')
+        for test, value in record.items():
+            if value != value:
+                continue
+            ref = REFERENCE_RANGES[test]
+            if 'male' in ref and 'female' in ref:
+                low, high = ref[sex]
+            else:
+                low, high = ref.get('range') or ref['non-smoker']
+            flagged += value < low or value > high
+            if test in CRITICAL_VALUES:
+                crit_low, crit_high = CRITICAL_VALUES[test]
+                flagged += value < crit_low or value > crit_high
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--patients', type=int, default=100_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cohort = synthetic_cohort(args.patients, args.seed)
+    cells = args.patients * len(REFERENCE_RANGES)
+
+    start = time.perf_counter()
+    flags = flag_results(cohort)
+    vectorized = time.perf_counter() - start
+    vector_count = int(flags['low'].to_numpy().sum() + flags['high'].to_numpy().sum()
+                       + flags['critical'].to_numpy().sum())
+
+    start = time.perf_counter()
+    loop_count = loop_flags(cohort)
+    loop = time.perf_counter() - start
+
+    assert vector_count == loop_count, (vector_count, loop_count)
+    print(f"{args.patients} patients x {len(REFERENCE_RANGES)} tests ({cells:,} cells)")
+    print(f"  vectorized: {vectorized:8.3f}s  ({cells / vectorized / 1e6:.1f}M cells/s)")
+    print(f"  loop:       {loop:8.3f}s  ({cells / loop / 1e6:.1f}M cells/s)")
+    print(f"  speedup:    {loop / vectorized:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# benchmarks/bench_retrieval.py
+# BM25 vs dense vs hybrid retrieval: startup, query latency and top-k overlap
+#
+# The BM25 part runs anywhere. The dense/hybrid comparison needs
+# sentence-transformers and faiss-cpu and is skipped without them.
+#
+# Usage: python benchmarks/bench_retrieval.py [--chunks N] [--queries Q] [--k K] [--seed S]
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_rag_batch import synthetic_patients
+from lexical_index import BM25Index
+from rag_components import MedLabRAG, RETRIEVAL_MODES
+
+FREE_TEXT_QUERIES = [
+    "low ferritin and microcytic anemia",
+    "macrocytic anemia with neurological symptoms",
+    "elevated LDH low haptoglobin",
+    "blasts in peripheral blood pancytopenia",
+    "HbA1c above 6.5 fasting glucose",
+    "ALT much higher than AST jaundice",
+    "creatinine rise within 48 hours",
+    "high TSH positive anti-TPO",
+    "positive anti-CCP morning stiffness",
+    "folate deficiency in alcoholism",
+]
+
+
+def percentiles(samples):
+    p50, p99 = np.percentile(np.array(samples) * 1000, [50, 99])
+    return f"p50 {p50:7.3f} ms  p99 {p99:7.3f} ms"
+
+
+def synthetic_corpus(chunks: int, rng: random.Random):
+    """Chunks of shuffled knowledge-base sentences"""
+    knowledge = MedLabRAG(retrieval='lexical').lexical_chunks
+    sentences = [s for chunk in knowledge
+                 for s in re.split(r'(?<=\.)\s+', " ".join(chunk.page_content.split())) if s]
+    return [" ".join(rng.sample(sentences, 6)) for _ in range(chunks)]
+
+
+def bench_bm25(chunks: int, queries, rng: random.Random):
+    corpus = synthetic_corpus(chunks, rng)
+    start = time.perf_counter()
+    index = BM25Index(corpus)
+    build = time.perf_counter() - start
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        index.search(query, 3)
+        latencies.append(time.perf_counter() - start)
+    print(f"BM25 over {chunks} synthetic chunks: build {build * 1000:.1f} ms, {percentiles(latencies)}")
+
+
+def bench_modes(queries, k: int):
+    with tempfile.TemporaryDirectory() as index_dir:
+        systems = {mode: MedLabRAG(index_dir=index_dir, retrieval=mode) for mode in RETRIEVAL_MODES}
+        if systems['dense'].active_retrieval() != 'dense':
+            print("Dense retrieval unavailable (sentence-transformers/faiss missing); skipping comparison")
+            return
+        print(f"Lexical startup over the knowledge base: {systems['lexical'].lexical_seconds * 1000:.2f} ms")
+
+        results = {}
+        for mode, rag in systems.items():
+            latencies, found = [], []
+            for query in queries:
+                rag.clear_caches()
+                start = time.perf_counter()
+                docs = rag.search(query, k)
+                latencies.append(time.perf_counter() - start)
+                found.append({doc.page_content for doc in docs})
+            results[mode] = found
+            print(f"  {mode:>8}: {percentiles(latencies)}")
+
+        for mode in ('lexical', 'hybrid'):
+            overlap = np.mean([len(a & b) / k for a, b in zip(results[mode], results['dense'])])
+            print(f"  {mode:>8} overlap@{k} with dense: {overlap:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chunks', type=int, default=10_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    queries = FREE_TEXT_QUERIES + [
+        query for query in map(MedLabRAG.build_query, synthetic_patients(args.queries, args.seed))
+        if query is not None
+    ]
+    bench_bm25(args.chunks, queries, rng)
+    bench_modes(queries, args.k)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_rules.py
+# Rule engine throughput: per-patient patterns()/diagnoses() vs evaluate_batch()
+#
+# Patients get a random subset of the tests the rules use, with values
+# spread around each reference range.
+#
+# Usage: python benchmarks/bench_rules.py [--patients N] [--seed S]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reference_engine import reference_bounds
+from rule_engine import RULE_ENGINE
+
+
+def synthetic_cohort(patients: int, seed: int):
+    rng = np.random.default_rng(seed)
+    cohort = []
+    for _ in range(patients):
+        categorized = {}
+        for category, test in RULE_ENGINE.columns:
+            if rng.random() < 0.4:
+                continue
+            low, high = reference_bounds(test) or (0, 1)
+            span = (high - low) or high or 1
+            value = round(float(rng.uniform(max(low - 0.5 * span, 0), high + 0.5 * span)), 2)
+            categorized.setdefault(category, {})[test] = value
+        cohort.append(categorized)
+    return cohort
+
+
+def evaluate_single(categorized):
+    return {
+        'patterns': {category: RULE_ENGINE.patterns(category, tests)
+                     for category, tests in categorized.items() if tests and category in RULE_ENGINE.pattern_rules},
+        'diagnoses': RULE_ENGINE.diagnoses(categorized),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--patients', type=int, default=50_000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    cohort = synthetic_cohort(args.patients, args.seed)
+    start = time.perf_counter()
+    expected = [evaluate_single(patient) for patient in cohort]
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = RULE_ENGINE.evaluate_batch(cohort)
+    batched = time.perf_counter() - start
+
+    identical = sum(a == b for a, b in zip(batch, expected))
+    print(f"{args.patients} patients, {len(RULE_ENGINE.columns)} rule inputs")
+    print(f"  {'per-patient':>12}: {args.patients / single:10.0f} patients/s")
+    print(f"  {'batch':>12}: {args.patients / batched:10.0f} patients/s ({single / batched:.1f}x)")
+    print(f"  identical output for {identical}/{args.patients} patients")
+
+
+if __name__ == "__main__":
+    main()
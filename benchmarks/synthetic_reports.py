@@ -0,0 +1,312 @@
+# benchmarks/synthetic_reports.py
+# Seeded generator of synthetic lab reports with known values
+#
+# Values are sampled around REFERENCE_RANGES (normal, or low/high for a share
+# of tests), laid out in one of several report styles, optionally degraded
+# with OCR-style character noise, and rendered as plain text, a PNG scan, a
+# PDF with a text layer or an image-only ("scanned") PDF.
+#
+# Usage: python benchmarks/synthetic_reports.py OUT_DIR [--count N] [--seed S]
+#            [--formats png,pdf,scan_pdf] [--noise 0.01]
+#
+# OUT_DIR receives the reports, a demographics.csv for batch_cli.py and a
+# truth.jsonl with the expected parsed values of every file.
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import re
+import sys
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lab_parser import LAB_PATTERNS, _aliases, _label_group
+from medical_reference import REFERENCE_RANGES
+from reference_engine import reference_bounds
+
+LAYOUTS = ('colon', 'columns', 'flagged', 'pipe')
+FORMATS = ('text', 'png', 'pdf', 'scan_pdf')
+
+MIME_TYPES = {'text': 'text/plain', 'png': 'image/png', 'pdf': 'application/pdf', 'scan_pdf': 'application/pdf'}
+EXTENSIONS = {'text': '.txt', 'png': '.png', 'pdf': '.pdf', 'scan_pdf': '.pdf'}
+
+# Characters OCR engines commonly confuse, in both directions
+OCR_CONFUSIONS = {
+    'O': '0', '0': 'O', 'o': '0', 'l': '1', '1': 'l', 'I': '1', 'S': '5', '5': 'S',
+    'B': '8', '8': 'B', 'g': '9', 'Z': '2', '.': ',', ',': '.', ':': ';', 'e': 'c',
+}
+
+HEADER = [
+    "CITY DIAGNOSTIC LABORATORY",
+    "Patient Name: ******  Sample ID: {sample}  Age/Sex: {age}/{sex}",
+    "Collected: 2026-{month:02d}-{day:02d} 08:{minute:02d}  Reported: 2026-{month:02d}-{day:02d} 14:{minute:02d}",
+    "Referring Physician: Dr. ******",
+]
+FOOTER = [
+    "Method: Automated analyser. Results verified by the signing pathologist.",
+    "Interpretation should be correlated with clinical findings.",
+    "*** End of Report ***",
+]
+
+# Tests the parser reads as numbers, with the aliases a report may print
+# (plain-text aliases only; regex-shaped ones such as 'T\.?\s*Bili' are skipped)
+NUMERIC_TESTS = [test for test in LAB_PATTERNS if test in REFERENCE_RANGES and test != 'ANA']
+TEST_ALIASES = {
+    test: [alias for alias in _aliases(_label_group(LAB_PATTERNS[test])) if re.fullmatch(r"[\w /-]+", alias)]
+    for test in NUMERIC_TESTS
+}
+
+
+def _decimals(high: float) -> int:
+    return 0 if high >= 100 else 1 if high >= 10 else 2
+
+
+def sample_value(test: str, gender: str, rng: random.Random, abnormal_rate: float = 0.3):
+    """(value, flag) for a test: inside the reference range, or 'L'/'H' outside it"""
+    low, high = reference_bounds(test, gender)
+    span = (high - low) or high or 1
+    flag = ''
+    if rng.random() < abnormal_rate:
+        flag = 'L' if low > 0 and rng.random() < 0.5 else 'H'
+    if flag == 'L':
+        value = rng.uniform(max(low - 0.5 * span, low * 0.3), low)
+    elif flag == 'H':
+        value = rng.uniform(high, high + span)
+    else:
+        value = rng.uniform(low, high)
+    # Platelets are captured as integers by the parser
+    decimals = 0 if test == 'Platelets' else _decimals(high)
+    value = round(value, decimals)
+    if decimals == 0:
+        value = int(value)
+    if flag and low <= value <= high:
+        flag = ''
+    return value, flag
+
+
+def format_report(values: Dict, flags: Dict, layout: str, gender: str, age: int, rng: random.Random,
+                  alias_rate: float = 0.2) -> str:
+    """Report text for the sampled values in one of LAYOUTS"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"layout must be one of {LAYOUTS}, got {layout!r}")
+    month, day = rng.randint(1, 12), rng.randint(1, 28)
+    lines = [line.format(sample=rng.randint(10000, 99999), age=age, sex=gender[0].upper(),
+                         month=month, day=day, minute=rng.randint(0, 59)) for line in HEADER]
+    lines.append("")
+    if layout == 'columns':
+        lines.append(f"{'Test':<28}{'Result':>10}  {'Unit':<14}{'Reference':<14}")
+    elif layout == 'pipe':
+        lines.append("| Test | Result | Unit | Reference |")
+    for test, value in values.items():
+        aliases = TEST_ALIASES[test]
+        label = rng.choice(aliases[1:]) if len(aliases) > 1 and rng.random() < alias_rate else aliases[0]
+        unit = REFERENCE_RANGES[test]['unit']
+        low, high = reference_bounds(test, gender)
+        reference = f"{low}-{high}"
+        if layout == 'colon':
+            lines.append(f"{label}: {value} {unit}   (Ref: {reference})")
+        elif layout == 'columns':
+            lines.append(f"{label:<28}{value:>10}  {unit:<14}{reference:<14}")
+        elif layout == 'flagged':
+            lines.append(f"{label} {value} {flags[test] or ' '} {unit} [{reference}]")
+        else:
+            lines.append(f"| {label} | {value} | {unit} | {reference} |")
+    lines.append("")
+    lines.extend(rng.sample(FOOTER, k=2))
+    return "\n".join(lines)
+
+
+def add_ocr_noise(text: str, rng: random.Random, rate: float) -> str:
+    """Apply OCR-style errors to about rate of the characters:
+    confusable substitutions, dropped characters and doubled spaces
+    """
+    if rate <= 0:
+        return text
+    out = []
+    for ch in text:
+        if ch == '\n' or rng.random() >= rate:
+            out.append(ch)
+        elif ch in OCR_CONFUSIONS:
+            out.append(OCR_CONFUSIONS[ch])
+        elif ch == ' ':
+            out.append('  ')
+        elif rng.random() < 0.5:
+            out.append(ch + ch)
+        # else the character is dropped
+    return "".join(out)
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has a single fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+def render_page_image(text: str, rng: random.Random, dpi: int = 150, degrade: bool = True) -> Image.Image:
+    """Letter-size grayscale page with the text drawn on it; degrade adds
+    slight rotation, blur and speckle like a phone photo or fax
+    """
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    size = max(10, dpi // 9)
+    image = Image.new('L', (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    draw.multiline_text((dpi // 2, dpi // 2), text.replace('μ', 'u'), fill=0, font=_font(size),
+                        spacing=size // 2)
+    if degrade:
+        image = image.rotate(rng.uniform(-2, 2), resample=Image.BILINEAR, fillcolor=255, expand=False)
+        image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0, 0.8)))
+        pixels = image.load()
+        for _ in range(width * height // 2000):
+            pixels[rng.randrange(width), rng.randrange(height)] = rng.choice((0, 128))
+    return image
+
+
+def render_png(text: str, rng: random.Random, dpi: int = 150, degrade: bool = True) -> bytes:
+    buffer = io.BytesIO()
+    render_page_image(text, rng, dpi, degrade).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def render_scanned_pdf(pages: Sequence[str], rng: random.Random, dpi: int = 150, degrade: bool = True) -> bytes:
+    """PDF of page images only, so every page has to be OCR'd"""
+    images = [render_page_image(page, rng, dpi, degrade) for page in pages]
+    buffer = io.BytesIO()
+    images[0].save(buffer, format='PDF', resolution=dpi, save_all=True, append_images=images[1:])
+    return buffer.getvalue()
+
+
+def _pdf_string(line: str) -> str:
+    line = line.replace('μ', 'µ').encode('cp1252', errors='replace').decode('latin-1')
+    return '(' + line.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') + ')'
+
+
+def render_text_pdf(pages: Sequence[str]) -> bytes:
+    """Minimal PDF with a Helvetica text layer, one page per string"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"]
+    kids = []
+    for page in pages:
+        stream = "BT /F1 9 Tf 40 760 Td 12 TL " + " ".join(
+            f"{_pdf_string(line)} '" for line in page.split("\n")) + " ET"
+        objects.append(f"<< /Length {len(stream.encode('latin-1'))} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {len(objects)} 0 R "
+                       f"/Resources << /Font << /F1 3 0 R >> >> >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    out = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode('latin-1')
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+
+def generate_reports(count: int, seed: int = 0, layouts: Sequence[str] = LAYOUTS, formats: Sequence[str] = ('text',),
+                     noise: float = 0.0, abnormal_rate: float = 0.3, tests_per_report: int = 25,
+                     pages: int = 1, dpi: int = 150) -> Iterator[Dict]:
+    """Yield count synthetic reports, cycling through layout and format combinations.
+
+    Each report is a dict with id, layout, format, mime, gender, age,
+    truth (test -> value as the parser should return it), flags (test ->
+    'L'/'H'/''), text (after OCR noise) and data (the file bytes; None for
+    'text'). The same seed always yields the same reports.
+    """
+    for fmt in formats:
+        if fmt not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}, got {fmt!r}")
+    rng = random.Random(seed)
+    for number in range(count):
+        # Every layout is rendered in every format
+        layout = layouts[number % len(layouts)]
+        fmt = formats[number // len(layouts) % len(formats)]
+        gender = rng.choice(('male', 'female'))
+        age = rng.randint(18, 90)
+        tests = rng.sample(NUMERIC_TESTS, k=min(tests_per_report, len(NUMERIC_TESTS)))
+        values, flags = {}, {}
+        for test in tests:
+            values[test], flags[test] = sample_value(test, gender, rng, abnormal_rate)
+
+        # Split the tests over pages, each with its own header and footer
+        page_texts = []
+        per_page = -(-len(tests) // pages)
+        for start in range(0, len(tests), per_page):
+            page_values = {test: values[test] for test in tests[start:start + per_page]}
+            page_texts.append(add_ocr_noise(format_report(page_values, flags, layout, gender, age, rng), rng, noise))
+
+        data = None
+        if fmt == 'png':
+            data = render_png("\n\n".join(page_texts), rng, dpi)
+        elif fmt == 'pdf':
+            data = render_text_pdf(page_texts)
+        elif fmt == 'scan_pdf':
+            data = render_scanned_pdf(page_texts, rng, dpi)
+        yield {
+            'id': f"report-{seed}-{number:05d}",
+            'layout': layout,
+            'format': fmt,
+            'mime': MIME_TYPES[fmt],
+            'gender': gender,
+            'age': age,
+            'truth': {test: float(value) for test, value in values.items()},
+            'flags': flags,
+            'text': "\n\f\n".join(page_texts),
+            'data': data,
+        }
+
+
+def write_corpus(directory: str, reports: Iterator[Dict]) -> int:
+    """Write reports as files plus demographics.csv and truth.jsonl"""
+    os.makedirs(directory, exist_ok=True)
+    written = 0
+    with open(os.path.join(directory, 'demographics.csv'), 'w', newline='', encoding='utf-8') as demo, \
+            open(os.path.join(directory, 'truth.jsonl'), 'w', encoding='utf-8') as truth:
+        writer = csv.writer(demo)
+        writer.writerow(['file', 'gender', 'age'])
+        for report in reports:
+            name = report['id'] + EXTENSIONS[report['format']]
+            mode, payload = ('wb', report['data']) if report['data'] is not None else ('w', report['text'])
+            with open(os.path.join(directory, name), mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+                f.write(payload)
+            writer.writerow([name, report['gender'], report['age']])
+            truth.write(json.dumps({'file': name, 'layout': report['layout'], 'truth': report['truth']}) + "\n")
+            written += 1
+    return written
+
+
+def _list(value: str) -> List[str]:
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Write a seeded corpus of synthetic lab reports")
+    parser.add_argument('out_dir')
+    parser.add_argument('--count', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--layouts', type=_list, default=list(LAYOUTS))
+    parser.add_argument('--formats', type=_list, default=['png', 'pdf'])
+    parser.add_argument('--noise', type=float, default=0.0, help="OCR-style error rate per character")
+    parser.add_argument('--abnormal-rate', type=float, default=0.3)
+    parser.add_argument('--tests', type=int, default=25, help="tests per report")
+    parser.add_argument('--pages', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    count = write_corpus(args.out_dir, generate_reports(
+        args.count, args.seed, args.layouts, args.formats, args.noise, args.abnormal_rate, args.tests, args.pages))
+    print(f"Wrote {count} reports to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
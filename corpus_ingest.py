@@ -0,0 +1,106 @@
+# corpus_ingest.py
+# Incremental ingestion of a directory of guideline documents into the RAG index
+#
+# Usage: python corpus_ingest.py CORPUS_DIR [--index-dir DIR] [--workers N] [--batch-size B]
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence, Tuple
+
+# Extensions picked up from the corpus directory
+SUPPORTED_EXTENSIONS = ('.md', '.markdown', '.txt', '.pdf')
+
+# Per-file record of what is in the index, stored next to the index files
+INGEST_STATE_FILE = "ingest.json"
+
+
+def scan_corpus(directory: str) -> Dict[str, Tuple[str, str]]:
+    """Map each supported file's path relative to directory to (path, sha256)"""
+    files = {}
+    for root, dirs, names in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+        for name in sorted(names):
+            if name.startswith('.') or not name.lower().endswith(SUPPORTED_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()
+            files[os.path.relpath(path, directory).replace(os.sep, '/')] = (path, digest)
+    return files
+
+
+def read_document(path: str) -> str:
+    """Text of a markdown/text file, or the embedded text layer of a PDF"""
+    if path.lower().endswith('.pdf'):
+        from ocr_pipeline import read_text_layer
+        with open(path, 'rb') as f:
+            pages = read_text_layer(f.read())
+        if pages is None:
+            raise ValueError(f"no readable text layer in {path}")
+        return "\n\n".join(pages)
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return f.read()
+
+
+def load_ingest_state(index_dir: str) -> Dict[str, Dict]:
+    try:
+        with open(os.path.join(index_dir, INGEST_STATE_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def plan_ingestion(files: Dict[str, Tuple[str, str]],
+                   state: Dict[str, Dict]) -> Tuple[List[str], List[str]]:
+    """(files to (re-)embed, files whose vectors must be removed).
+
+    A changed file appears in both lists.
+    """
+    changed = [name for name, (_, digest) in files.items()
+               if name not in state or state[name]['sha256'] != digest]
+    removed = [name for name in state if name not in files or name in changed]
+    return changed, removed
+
+
+def chunk_id(name: str, digest: str, index: int) -> str:
+    """Stable docstore id of a corpus chunk, so its vector can be deleted later"""
+    return f"corpus:{name}:{digest[:16]}:{index}"
+
+
+def embed_in_batches(embeddings, texts: Sequence[str], batch_size: int = 64,
+                     workers: int = 1) -> List[List[float]]:
+    """Embed texts batch_size at a time, spreading batches over a thread pool"""
+    batches = [list(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+    if workers <= 1 or len(batches) <= 1:
+        vectors = [embeddings.embed_documents(batch) for batch in batches]
+    else:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='embed') as pool:
+            vectors = list(pool.map(embeddings.embed_documents, batches))
+    return [vector for batch in vectors for vector in batch]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add a directory of guideline documents to the RAG index")
+    parser.add_argument('corpus', help="Directory of .md/.txt/.pdf documents")
+    parser.add_argument('--index-dir', default="medical_vectorstore")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="Parallel embedding batches")
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    from rag_components import MedLabRAG
+    rag = MedLabRAG(index_dir=args.index_dir)
+    if not rag.ready:
+        print("RAG system failed to initialize", file=sys.stderr)
+        return 1
+    summary = rag.ingest_corpus(args.corpus, workers=args.workers, batch_size=args.batch_size)
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
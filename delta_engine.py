@@ -0,0 +1,194 @@
+# delta_engine.py
+# Delta checks, trends and KDIGO AKI staging over result histories, as NumPy
+# operations on long-form (patient/test, time, value) arrays
+
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+DAY_SECONDS = 86400.0
+
+# Delta-check limits on the change from the previous result of the same test:
+# absolute (in the test's unit) and/or percent, applied when the previous
+# result is at most 'days' old
+DELTA_LIMITS = {
+    'Hemoglobin': {'absolute': 2.0, 'days': 7},
+    'Hematocrit': {'absolute': 6.0, 'days': 7},
+    'MCV': {'absolute': 6.0, 'days': 30},
+    'WBC': {'percent': 50, 'days': 7},
+    'Platelets': {'percent': 50, 'days': 7},
+    'Sodium': {'absolute': 8, 'days': 7},
+    'Potassium': {'absolute': 1.0, 'days': 7},
+    'Chloride': {'absolute': 8, 'days': 7},
+    'Bicarbonate': {'absolute': 6, 'days': 7},
+    'Calcium': {'absolute': 1.5, 'days': 7},
+    'BUN': {'percent': 50, 'days': 7},
+    'Glucose_Fasting': {'percent': 50, 'days': 30},
+    'ALT': {'percent': 100, 'days': 30},
+    'AST': {'percent': 100, 'days': 30},
+    'Total_Bilirubin': {'percent': 100, 'days': 30},
+    'TSH': {'percent': 100, 'days': 180},
+    'HbA1c': {'absolute': 1.0, 'days': 180},
+    # Sustained eGFR decline of 25% marks CKD progression (KDIGO)
+    'eGFR': {'percent': 25, 'days': 365},
+}
+
+# KDIGO AKI: creatinine rise of 0.3 mg/dL within 48 hours, or to 1.5x the
+# lowest value of the prior 7 days; stage 2 at 2.0x, stage 3 at 3.0x or 4.0 mg/dL
+AKI_RISE_MG_DL = 0.3
+AKI_RISE_HOURS = 48
+AKI_BASELINE_DAYS = 7
+AKI_STAGE_RATIOS = (1.5, 2.0, 3.0)
+AKI_STAGE3_CREATININE = 4.0
+
+# Changes and ratios are rounded to this many decimals before they are
+# compared with a limit, so that e.g. 1.2 - 0.9 (0.29999999999999993)
+# counts as a 0.3 rise
+COMPARE_DECIMALS = 6
+
+
+def window_min(keys: np.ndarray, times: np.ndarray, values: np.ndarray, window: float) -> np.ndarray:
+    """Lowest earlier value of the same key at most window seconds before each row.
+
+    Rows must be sorted by (key, time). Loops over lags, not rows: each
+    pass compares every row with the row lag places earlier, and stops
+    once no row has an earlier result of its key inside the window.
+    """
+    result = np.full(len(values), np.nan)
+    for lag in range(1, len(values)):
+        valid = (keys[lag:] == keys[:-lag]) & (times[lag:] - times[:-lag] <= window)
+        if not valid.any():
+            break
+        result[lag:] = np.fmin(result[lag:], np.where(valid, values[:-lag], np.nan))
+    return result
+
+
+def aki_stages(creatinine: np.ndarray, rise_48h: np.ndarray, baseline_7d: np.ndarray) -> np.ndarray:
+    """KDIGO stage (0-3) per creatinine result, given the lowest prior values
+    within 48 hours and 7 days (NaN when there is none)
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = np.round(creatinine / baseline_7d, COMPARE_DECIMALS)
+        rise = np.round(creatinine - rise_48h, COMPARE_DECIMALS)
+        aki = (rise >= AKI_RISE_MG_DL) | (ratio >= AKI_STAGE_RATIOS[0])
+    stages = np.where(aki, 1, 0)
+    stages = np.where(aki & (ratio >= AKI_STAGE_RATIOS[1]), 2, stages)
+    return np.where(aki & ((ratio >= AKI_STAGE_RATIOS[2]) | (creatinine >= AKI_STAGE3_CREATININE)), 3, stages)
+
+
+def delta_frame(results: pd.DataFrame) -> pd.DataFrame:
+    """Changes between consecutive results per patient and test.
+
+    results has columns patient, test, taken_at (Unix seconds or datetime)
+    and value. Returns the numeric rows sorted by patient, test and time,
+    with previous, previous_at, change, percent_change, days, rate_per_day,
+    delta_flag (DELTA_LIMITS exceeded) and, for creatinine, aki_stage.
+    """
+    frame = results[['patient', 'test', 'taken_at', 'value']].copy()
+    frame['value'] = pd.to_numeric(frame['value'], errors='coerce')
+    frame = frame.dropna(subset=['value'])
+    if pd.api.types.is_datetime64_any_dtype(frame['taken_at']):
+        frame['taken_at'] = frame['taken_at'].astype('datetime64[ns]').astype('int64') / 1e9
+    frame = frame.sort_values(['patient', 'test', 'taken_at'], kind='stable').reset_index(drop=True)
+
+    keys = frame.groupby(['patient', 'test'], sort=False).ngroup().to_numpy()
+    times = frame['taken_at'].to_numpy(dtype=float)
+    values = frame['value'].to_numpy(dtype=float)
+    tests = frame['test'].to_numpy(dtype=object)
+
+    first = np.r_[True, keys[1:] != keys[:-1]]
+    previous = np.where(first, np.nan, np.r_[np.nan, values[:-1]])
+    previous_at = np.where(first, np.nan, np.r_[np.nan, times[:-1]])
+    change = values - previous
+    days = (times - previous_at) / DAY_SECONDS
+    with np.errstate(invalid='ignore', divide='ignore'):
+        percent = np.where(previous != 0, 100 * change / np.abs(previous), np.nan)
+        rate = np.where(days > 0, change / days, np.nan)
+
+    # Per-row limits looked up once per distinct test
+    absolute_limit = np.full(len(frame), np.inf)
+    percent_limit = np.full(len(frame), np.inf)
+    max_days = np.zeros(len(frame))
+    for test, limits in DELTA_LIMITS.items():
+        rows = tests == test
+        absolute_limit[rows] = limits.get('absolute', np.inf)
+        percent_limit[rows] = limits.get('percent', np.inf)
+        max_days[rows] = limits['days']
+    with np.errstate(invalid='ignore'):
+        flag = (days <= max_days) & ((np.round(np.abs(change), COMPARE_DECIMALS) >= absolute_limit)
+                                     | (np.round(np.abs(percent), COMPARE_DECIMALS) >= percent_limit))
+
+    stage = np.zeros(len(frame), dtype=int)
+    creatinine = tests == 'Creatinine'
+    if creatinine.any():
+        k, t, v = keys[creatinine], times[creatinine], values[creatinine]
+        stage[creatinine] = aki_stages(v, window_min(k, t, v, AKI_RISE_HOURS * 3600),
+                                       window_min(k, t, v, AKI_BASELINE_DAYS * DAY_SECONDS))
+
+    return frame.assign(previous=previous, previous_at=previous_at, change=change, percent_change=percent,
+                        days=days, rate_per_day=rate, delta_flag=flag, aki_stage=stage)
+
+
+def _date(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def _number(value) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), 3)
+
+
+def patient_trends(history: Dict, current: Dict, taken_at: float) -> Dict:
+    """Trend section of an analysis: current results against a patient's history.
+
+    history maps test -> (times, values) as returned by ResultStore.history;
+    only results before taken_at (Unix seconds) count as prior. Returns
+    {'changes': [...], 'alerts': [...], 'aki_stage': int}.
+    """
+    rows = []
+    for test, value in current.items():
+        if not isinstance(value, (int, float)) or test not in history:
+            continue
+        times, values = history[test]
+        times = times.astype('datetime64[s]').astype(np.int64).astype(float)
+        prior = times < taken_at
+        if not prior.any():
+            continue
+        rows.append(pd.DataFrame({'patient': 0, 'test': test, 'taken_at': np.r_[times[prior], taken_at],
+                                  'value': np.r_[values[prior], value]}))
+    trends = {'changes': [], 'alerts': [], 'aki_stage': 0}
+    if not rows:
+        return trends
+
+    deltas = delta_frame(pd.concat(rows, ignore_index=True))
+    latest = deltas[deltas['taken_at'] == taken_at]
+    for row in latest.itertuples(index=False):
+        trends['changes'].append({
+            'test': row.test,
+            'previous': _number(row.previous),
+            'previous_date': _date(row.previous_at),
+            'current': _number(row.value),
+            'change': _number(row.change),
+            'percent_change': _number(row.percent_change),
+            'days': _number(row.days),
+            'rate_per_day': _number(row.rate_per_day),
+            'delta_flag': bool(row.delta_flag),
+        })
+        if row.delta_flag:
+            direction = 'rose' if row.change > 0 else 'fell'
+            percent = f", {row.percent_change:+.0f}%" if np.isfinite(row.percent_change) else ""
+            trends['alerts'].append(
+                f"⚠️ Delta check: {row.test} {direction} from {row.previous:g} to {row.value:g} "
+                f"({row.change:+.4g}{percent}) since {_date(row.previous_at)}"
+            )
+        if row.aki_stage:
+            trends['aki_stage'] = int(row.aki_stage)
+            baseline = deltas.loc[(deltas['test'] == 'Creatinine')
+                                  & (deltas['taken_at'] >= taken_at - AKI_BASELINE_DAYS * DAY_SECONDS)
+                                  & (deltas['taken_at'] < taken_at), 'value'].min()
+            trends['alerts'].insert(0,
+                f"🚨 KDIGO AKI stage {row.aki_stage}: creatinine {row.value:g} mg/dL vs "
+                f"{baseline:g} mg/dL in the prior {AKI_BASELINE_DAYS} days"
+            )
+    return trends
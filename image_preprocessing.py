@@ -0,0 +1,141 @@
+# image_preprocessing.py
+# OpenCV clean-up of photos and scans before they reach Tesseract
+
+from typing import Dict, Optional
+
+import numpy as np
+from PIL import Image
+
+try:
+    import cv2
+except ImportError:
+    cv2 = None
+
+# Steps in the order they are applied
+PREPROCESS_STEPS = ('downscale', 'deskew', 'crop', 'binarize')
+
+# Every step is opt-in until benchmarks/bench_preprocess.py shows it keeps
+# recall on clean scans as well as on phone photos
+DEFAULT_PREPROCESSING = {
+    'downscale': False,
+    'deskew': False,
+    'crop': False,
+    'binarize': False,
+    # Median glyph height (px) that downscaling aims for; Tesseract is
+    # most accurate around 20-30 px and slower on anything larger
+    'target_text_height': 30,
+    # Skew corrections beyond this angle (degrees) are treated as misdetections
+    'max_skew': 15.0,
+}
+
+
+def _block_size(gray: np.ndarray) -> int:
+    """Odd neighbourhood size for adaptive thresholding"""
+    return max(15, (min(gray.shape) // 40) | 1)
+
+
+def _text_mask(gray: np.ndarray) -> np.ndarray:
+    """Foreground (ink) mask with white text on black"""
+    blurred = cv2.GaussianBlur(gray, (5, 5), 0)
+    return cv2.adaptiveThreshold(blurred, 255, cv2.ADAPTIVE_THRESH_MEAN_C,
+                                 cv2.THRESH_BINARY_INV, _block_size(gray), 15)
+
+
+def estimate_text_height(gray: np.ndarray) -> Optional[float]:
+    """Median height of glyph-sized connected components"""
+    count, _, stats, _ = cv2.connectedComponentsWithStats(_text_mask(gray), connectivity=8)
+    heights = stats[1:count, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:count, cv2.CC_STAT_WIDTH]
+    glyphs = heights[(heights >= 6) & (heights <= gray.shape[0] // 10) & (widths <= heights * 4)]
+    if len(glyphs) < 20:
+        return None
+    return float(np.median(glyphs))
+
+
+def downscale(gray: np.ndarray, target_text_height: float) -> np.ndarray:
+    """Shrink the image so glyphs are about target_text_height px tall"""
+    height = estimate_text_height(gray)
+    if not height or height <= target_text_height:
+        return gray
+    scale = target_text_height / height
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+
+
+def estimate_skew(gray: np.ndarray) -> float:
+    """Dominant text-line angle in degrees (positive = counter-clockwise)"""
+    mask = _text_mask(gray)
+    # Smear glyphs into line blobs so the fit follows text lines, not letters
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, gray.shape[1] // 50), 1))
+    lines = cv2.morphologyEx(mask, cv2.MORPH_CLOSE, kernel)
+    contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    angles, weights = [], []
+    for contour in contours:
+        (_, _), (w, h), angle = cv2.minAreaRect(contour)
+        if w < h:
+            w, h = h, w
+            angle -= 90
+        # OpenCV versions disagree on the reported range; fold to [-90, 90)
+        angle = (angle + 90) % 180 - 90
+        if w < gray.shape[1] * 0.1 or w < 3 * h:
+            continue
+        angles.append(angle)
+        weights.append(w)
+    if not angles:
+        return 0.0
+    # minAreaRect reports image-coordinate angles (y down)
+    return -float(np.average(angles, weights=weights))
+
+
+def deskew(gray: np.ndarray, max_skew: float) -> np.ndarray:
+    """Rotate so text lines are horizontal"""
+    angle = estimate_skew(gray)
+    if abs(angle) < 0.2 or abs(angle) > max_skew:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), -angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR,
+                          borderMode=cv2.BORDER_CONSTANT, borderValue=255)
+
+
+def crop_to_table(gray: np.ndarray) -> np.ndarray:
+    """Crop to the largest block of text lines, e.g. the results table"""
+    mask = _text_mask(gray)
+    h, w = gray.shape
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(3, w // 30), max(3, h // 60)))
+    blocks = cv2.dilate(mask, kernel)
+    contours, _ = cv2.findContours(blocks, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return gray
+    x, y, bw, bh = cv2.boundingRect(max(contours, key=cv2.contourArea))
+    if bw * bh < 0.1 * w * h:
+        return gray
+    margin = max(h, w) // 100
+    return gray[max(0, y - margin):y + bh + margin, max(0, x - margin):x + bw + margin]
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Adaptive threshold; copes with the uneven lighting of phone photos"""
+    return cv2.adaptiveThreshold(cv2.medianBlur(gray, 3), 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+                                 cv2.THRESH_BINARY, _block_size(gray), 15)
+
+
+def preprocess_for_ocr(image: Image.Image, options: Optional[Dict] = None) -> Image.Image:
+    """Apply the enabled preprocessing steps and return a greyscale image.
+
+    Returns the input unchanged when OpenCV is unavailable or no step is
+    enabled. Keys missing from options fall back to DEFAULT_PREPROCESSING.
+    """
+    options = {**DEFAULT_PREPROCESSING, **(options or {})}
+    if cv2 is None or not any(options[step] for step in PREPROCESS_STEPS):
+        return image
+
+    gray = np.asarray(image.convert('L'))
+    if options['downscale']:
+        gray = downscale(gray, options['target_text_height'])
+    if options['deskew']:
+        gray = deskew(gray, options['max_skew'])
+    if options['crop']:
+        gray = crop_to_table(gray)
+    if options['binarize']:
+        gray = binarize(gray)
+    return Image.fromarray(gray)
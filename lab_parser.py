@@ -0,0 +1,232 @@
+# lab_parser.py
+# Single-pass scanner for extracting laboratory values from OCR text
+
+import re
+from typing import Dict, Iterator, List, Tuple
+
+from telemetry import TELEMETRY
+
+# Label/value patterns for every supported parameter. Each pattern starts with
+# a non-capturing group of label aliases followed by the value capture group.
+LAB_PATTERNS = {
+    # Hematology
+    'RBC': r'(?:RBC|Red Blood Cell)[\s:]*(\d+\.?\d*)\s*(?:x?10\^?12|million)?',
+    'Hemoglobin': r'(?:Hemoglobin|Hb|HGB)[\s:]*(\d+\.?\d*)\s*(?:g/dL|g/L)?',
+    'Hematocrit': r'(?:Hematocrit|Hct|HCT)[\s:]*(\d+\.?\d*)\s*%?',
+    'MCV': r'(?:MCV)[\s:]*(\d+\.?\d*)\s*(?:fL)?',
+    'MCH': r'(?:MCH)[\s:]*(\d+\.?\d*)\s*(?:pg)?',
+    'MCHC': r'(?:MCHC)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
+    'RDW': r'(?:RDW)[\s:]*(\d+\.?\d*)\s*%?',
+    'WBC': r'(?:WBC|White Blood Cell)[\s:]*(\d+\.?\d*)\s*(?:x?10\^?9)?',
+    'Platelets': r'(?:Platelets|PLT)[\s:]*(\d+)\s*(?:x?10\^?9)?',
+    'MPV': r'(?:MPV)[\s:]*(\d+\.?\d*)\s*(?:fL)?',
+    'Neutrophils': r'(?:Neutrophils|Neutrophil|NEUT|ANC)[\s:]*(\d+\.?\d*)',
+    'Lymphocytes': r'(?:Lymphocytes|Lymphocyte|LYMPH)[\s:]*(\d+\.?\d*)',
+    'Monocytes': r'(?:Monocytes|Monocyte|MONO)[\s:]*(\d+\.?\d*)',
+    'Eosinophils': r'(?:Eosinophils|Eosinophil|EO)[\s:]*(\d+\.?\d*)',
+    'Basophils': r'(?:Basophils|Basophil|BASO)[\s:]*(\d+\.?\d*)',
+    'Reticulocytes': r'(?:Reticulocytes|Retic)[\s:]*(\d+\.?\d*)',
+    'Blasts': r'(?:Blasts|Blast)[\s:]*(\d+\.?\d*)',
+    
+    # Liver Function
+    'ALT': r'(?:ALT|SGPT|Alanine Aminotransferase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
+    'AST': r'(?:AST|SGOT|Aspartate Aminotransferase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
+    'ALP': r'(?:ALP|Alkaline Phosphatase)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
+    'GGT': r'(?:GGT|Gamma GT)[\s:]*(\d+\.?\d*)\s*(?:U/L)?',
+    'Total_Bilirubin': r'(?:Total Bilirubin|T\.?\s*Bili)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Direct_Bilirubin': r'(?:Direct Bilirubin|Conjugated)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Indirect_Bilirubin': r'(?:Indirect Bilirubin|Unconjugated)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Total_Protein': r'(?:Total Protein|T\.?\s*Protein)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
+    'Albumin': r'(?:Albumin|Alb)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
+    'Globulin': r'(?:Globulin)[\s:]*(\d+\.?\d*)\s*(?:g/dL)?',
+    'A_G_Ratio': r'(?:A/G Ratio|Albumin/Globulin)[\s:]*(\d+\.?\d*)',
+    
+    # Kidney Function
+    'Creatinine': r'(?:Creatinine|Creat)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'BUN': r'(?:BUN|Blood Urea Nitrogen|Urea)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'eGFR': r'(?:eGFR|Estimated GFR)[\s:]*(\d+\.?\d*)\s*(?:mL/min)?',
+    'Uric_Acid': r'(?:Uric Acid|Urate)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Sodium': r'(?:Sodium|Na)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
+    'Potassium': r'(?:Potassium|K)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
+    'Chloride': r'(?:Chloride|Cl)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
+    'Bicarbonate': r'(?:Bicarbonate|CO2|HCO3)[\s:]*(\d+\.?\d*)\s*(?:mEq/L)?',
+    'Calcium': r'(?:Calcium|Ca)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Phosphorus': r'(?:Phosphorus|Phosphate|P)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Magnesium': r'(?:Magnesium|Mg)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    
+    # Diabetes
+    'Glucose_Fasting': r'(?:Fasting Glucose|FBS|Fasting Blood Sugar)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Glucose_Random': r'(?:Random Glucose|RBS)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'HbA1c': r'(?:HbA1c|A1c|Glycated Hemoglobin)[\s:]*(\d+\.?\d*)\s*%?',
+    'Insulin': r'(?:Insulin|Fasting Insulin)[\s:]*(\d+\.?\d*)\s*(?:μU/mL)?',
+    'C_Peptide': r'(?:C-Peptide|C Peptide)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    
+    # Thyroid
+    'TSH': r'(?:TSH|Thyroid Stimulating Hormone)[\s:]*(\d+\.?\d*)\s*(?:μIU/mL)?',
+    'T3': r'(?:T3|Triiodothyronine|Total T3)[\s:]*(\d+\.?\d*)\s*(?:ng/dL)?',
+    'T4': r'(?:T4|Thyroxine|Total T4)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
+    'Free_T3': r'(?:Free T3|FT3)[\s:]*(\d+\.?\d*)\s*(?:pg/mL)?',
+    'Free_T4': r'(?:Free T4|FT4)[\s:]*(\d+\.?\d*)\s*(?:ng/dL)?',
+    'Anti_TPO': r'(?:Anti-TPO|TPO Antibodies)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
+    'Anti_Thyroglobulin': r'(?:Anti-Thyroglobulin|Tg Antibodies)[\s:]*(\d+\.?\d*)',
+    
+    # Lipid Profile
+    'Total_Cholesterol': r'(?:Total Cholesterol|T\.?\s*Chol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'HDL': r'(?:HDL|HDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'LDL': r'(?:LDL|LDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Triglycerides': r'(?:Triglycerides|TG)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'VLDL': r'(?:VLDL)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'Non_HDL_Cholesterol': r'(?:Non-HDL Cholesterol)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    
+    # Rheumatology/Immunology
+    'RF': r'(?:RF|Rheumatoid Factor)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
+    'Anti_CCP': r'(?:Anti-CCP|CCP Antibodies)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
+    'ANA': r'(?:ANA|Antinuclear Antibody)[\s:]*([<>\d:\s\w]+)',
+    'dsDNA': r'(?:Anti-dsDNA|dsDNA)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
+    'ESR': r'(?:ESR|Erythrocyte Sedimentation Rate)[\s:]*(\d+\.?\d*)\s*(?:mm/hr)?',
+    'CRP': r'(?:CRP|C-Reactive Protein)[\s:]*(\d+\.?\d*)\s*(?:mg/L)?',
+    'ASO': r'(?:ASO|Anti-Streptolysin O)[\s:]*(\d+\.?\d*)\s*(?:IU/mL)?',
+    
+    # Coagulation
+    'PT': r'(?:PT|Prothrombin Time)[\s:]*(\d+\.?\d*)\s*(?:seconds)?',
+    'INR': r'(?:INR|International Normalized Ratio)[\s:]*(\d+\.?\d*)',
+    'aPTT': r'(?:aPTT|APTT|Activated Partial Thromboplastin Time)[\s:]*(\d+\.?\d*)\s*(?:seconds)?',
+    'Fibrinogen': r'(?:Fibrinogen)[\s:]*(\d+\.?\d*)\s*(?:mg/dL)?',
+    'D_Dimer': r'(?:D-Dimer|Dimer)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    
+    # Tumor Markers
+    'AFP': r'(?:AFP|Alpha-Fetoprotein)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'CEA': r'(?:CEA|Carcinoembryonic Antigen)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'CA_125': r'(?:CA-125|CA 125)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
+    'CA_19_9': r'(?:CA 19-9|CA19-9)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
+    'PSA': r'(?:PSA|Prostate Specific Antigen)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'CA_15_3': r'(?:CA 15-3|CA15-3)[\s:]*(\d+\.?\d*)\s*(?:U/mL)?',
+    
+    # Vitamins
+    'Vitamin_D': r'(?:Vitamin D|25-OH Vitamin D|25\(OH\)D)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'Vitamin_B12': r'(?:Vitamin B12|B12|Cobalamin)[\s:]*(\d+\.?\d*)\s*(?:pg/mL)?',
+    'Folate': r'(?:Folate|Folic Acid)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'Iron': r'(?:Iron|Serum Iron)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
+    'Ferritin': r'(?:Ferritin)[\s:]*(\d+\.?\d*)\s*(?:ng/mL)?',
+    'TIBC': r'(?:TIBC|Total Iron Binding Capacity)[\s:]*(\d+\.?\d*)\s*(?:μg/dL)?',
+    'Transferrin_Saturation': r'(?:Transferrin Saturation|TSAT)[\s:]*(\d+\.?\d*)\s*%?',
+}
+
+
+def _label_group(pattern: str) -> str:
+    """Return the leading ``(?:...)`` label alternation of a pattern"""
+    depth = 0
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                return pattern[:i + 1]
+        i += 1
+    raise ValueError(f"Unbalanced label group in pattern: {pattern}")
+
+
+def _aliases(label_group: str) -> List[str]:
+    """Split a ``(?:a|b|c)`` label group into its aliases"""
+    return label_group[3:-1].split('|')
+
+
+def _non_capturing(pattern: str) -> str:
+    """Turn capture groups into non-capturing ones"""
+    return re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+
+
+# Lower-cases ASCII letters plus the non-ASCII characters that IGNORECASE
+# treats as equal to a letter used in LAB_PATTERNS. Every mapping is one
+# character to one character, so spans in the folded text match the original.
+_CASE_FOLD = str.maketrans({
+    **{chr(c): chr(c + 32) for c in range(ord('A'), ord('Z') + 1)},
+    '\u0130': 'i', '\u0131': 'i', '\u017f': 's', '\u212a': 'k',
+    '\u00b5': '\u03bc', '\u039c': '\u03bc',
+})
+
+
+class LabScanner:
+    """Walks OCR text once and emits (parameter, raw value, span) hits.
+
+    Patterns are lower-cased and matched case-sensitively against a case-folded
+    copy of the text, which is equivalent to ``re.IGNORECASE`` but lets the
+    regex engine skip branches on their first character. A single lookahead
+    over every pattern, grouped by first character, finds the positions where
+    some parameter matches; only parameters starting with that character are
+    tried there, and each one stops after its first (leftmost) hit. This
+    reproduces running ``re.findall`` once per pattern and taking the first
+    match.
+    """
+
+    def __init__(self, patterns: Dict[str, str] = LAB_PATTERNS):
+        self.params = list(patterns)
+        self._compiled = {}
+        self._by_char: Dict[str, List[str]] = {}
+        branches: Dict[str, List[str]] = {}
+        for param, pattern in patterns.items():
+            pattern = pattern.lower()
+            self._compiled[param] = re.compile(pattern)
+            labels = _label_group(pattern)
+            value = _non_capturing(pattern[len(labels):])
+            for alias in _aliases(labels):
+                first = alias[:2] if alias.startswith('\\') else alias[0]
+                branches.setdefault(first, []).append(alias[len(first):] + value)
+                chars = self._by_char.setdefault(first[-1], [])
+                if param not in chars:
+                    chars.append(param)
+        self._trigger = re.compile('(?=' + '|'.join(
+            f"{first}(?:{'|'.join(tails)})" for first, tails in branches.items()
+        ) + ')')
+
+    def scan(self, text: str) -> Iterator[Tuple[str, str, Tuple[int, int]]]:
+        """Yield the first hit for each parameter in text order"""
+        folded = text.translate(_CASE_FOLD)
+        remaining = set(self.params)
+        for trigger in self._trigger.finditer(folded):
+            pos = trigger.start()
+            for param in self._by_char[folded[pos]]:
+                if param not in remaining:
+                    continue
+                match = self._compiled[param].match(folded, pos)
+                if match:
+                    remaining.discard(param)
+                    yield param, text[match.start(1):match.end(1)], match.span()
+            if not remaining:
+                break
+
+
+# Compiled once at import
+LAB_SCANNER = LabScanner()
+
+
+def _convert_value(raw: str):
+    """Convert a captured value to float when numeric, else keep the string"""
+    try:
+        val = str(raw).replace('<', '').replace('>', '').strip()
+        return float(val) if val.replace('.', '').isdigit() else val
+    except Exception:
+        return raw
+
+
+@TELEMETRY.timed('parse_lab_values')
+def parse_lab_values(text: str) -> Dict:
+    """Advanced parsing for all blood investigation types"""
+    hits = {param: raw for param, raw, _ in LAB_SCANNER.scan(text)}
+    return {param: _convert_value(hits[param]) for param in LAB_SCANNER.params if param in hits}
+
+
+def merge_lab_values(earlier: Dict, later: Dict) -> Dict:
+    """Combine parses of consecutive pieces of one text.
+
+    Values from earlier text win, as the first hit does in a single parse,
+    and keys come back in the same order parse_lab_values uses.
+    """
+    merged = {**later, **earlier}
+    return {param: merged[param] for param in LAB_SCANNER.params if param in merged}
@@ -0,0 +1,70 @@
+# lexical_index.py
+# Okapi BM25 over NumPy postings; a dependency-free retrieval backend for MedLabRAG
+
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have if in into is it its may of on or
+such than that the their then there these this to was were which while with
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+class BM25Index:
+    """BM25 scores for a fixed list of texts.
+
+    Postings are stored CSR-style (documents and precomputed BM25 weights
+    grouped by term), so a query is one vectorized add per query term.
+    """
+
+    def __init__(self, texts: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.size = len(texts)
+        self._vocab: Dict[str, int] = {}
+        term_ids, doc_ids, lengths = [], [], []
+        for doc, text in enumerate(texts):
+            ids = [self._vocab.setdefault(token, len(self._vocab)) for token in tokenize(text)]
+            term_ids.extend(ids)
+            doc_ids.extend([doc] * len(ids))
+            lengths.append(len(ids))
+
+        # Unique (term, doc) pairs sorted by term, with their term frequencies
+        pairs, tf = np.unique(np.array(term_ids, dtype=np.int64) * max(self.size, 1)
+                              + np.array(doc_ids, dtype=np.int64), return_counts=True)
+        terms = pairs // max(self.size, 1)
+        self._docs = (pairs % max(self.size, 1)).astype(np.intp)
+        self._offsets = np.searchsorted(terms, np.arange(len(self._vocab) + 1))
+
+        lengths = np.array(lengths, dtype=np.float64)
+        avg_length = lengths.mean() if self.size and lengths.mean() > 0 else 1.0
+        df = np.diff(self._offsets)
+        idf = np.log1p((self.size - df + 0.5) / (df + 0.5))
+        norm = k1 * (1 - b + b * lengths[self._docs] / avg_length)
+        self._weights = idf[terms] * tf * (k1 + 1) / (tf + norm)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every document for the query"""
+        scores = np.zeros(self.size)
+        for term in dict.fromkeys(tokenize(query)):
+            term_id = self._vocab.get(term)
+            if term_id is not None:
+                start, end = self._offsets[term_id], self._offsets[term_id + 1]
+                scores[self._docs[start:end]] += self._weights[start:end]
+        return scores
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[int, float]]:
+        """(document index, score) of the k best matches, best first; zero scores are dropped"""
+        scores = self.scores(query)
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
@@ -122,6 +122,24 @@ CRITICAL_VALUES = {
     'Blasts': (0, 5),
 }
 
+# Medical system of every parsed test; single source for categorization
+LAB_TEST_CATEGORIES = {
+    'Hematology': ['RBC', 'Hemoglobin', 'Hematocrit', 'MCV', 'MCH', 'MCHC', 'RDW', 
+                  'WBC', 'Platelets', 'MPV', 'Neutrophils', 'Lymphocytes', 'Monocytes',
+                  'Eosinophils', 'Basophils', 'Reticulocytes', 'Blasts'],
+    'Liver_Function': ['ALT', 'AST', 'ALP', 'GGT', 'Total_Bilirubin', 'Direct_Bilirubin',
+                      'Indirect_Bilirubin', 'Total_Protein', 'Albumin', 'Globulin', 'A_G_Ratio'],
+    'Kidney_Function': ['Creatinine', 'BUN', 'eGFR', 'Uric_Acid', 'Sodium', 'Potassium',
+                       'Chloride', 'Bicarbonate', 'Calcium', 'Phosphorus', 'Magnesium'],
+    'Metabolic': ['Glucose_Fasting', 'Glucose_Random', 'HbA1c', 'Insulin', 'C_Peptide'],
+    'Endocrine': ['TSH', 'T3', 'T4', 'Free_T3', 'Free_T4', 'Anti_TPO', 'Anti_Thyroglobulin'],
+    'Lipid_Profile': ['Total_Cholesterol', 'HDL', 'LDL', 'Triglycerides', 'VLDL', 'Non_HDL_Cholesterol'],
+    'Immunology_Rheumatology': ['RF', 'Anti_CCP', 'ANA', 'dsDNA', 'ESR', 'CRP', 'ASO'],
+    'Coagulation': ['PT', 'INR', 'aPTT', 'Fibrinogen', 'D_Dimer'],
+    'Tumor_Markers': ['AFP', 'CEA', 'CA_125', 'CA_19_9', 'PSA', 'CA_15_3'],
+    'Vitamins_Minerals': ['Vitamin_D', 'Vitamin_B12', 'Folate', 'Iron', 'Ferritin', 'TIBC', 'Transferrin_Saturation']
+}
+
 # Test categorization for UI organization
 TEST_CATEGORIES = {
     'Hematology': {
@@ -0,0 +1,104 @@
+# ocr_cache.py
+# Content-addressed, size-capped disk cache for OCR output
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+# Bump when the cached text format or the extraction pipeline changes
+CACHE_FORMAT_VERSION = 1
+
+
+class OCRCache:
+    """Disk-backed LRU cache mapping upload content + OCR settings to text.
+
+    Each entry is one UTF-8 file named by its key. Hits refresh the file's
+    mtime, and writes evict the least recently used entries once the total
+    size exceeds ``max_bytes``.
+    """
+
+    def __init__(self, directory: str = ".ocr_cache", max_bytes: int = 256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        # Guards the counters and eviction; get() runs on OCR and job worker threads
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(data: bytes, settings: Dict) -> str:
+        """SHA-256 over the upload bytes and the OCR settings"""
+        digest = hashlib.sha256(data)
+        digest.update(json.dumps(
+            {'version': CACHE_FORMAT_VERSION, 'settings': settings},
+            sort_keys=True, default=str
+        ).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def get(self, key: str) -> Optional[str]:
+        """Return cached text or None, marking the entry as recently used"""
+        path = self._path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return text
+
+    def put(self, key: str, text: str):
+        """Store text atomically, then enforce the size cap"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Could not write OCR cache entry: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until under max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            with os.scandir(self.directory) as it:
+                for entry in it:
+                    if not entry.name.endswith('.txt'):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        """Delete every cached entry"""
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith('.txt'):
+                    os.remove(entry.path)
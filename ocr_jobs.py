@@ -0,0 +1,159 @@
+# ocr_jobs.py
+# Background document extraction: a bounded worker pool of OCR jobs with
+# per-page progress and cancellation, polled by the UI
+
+import io
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from telemetry import TELEMETRY
+
+# (pages_done, page_count, text_so_far, parsed_so_far, page_sources), as
+# yielded by app.iter_document_extraction
+Progress = Tuple[int, int, str, Dict, List[str]]
+
+# Job states; 'done', 'cancelled' and 'failed' are final
+JOB_STATES = ('queued', 'running', 'done', 'cancelled', 'failed')
+
+_job_ids = itertools.count(1)
+
+
+class MemoryUpload(io.BytesIO):
+    """Uploaded bytes exposed through the parts of Streamlit's UploadedFile API the app uses"""
+
+    def __init__(self, name: str, mime: str, data: bytes):
+        super().__init__(data)
+        self.name = name
+        self.type = mime
+
+
+class OCRJob:
+    """One document's extraction.
+
+    A worker thread updates the progress fields; the UI reads them through
+    snapshot() and may call cancel() at any time. Cancellation takes
+    effect between page windows (or before the job starts), since a page
+    already handed to Tesseract runs to completion.
+    """
+
+    def __init__(self, name: str, mime: str, data: bytes):
+        self.id = next(_job_ids)
+        self.name = name
+        self.mime = mime
+        self.size = len(data)
+        self.status = 'queued'
+        self.pages_done = 0
+        self.page_count = 0
+        self.parsed: Dict = {}
+        self.page_sources: List[str] = []
+        self.error: Optional[str] = None
+        self.submitted = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        # Set by the session once the parsed values have been merged
+        self.applied = False
+        self._data: Optional[bytes] = data
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ('queued', 'running')
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def cancel(self):
+        """Ask the job to stop; a queued job is cancelled immediately"""
+        self._cancel.set()
+        with self._lock:
+            if self.status == 'queued':
+                self._finish('cancelled')
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'id': self.id, 'name': self.name, 'status': self.status, 'pages_done': self.pages_done,
+                'page_count': self.page_count, 'parameters': len(self.parsed), 'page_sources': list(self.page_sources),
+                'error': self.error, 'cancel_requested': self._cancel.is_set(),
+                'seconds': round((self.finished or time.time()) - (self.started or self.submitted), 1),
+            }
+
+    def _finish(self, status: str, error: Optional[str] = None):
+        # Caller holds self._lock
+        self.status = status
+        self.error = error
+        self.finished = time.time()
+        self._data = None
+
+    def _run(self, extract: Callable[[MemoryUpload], Iterator[Progress]]):
+        with self._lock:
+            if self.status != 'queued':
+                return
+            self.status = 'running'
+            self.started = time.time()
+            upload = MemoryUpload(self.name, self.mime, self._data)
+        progress = extract(upload)
+        # Same stage as app.extract_text_from_document, which the synchronous path goes through
+        try:
+            with TELEMETRY.span('extract_text_from_document'):
+                for pages_done, page_count, _, parsed, page_sources in progress:
+                    with self._lock:
+                        self.pages_done, self.page_count = pages_done, page_count
+                        self.parsed, self.page_sources = parsed, list(page_sources)
+                    if self._cancel.is_set():
+                        break
+        except Exception as e:
+            with self._lock:
+                self._finish('failed', f"{type(e).__name__}: {e}")
+            return
+        finally:
+            progress.close()
+        with self._lock:
+            self._finish('cancelled' if self._cancel.is_set() else 'done')
+
+
+class OCRJobQueue:
+    """FIFO of OCRJobs run by a fixed number of worker threads.
+
+    Shared by all sessions, so workers bounds how many documents are
+    extracted at once; each job may still OCR its pages in parallel.
+    """
+
+    def __init__(self, extract: Callable[[MemoryUpload], Iterator[Progress]], workers: int = 2):
+        self.extract = extract
+        self.workers = max(1, workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='ocr-job')
+        self._lock = threading.Lock()
+        self._jobs: List[OCRJob] = []
+
+    def submit(self, name: str, mime: str, data: bytes) -> OCRJob:
+        job = OCRJob(name, mime, data)
+        with self._lock:
+            self._jobs = [j for j in self._jobs if j.active] + [job]
+        self._pool.submit(job._run, self.extract)
+        return job
+
+    def position(self, job: OCRJob) -> int:
+        """Jobs queued ahead of a queued job (0 once it is running)"""
+        with self._lock:
+            if job.status != 'queued':
+                return 0
+            return sum(1 for j in self._jobs if j.status == 'queued' and j.id < job.id)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            jobs = list(self._jobs)
+        return {'workers': self.workers, 'queued': sum(j.status == 'queued' for j in jobs),
+                'running': sum(j.status == 'running' for j in jobs)}
+
+    def shutdown(self, cancel: bool = True):
+        if cancel:
+            with self._lock:
+                for job in self._jobs:
+                    job.cancel()
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,164 @@
+# ocr_pipeline.py
+# PDF text-layer extraction and page-level OCR with a bounded worker pool
+
+import io
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Collection, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import pdf2image
+import pytesseract
+
+from image_preprocessing import preprocess_for_ocr
+from telemetry import TELEMETRY
+
+try:
+    from pypdf import PdfReader
+except ImportError:
+    PdfReader = None
+
+# Minimum alphanumeric characters for a PDF page's text layer to be trusted
+MIN_TEXT_LAYER_CHARS = 16
+
+
+def ocr_image(image, lang: Optional[str] = None, config: str = '', timeout: float = 0,
+              preprocess: Optional[Dict] = None) -> str:
+    """OCR a single page image; timeout is in seconds, 0 disables it.
+
+    When preprocess is given the image first goes through
+    image_preprocessing.preprocess_for_ocr with those options.
+    """
+    if preprocess is not None:
+        with TELEMETRY.span('ocr_preprocess'):
+            image = preprocess_for_ocr(image, preprocess)
+    with TELEMETRY.span('tesseract'):
+        return pytesseract.image_to_string(image, lang=lang, config=config, timeout=timeout)
+
+
+def _ocr_page(args) -> str:
+    index, image, lang, config, timeout, preprocess = args
+    try:
+        return ocr_image(image, lang=lang, config=config, timeout=timeout, preprocess=preprocess)
+    except RuntimeError as e:
+        if 'timeout' in str(e).lower():
+            raise RuntimeError(f"OCR timed out on page {index + 1} after {timeout}s") from e
+        raise
+
+
+def ocr_pages(images: Sequence, lang: Optional[str] = None, config: str = '',
+              workers: int = 1, timeout: float = 0, preprocess: Optional[Dict] = None) -> List[str]:
+    """OCR a list of page images and return their text in page order.
+
+    With workers > 1 pages are spread over a bounded thread pool. Tesseract
+    runs as a separate process per page, so threads are enough to keep every
+    core busy. Set OMP_THREAD_LIMIT=1 at startup (app.py and batch_cli.py
+    do) so each engine uses one OpenMP thread and the pool does not
+    oversubscribe. The result is identical to the sequential path.
+    """
+    jobs = [(i, image, lang, config, timeout, preprocess) for i, image in enumerate(images)]
+    workers = max(1, min(workers, len(jobs)))
+    if workers == 1:
+        return [_ocr_page(job) for job in jobs]
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ocr') as pool:
+        return list(pool.map(_ocr_page, jobs))
+
+
+@TELEMETRY.timed('pdf_text_layer')
+def read_text_layer(data: bytes) -> Optional[List[str]]:
+    """Return the embedded text of every PDF page, or None if it can't be read"""
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(data))
+        return [page.extract_text() or "" for page in reader.pages]
+    except Exception as e:
+        print(f"Could not read PDF text layer: {e}")
+        return None
+
+
+def has_usable_text(text: str, min_chars: int = MIN_TEXT_LAYER_CHARS) -> bool:
+    """Whether a page's text layer has enough real content to skip OCR"""
+    stripped = text.strip()
+    alnum = sum(ch.isalnum() for ch in stripped)
+    # Fonts without a unicode map extract as control characters or (cid:N);
+    # spaces are left out of the ratio so column-aligned tables still qualify
+    return alnum >= min_chars and '(cid:' not in stripped and alnum >= (len(stripped) - stripped.count(' ')) // 3
+
+
+@TELEMETRY.timed('pdf_render')
+def _render_runs(path: str, indices: Sequence[int], dpi: int, grayscale: bool) -> List:
+    """Render 0-based page indices, one poppler call per contiguous run"""
+    images = []
+    run_start = 0
+    for i in range(1, len(indices) + 1):
+        if i == len(indices) or indices[i] != indices[i - 1] + 1:
+            images.extend(pdf2image.convert_from_path(
+                path, dpi=dpi, grayscale=grayscale,
+                first_page=indices[run_start] + 1, last_page=indices[i - 1] + 1
+            ))
+            run_start = i
+    return images
+
+
+def iter_pdf_windows(data: bytes, dpi: int = 200, grayscale: bool = False, window: int = 4,
+                     page_count: Optional[int] = None,
+                     skip_pages: Collection[int] = ()) -> Iterator[Tuple[int, int, List]]:
+    """Render a PDF a few pages at a time.
+
+    Yields (first_page_index, page_count, images) for consecutive windows of
+    at most ``window`` pages, so only one window of rendered pages is alive
+    at once. The PDF is written to a temporary file once and each window is
+    rendered from it with poppler's page range options. Pages listed in
+    ``skip_pages`` (0-based) are not rendered and come back as None; poppler
+    is not invoked at all when every page is skipped and page_count is given.
+    """
+    window = max(1, window)
+    with tempfile.NamedTemporaryFile(suffix='.pdf') as tmp:
+        tmp.write(data)
+        tmp.flush()
+        if page_count is None:
+            page_count = pdf2image.pdfinfo_from_path(tmp.name)['Pages']
+        for first in range(0, page_count, window):
+            indices = range(first, min(first + window, page_count))
+            render = [i for i in indices if i not in skip_pages]
+            rendered = dict(zip(render, _render_runs(tmp.name, render, dpi, grayscale)))
+            images = [rendered.get(i) for i in indices]
+            del rendered
+            yield first, page_count, images
+            del images
+
+
+def iter_pdf_text(data: bytes, dpi: int = 200, grayscale: bool = False, window: int = 4,
+                  lang: Optional[str] = None, config: str = '', workers: int = 1,
+                  timeout: float = 0, preprocess: Optional[Dict] = None, use_text_layer: bool = True,
+                  min_text_chars: int = MIN_TEXT_LAYER_CHARS) -> Iterator[Tuple[int, int, List[str], List[str]]]:
+    """Extract PDF text window by window.
+
+    Pages with a usable embedded text layer are taken as-is; the rest are
+    rendered and OCR'd. Yields (first_page_index, page_count, page_texts,
+    page_sources) where each source is 'text' or 'ocr'. Page images are
+    released before the next window is rendered.
+    """
+    layer = read_text_layer(data) if use_text_layer else None
+    page_count = None
+    usable = set()
+    if layer is not None:
+        page_count = len(layer)
+        usable = {i for i, text in enumerate(layer) if has_usable_text(text, min_text_chars)}
+
+    for first, page_count, images in iter_pdf_windows(data, dpi=dpi, grayscale=grayscale, window=window,
+                                                      page_count=page_count, skip_pages=usable):
+        ocr_texts = iter(ocr_pages([img for img in images if img is not None],
+                                   lang=lang, config=config, workers=workers, timeout=timeout,
+                                   preprocess=preprocess))
+        texts, sources = [], []
+        for offset, image in enumerate(images):
+            if image is None:
+                texts.append(layer[first + offset])
+                sources.append('text')
+            else:
+                texts.append(next(ocr_texts))
+                sources.append('ocr')
+        del images
+        yield first, page_count, texts, sources
@@ -0,0 +1,135 @@
+# profiling.py
+# Opt-in cProfile + tracemalloc capture of one Extract -> Analyze cycle,
+# written as PHI-free artifacts (code locations, counts, sizes and times only)
+
+import cProfile
+import hashlib
+import itertools
+import json
+import os
+import platform
+import pstats
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+PROFILE_DIR = os.environ.get("MEDLAB_PROFILE_DIR", ".profiles")
+PROFILE_TOP_N = int(os.environ.get("MEDLAB_PROFILE_TOP_N", "50"))
+# Frames kept per allocation traceback
+TRACEMALLOC_FRAMES = 16
+
+# cProfile and tracemalloc are process-wide, so one capture at a time
+_capture_lock = threading.Lock()
+_capture_ids = itertools.count(1)
+
+# Allocation sources that only reflect the capture itself
+_IGNORED_ALLOCATIONS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def document_fingerprint(data: bytes) -> str:
+    """Short content hash to match repeated captures of one document without naming it"""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def top_functions(profile: cProfile.Profile, limit: int) -> List[Dict]:
+    """Functions by cumulative time: location, call counts and times only"""
+    stats = pstats.Stats(profile)
+    rows = []
+    for (filename, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({'function': function, 'file': filename, 'line': line, 'calls': calls,
+                     'total_s': round(total, 6), 'cumulative_s': round(cumulative, 6)})
+    rows.sort(key=lambda row: row['cumulative_s'], reverse=True)
+    return rows[:limit]
+
+
+def top_allocations(snapshot: tracemalloc.Snapshot, limit: int) -> List[Dict]:
+    """Live allocations grouped by traceback, largest first.
+
+    Only file names and line numbers are kept; tracemalloc's formatted
+    tracebacks would also carry source text and are left out.
+    """
+    stats = snapshot.filter_traces(_IGNORED_ALLOCATIONS).statistics('traceback')[:limit]
+    return [{
+        'size_bytes': stat.size,
+        'count': stat.count,
+        'traceback': [{'file': frame.filename, 'line': frame.lineno} for frame in stat.traceback],
+    } for stat in stats]
+
+
+class ProfileCapture:
+    """One profiling session, started and stopped around a pipeline cycle.
+
+    stop() writes <id>.pstats (cProfile, for pstats/snakeviz),
+    <id>-allocations.json (top allocations still live at the end, by
+    traceback) and <id>.json (what was profiled plus the hottest functions).
+    Nothing derived from the document's text or values is written: the
+    document appears only as its type, size and a content hash.
+    """
+
+    def __init__(self, directory: str = PROFILE_DIR, top_n: int = PROFILE_TOP_N):
+        self.directory = directory
+        self.top_n = top_n
+        self.id = None
+        self._profile = None
+        self._started = None
+        self._owns_tracemalloc = False
+
+    @property
+    def active(self) -> bool:
+        return self._profile is not None
+
+    def start(self) -> bool:
+        """Begin profiling this thread; False if another capture is running"""
+        if self.active or not _capture_lock.acquire(blocking=False):
+            return False
+        self.id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{os.getpid()}-{next(_capture_ids)}"
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+        return True
+
+    def stop(self, metadata: Optional[Dict] = None) -> Optional[Dict[str, str]]:
+        """End the capture and write its artifacts; returns their paths"""
+        if not self.active:
+            return None
+        self._profile.disable()
+        elapsed = time.perf_counter() - self._started
+        try:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if self._owns_tracemalloc:
+                tracemalloc.stop()
+
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            base = os.path.join(self.directory, self.id)
+            paths = {'pstats': base + '.pstats', 'allocations': base + '-allocations.json',
+                     'summary': base + '.json'}
+            self._profile.dump_stats(paths['pstats'])
+            with open(paths['allocations'], 'w', encoding='utf-8') as f:
+                json.dump(top_allocations(snapshot, self.top_n), f, indent=2)
+            with open(paths['summary'], 'w', encoding='utf-8') as f:
+                json.dump({
+                    'id': self.id,
+                    'python': platform.python_version(),
+                    'platform': platform.platform(),
+                    'wall_seconds': round(elapsed, 4),
+                    'traced_bytes': {'current': current, 'peak': peak},
+                    **(metadata or {}),
+                    'top_functions': top_functions(self._profile, self.top_n),
+                }, f, indent=2)
+            return paths
+        finally:
+            self._profile = None
+            _capture_lock.release()
+
@@ -1,15 +1,25 @@
 # rag_components.py - FIXED VERSION
 import os
 import json
-from typing import Dict, List, Any
+import hashlib
+import shutil
+import threading
+import time
+import uuid
+from itertools import combinations, product
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
 
 # FIXED: Updated imports for newer langchain versions - using only langchain_community
 try:
     from langchain_community.embeddings import HuggingFaceEmbeddings
     from langchain_community.vectorstores import FAISS
+    from langchain_community.docstore.in_memory import InMemoryDocstore
 except ImportError:
     HuggingFaceEmbeddings = None
     FAISS = None
+    InMemoryDocstore = None
 
 # Handle text splitter separately
 try:
@@ -20,6 +30,11 @@ except ImportError:
     except ImportError:
         RecursiveCharacterTextSplitter = None
 
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
 # Handle Document class
 try:
     from langchain.schema import Document
@@ -29,68 +44,584 @@ except ImportError:
     except ImportError:
         Document = None
 
+from corpus_ingest import (INGEST_STATE_FILE, chunk_id, embed_in_batches, load_ingest_state,
+                           plan_ingestion, read_document, scan_corpus)
+from lexical_index import BM25Index
+from memo import LRUMemo
+from reference_engine import reference_bounds
+from telemetry import TELEMETRY
+from vector_index import (INDEX_TYPES, build_index, configure_search, effective_type, index_kind,
+                          reconstruct_all, refill, resolve_params, supports_removal)
+
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+
+# Bump when the on-disk layout or the way chunks are built changes
+INDEX_FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+# 'dense' (FAISS), 'lexical' (BM25) or 'hybrid' (fused scores of both)
+RETRIEVAL_MODES = ('dense', 'lexical', 'hybrid')
+
+# Returned by enhance_analysis while the model and index are still loading
+RAG_WARMING_MESSAGE = "RAG knowledge base is still loading - showing rule-based analysis only."
+
+NORMAL_FINDINGS_MESSAGE = "All parameters within normal limits. No additional insights needed."
+
+# Tests whose direction drives the retrieval query, in query order
+TRACKED_TESTS = ('Hemoglobin', 'WBC', 'Platelets', 'Glucose_Fasting', 'HbA1c', 'Creatinine', 'TSH')
+MAX_QUERY_FINDINGS = 5
+
+
+def finding_signature(categorized_tests: Dict, gender: str = 'male') -> Tuple[Tuple[str, str], ...]:
+    """(test, 'low'/'high') for each abnormal tracked test, in TRACKED_TESTS order.
+
+    Normal and missing tests are left out, so patients with the same
+    abnormalities share a signature and a retrieval query.
+    """
+    values = {}
+    for tests in categorized_tests.values():
+        values.update(tests)
+    findings = []
+    for test in TRACKED_TESTS:
+        value, bounds = values.get(test), reference_bounds(test, gender)
+        if isinstance(value, (int, float)) and bounds is not None:
+            low, high = bounds
+            if value < low:
+                findings.append((test, 'low'))
+            elif value > high:
+                findings.append((test, 'high'))
+    return tuple(findings[:MAX_QUERY_FINDINGS])
+
+
+def signature_query(signature: Tuple[Tuple[str, str], ...]) -> Optional[str]:
+    """Retrieval query for a finding signature, or None for an all-normal one"""
+    if not signature:
+        return None
+    return "Laboratory abnormalities: " + ", ".join(f"{test} {direction}" for test, direction in signature)
+
+
+def common_signatures(max_findings: int = 3) -> List[Tuple[Tuple[str, str], ...]]:
+    """Every non-empty signature with at most max_findings abnormal tests"""
+    signatures = []
+    for count in range(1, min(max_findings, MAX_QUERY_FINDINGS) + 1):
+        for tests in combinations(TRACKED_TESTS, count):
+            for directions in product(('low', 'high'), repeat=count):
+                signatures.append(tuple(zip(tests, directions)))
+    return signatures
+
+
+def build_manifest(texts: List[str], model_name: str = EMBEDDING_MODEL,
+                   chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP,
+                   index_type: str = 'flat', index_params: Optional[Dict] = None) -> Dict:
+    """Fingerprint of everything a stored index depends on"""
+    corpus = hashlib.sha256(json.dumps(texts, ensure_ascii=False).encode('utf-8')).hexdigest()
+    return {
+        'format_version': INDEX_FORMAT_VERSION,
+        'model_name': model_name,
+        'chunk_size': chunk_size,
+        'chunk_overlap': chunk_overlap,
+        'corpus_sha256': corpus,
+        'index_type': index_type,
+        'index_params': resolve_params(index_params),
+    }
+
+
+def read_manifest(index_dir: str) -> Optional[Dict]:
+    try:
+        with open(os.path.join(index_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class LexicalChunk:
+    """Stand-in for a LangChain Document when LangChain is not installed"""
+    
+    def __init__(self, page_content: str, metadata: Optional[Dict] = None):
+        self.page_content = page_content
+        self.metadata = metadata or {}
+
+
 class MedLabRAG:
-    def __init__(self):
+    def __init__(self, index_dir: str = "medical_vectorstore", background: bool = False,
+                 vector_cache_size: int = 512, result_cache_size: int = 256,
+                 retrieval: str = 'dense', hybrid_weight: float = 0.5,
+                 corpus_dir: Optional[str] = None, ingest_workers: int = os.cpu_count() or 1,
+                 index_type: str = 'flat', index_params: Optional[Dict] = None,
+                 precompute_findings: int = 3):
+        """Load the embedding model and index.
+        
+        With background=True this returns immediately in the 'warming' state
+        and loading continues on a daemon thread; see wait_ready(). The BM25
+        index is built synchronously (milliseconds) and serves searches
+        whenever the dense index is missing or still loading. Documents in
+        corpus_dir are ingested once the index is ready; see ingest_corpus().
+        index_type selects the FAISS index (see vector_index.INDEX_TYPES).
+        Results for every finding signature with up to precompute_findings
+        abnormal tests are precomputed whenever the index changes (0 disables).
+        """
+        if retrieval not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval must be one of {RETRIEVAL_MODES}, got {retrieval!r}")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
+        self.index_type = index_type
+        self.index_params = resolve_params(index_params)
+        self.index_dir = index_dir
+        self.retrieval = retrieval
+        # Share of the dense score in hybrid mode
+        self.hybrid_weight = hybrid_weight
+        self.corpus_dir = corpus_dir
+        self.ingest_workers = ingest_workers
+        # Corpus files in the dense index: relative path -> {'sha256', 'ids'}
+        self._ingested = {}
+        self._ingest_lock = threading.Lock()
         self.embeddings = None
         self.vectorstore = None
+        # Retrieval caches: normalized query -> embedding, and
+        # (index generation, retrieval mode, normalized query, k) -> documents
+        self._vector_cache = LRUMemo(maxsize=vector_cache_size)
+        self._result_cache = LRUMemo(maxsize=result_cache_size)
+        # (index generation, retrieval mode, k, {finding signature: documents});
+        # ignored once either no longer matches
+        self.precompute_findings = precompute_findings
+        self._signature_table = (None, None, 0, {})
+        self._signature_hits = 0
+        self._signature_misses = 0
+        self._index_generation = 0
         self.initialized = False
+        # 'warming', 'ready', 'failed' or 'disabled'
+        self.state = 'warming'
+        # How the index was obtained ('loaded' or 'built') and cold-start seconds
+        self.index_source = None
+        self.startup_seconds = None
+        # Seconds from construction until the model and index were usable
+        self.ready_seconds = None
+        self._created = time.perf_counter()
+        self._ready = threading.Event()
+        
+        start = time.perf_counter()
+        self._set_lexical(self._chunk_documents(self._load_medical_knowledge()))
+        self.lexical_seconds = time.perf_counter() - start
+        self._refresh_signature_table()
+        
+        if retrieval == 'lexical':
+            # Nothing else to load; the embedding model is never needed
+            self.index_source = 'built'
+            self.startup_seconds = self.lexical_seconds
+            self.ready_seconds = time.perf_counter() - self._created
+            self.state = 'ready'
+            self._ready.set()
+            self._ingest_configured_corpus()
+            return
         
         # Only initialize if all imports are available
         if HuggingFaceEmbeddings is None or FAISS is None or RecursiveCharacterTextSplitter is None:
-            print("Required LangChain components not available - RAG features disabled")
+            print("Required LangChain components not available - using lexical retrieval only")
+            self.state = 'disabled'
+            self._ready.set()
             return
-            
-        self._initialize_system()
+        
+        if background:
+            threading.Thread(target=self._initialize_system, name='rag-warmup', daemon=True).start()
+        else:
+            self._initialize_system()
+    
+    @property
+    def ready(self) -> bool:
+        return self.state == 'ready'
+    
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until loading has finished (or timeout seconds); True if usable"""
+        self._ready.wait(timeout)
+        return self.ready
+    
+    def active_retrieval(self) -> Optional[str]:
+        """Retrieval mode searches use right now; lexical until the dense index is ready"""
+        if self.ready:
+            return self.retrieval
+        if self._lexical[0]:
+            return 'lexical'
+        return None
     
     def _initialize_system(self):
         """Initialize embeddings and vector store"""
+        start = time.perf_counter()
         try:
             # Use lightweight embeddings suitable for medical text
             self.embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
+                model_name=EMBEDDING_MODEL,
                 model_kwargs={'device': 'cpu'}
             )
             
-            # Create or load vector store
-            if os.path.exists("medical_vectorstore"):
+            # Reuse the stored index only if it was built from the same inputs
+            manifest = self._manifest()
+            if read_manifest(self.index_dir) == manifest:
                 try:
-                    self.vectorstore = FAISS.load_local("medical_vectorstore", self.embeddings)
+                    self._set_vectorstore(self._load_index())
+                    self.index_source = 'loaded'
+                    self._ingested = load_ingest_state(self.index_dir)
+                    if self._ingested:
+                        self._set_lexical(self._stored_documents(self.vectorstore))
                 except Exception as e:
                     print(f"Could not load existing vectorstore: {e}")
-                    self._create_knowledge_base()
-            else:
-                self._create_knowledge_base()
+            if self.vectorstore is None:
+                self._create_knowledge_base(manifest)
+                self.index_source = 'built'
             
             self.initialized = True
         except Exception as e:
             print(f"RAG initialization error: {e}")
             self.initialized = False
+        self.startup_seconds = time.perf_counter() - start
+        self.ready_seconds = time.perf_counter() - self._created
+        print(f"RAG cold start: index {self.index_source or 'unavailable'} in {self.startup_seconds:.2f}s "
+              f"(ready {self.ready_seconds:.2f}s after construction)")
+        self.state = 'ready' if self.initialized else 'failed'
+        self._ready.set()
+        if self.initialized:
+            self._refresh_signature_table()
+            self._ingest_configured_corpus()
     
-    def _create_knowledge_base(self):
-        """Create medical knowledge base from structured data"""
-        medical_texts = self._load_medical_knowledge()
+    def _manifest(self) -> Dict:
+        return build_manifest(self._load_medical_knowledge(), index_type=self.index_type,
+                              index_params=self.index_params)
+    
+    def _load_index(self):
+        """Load the stored index, memory-mapping the FAISS file where supported"""
+        # The pickled docstore is trusted: we wrote it and the manifest matched
+        kwargs = {'allow_dangerous_deserialization': True}
+        try:
+            vectorstore = FAISS.load_local(self.index_dir, self.embeddings, io_flags=faiss.IO_FLAG_MMAP, **kwargs)
+        except RuntimeError:
+            # Not every index type can be memory-mapped
+            vectorstore = FAISS.load_local(self.index_dir, self.embeddings, **kwargs)
+        configure_search(vectorstore.index, self.index_params)
+        return vectorstore
+    
+    def _make_vectorstore(self, documents: List, vectors, ids: Optional[List[str]] = None):
+        """FAISS store over documents and their embeddings with the configured index type"""
+        ids = ids or [str(uuid.uuid4()) for _ in documents]
+        index = build_index(np.asarray(vectors, dtype=np.float32).reshape(len(documents), -1),
+                            self.index_type, self.index_params)
+        return FAISS(self.embeddings, index, InMemoryDocstore(dict(zip(ids, documents))),
+                     dict(enumerate(ids)))
+    
+    def _rebuild_vectorstore(self, vectorstore, drop_ids=(), retrain: bool = False):
+        """Rebuild a store from its stored vectors, without drop_ids.
+        
+        Used to remove vectors from non-flat indexes, and with retrain=True
+        to switch a small flat index to the configured type once the corpus
+        is large enough to train it. Otherwise the existing training is
+        reused.
+        """
+        drop = set(drop_ids)
+        keep = [(position, doc_id) for position, doc_id in vectorstore.index_to_docstore_id.items()
+                if doc_id not in drop]
+        vectors = reconstruct_all(vectorstore.index)[[position for position, _ in keep]]
+        documents = [vectorstore.docstore.search(doc_id) for _, doc_id in keep]
+        ids = [doc_id for _, doc_id in keep]
+        if retrain:
+            return self._make_vectorstore(documents, vectors, ids)
+        return FAISS(self.embeddings, refill(vectorstore.index, vectors, self.index_params),
+                     InMemoryDocstore(dict(zip(ids, documents))), dict(enumerate(ids)))
+    
+    def _save_index(self, manifest: Dict, vectorstore=None, ingested: Optional[Dict] = None):
+        """Write index and manifest to a staging directory, then swap it in.
+        
+        The manifest is written last, so an interrupted save never looks
+        valid on the next start. ingested is the corpus ingestion state
+        stored alongside; a rebuilt index has none.
+        """
+        staging = f"{self.index_dir}.tmp-{os.getpid()}"
+        retired = f"{self.index_dir}.old-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        (vectorstore or self.vectorstore).save_local(staging)
+        if ingested:
+            with open(os.path.join(staging, INGEST_STATE_FILE), 'w', encoding='utf-8') as f:
+                json.dump(ingested, f, indent=2)
+        with open(os.path.join(staging, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        if os.path.exists(self.index_dir):
+            os.replace(self.index_dir, retired)
+        os.replace(staging, self.index_dir)
+        shutil.rmtree(retired, ignore_errors=True)
+    
+    @staticmethod
+    def _chunk_documents(medical_texts: List[str], source: str = "medical_knowledge") -> List:
+        """Split knowledge texts into the chunks both indexes are built from.
+        
+        Without LangChain each text becomes a single LexicalChunk.
+        """
+        if RecursiveCharacterTextSplitter is None or Document is None:
+            return [LexicalChunk(text, {"source": source}) for text in medical_texts]
         
-        if not medical_texts or RecursiveCharacterTextSplitter is None or Document is None:
-            return
-            
         text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
+            chunk_size=CHUNK_SIZE,
+            chunk_overlap=CHUNK_OVERLAP,
             length_function=len
         )
         
         # Convert texts to Document objects
-        documents = [Document(page_content=text, metadata={"source": "medical_knowledge"}) 
+        documents = [Document(page_content=text, metadata={"source": source}) 
                     for text in medical_texts]
         
-        chunks = text_splitter.split_documents(documents)
+        return text_splitter.split_documents(documents)
+    
+    def _create_knowledge_base(self, manifest: Optional[Dict] = None):
+        """Create medical knowledge base from structured data"""
+        medical_texts = self._load_medical_knowledge()
+        
+        if not medical_texts or RecursiveCharacterTextSplitter is None or Document is None:
+            return
+        
+        chunks = self._chunk_documents(medical_texts)
         
         if chunks and self.embeddings and FAISS:
-            self.vectorstore = FAISS.from_documents(chunks, self.embeddings)
+            vectors = self.embeddings.embed_documents([chunk.page_content for chunk in chunks])
+            self._set_vectorstore(self._make_vectorstore(chunks, vectors))
+            try:
+                self._save_index(manifest or self._manifest())
+            except Exception as e:
+                print(f"Could not save vectorstore: {e}")
+    
+    def _set_vectorstore(self, vectorstore):
+        """Swap in a (re)built index and invalidate cached retrieval results.
+        
+        Query vectors only depend on the embedding model and stay valid.
+        Results are keyed by index generation, so a search that raced with
+        the swap can't store a stale entry under the new generation.
+        """
+        self.vectorstore = vectorstore
+        self._index_generation += 1
+        self._result_cache.clear()
+    
+    def _set_lexical(self, chunks: List):
+        """Swap in a BM25 index over chunks; one attribute, so readers see a consistent pair"""
+        self._lexical = (chunks, BM25Index([chunk.page_content for chunk in chunks]))
+        self._index_generation += 1
+        self._result_cache.clear()
+    
+    @property
+    def lexical_chunks(self) -> List:
+        return self._lexical[0]
+    
+    @property
+    def index_generation(self) -> int:
+        """Bumped whenever the dense or lexical index is replaced"""
+        return self._index_generation
+    
+    @staticmethod
+    def _stored_documents(vectorstore) -> List:
+        """Documents of a FAISS store in index order"""
+        return [vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()]
+    
+    def _ingest_configured_corpus(self):
+        if not self.corpus_dir:
+            return
+        try:
+            print(f"Corpus ingestion: {self.ingest_corpus(self.corpus_dir, workers=self.ingest_workers)}")
+        except Exception as e:
+            print(f"Corpus ingestion failed: {e}")
+    
+    def ingest_corpus(self, directory: str, workers: int = 1, batch_size: int = 64) -> Dict:
+        """Bring the index up to date with a directory of .md/.txt/.pdf documents.
+        
+        Only new or changed files (by content hash) are chunked and embedded;
+        vectors of changed and deleted files are removed. The update is
+        applied to a copy of the index, saved, and then swapped in, so
+        concurrent searches see either the old or the new index. Without a
+        dense index, the BM25 index is rebuilt from the knowledge base plus
+        every corpus file instead. Returns a summary of what changed.
+        """
+        with self._ingest_lock:
+            start = time.perf_counter()
+            files = scan_corpus(directory)
+            if not self.initialized or self.vectorstore is None:
+                return self._ingest_lexical(files, start)
+            
+            state = dict(self._ingested)
+            changed, removed = plan_ingestion(files, state)
+            summary = {'files': len(files), 'changed': len(changed), 'removed': len(removed), 'chunks': 0}
+            if not changed and not removed:
+                summary['seconds'] = round(time.perf_counter() - start, 3)
+                return summary
+            
+            stale = [doc_id for name in removed for doc_id in state.pop(name)['ids']]
+            texts, metadatas, ids = [], [], []
+            for name in changed:
+                path, digest = files[name]
+                try:
+                    chunks = self._chunk_documents([read_document(path)], source=name)
+                except Exception as e:
+                    print(f"Could not read {path}: {e}")
+                    continue
+                chunk_ids = [chunk_id(name, digest, i) for i in range(len(chunks))]
+                texts.extend(chunk.page_content for chunk in chunks)
+                metadatas.extend({'source': name, 'sha256': digest} for _ in chunks)
+                ids.extend(chunk_ids)
+                state[name] = {'sha256': digest, 'ids': chunk_ids}
+            
+            vectors = embed_in_batches(self.embeddings, texts, batch_size=batch_size, workers=workers)
+            vectorstore = FAISS.deserialize_from_bytes(self.vectorstore.serialize_to_bytes(), self.embeddings,
+                                                       allow_dangerous_deserialization=True)
+            configure_search(vectorstore.index, self.index_params)
+            if stale and supports_removal(vectorstore.index):
+                vectorstore.delete(stale)
+            elif stale:
+                vectorstore = self._rebuild_vectorstore(vectorstore, stale)
+            if texts:
+                vectorstore.add_embeddings(zip(texts, vectors), metadatas=metadatas, ids=ids)
+            # A corpus that was too small to train IVF/PQ may have outgrown its flat index
+            if (index_kind(vectorstore.index) == 'flat'
+                    and effective_type(self.index_type, vectorstore.index.ntotal, self.index_params) != 'flat'):
+                vectorstore = self._rebuild_vectorstore(vectorstore, retrain=True)
+            
             try:
-                self.vectorstore.save_local("medical_vectorstore")
+                self._save_index(self._manifest(), vectorstore, state)
             except Exception as e:
                 print(f"Could not save vectorstore: {e}")
+            self._set_vectorstore(vectorstore)
+            self._ingested = state
+            self._set_lexical(self._stored_documents(vectorstore))
+            self._refresh_signature_table()
+            
+            summary['chunks'] = len(texts)
+            summary['seconds'] = round(time.perf_counter() - start, 3)
+            return summary
+    
+    def _ingest_lexical(self, files: Dict, start: float) -> Dict:
+        chunks = self._chunk_documents(self._load_medical_knowledge())
+        corpus_chunks = 0
+        for name, (path, _) in files.items():
+            try:
+                document_chunks = self._chunk_documents([read_document(path)], source=name)
+            except Exception as e:
+                print(f"Could not read {path}: {e}")
+                continue
+            chunks.extend(document_chunks)
+            corpus_chunks += len(document_chunks)
+        self._set_lexical(chunks)
+        self._refresh_signature_table()
+        return {'files': len(files), 'changed': len(files), 'removed': 0, 'chunks': corpus_chunks,
+                'seconds': round(time.perf_counter() - start, 3)}
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return " ".join(query.split())
+    
+    def embed_query(self, query: str) -> List[float]:
+        """Embedding of a normalized query, cached"""
+        return self._vector_cache.get_or_compute(query, lambda: self.embeddings.embed_query(query))
+    
+    def search(self, query: str, k: int = 4) -> List:
+        """Top-k documents for a query, served from the result cache when possible"""
+        query = self.normalize_query(query)
+        mode = self.active_retrieval()
+        key = (self._index_generation, mode, query, k)
+        docs = self._result_cache.get(key)
+        if docs is None:
+            if mode == 'dense':
+                docs = self.vectorstore.similarity_search_by_vector(self.embed_query(query), k=k)
+            elif mode == 'hybrid':
+                docs = self._hybrid_search(query, k)
+            else:
+                docs = self._lexical_search(query, k)
+            self._result_cache.put(key, docs)
+        return list(docs)
+    
+    def _lexical_search(self, query: str, k: int) -> List:
+        chunks, index = self._lexical
+        return [chunks[i] for i, _ in index.search(query, k)]
+    
+    def _hybrid_search(self, query: str, k: int, vector: Optional[List[float]] = None) -> List:
+        """Rank the union of dense and BM25 candidates by a weighted sum of
+        their min-max normalized scores; candidates missing from one list
+        score 0 there.
+        """
+        fetch = max(4 * k, 20)
+        if vector is None:
+            vector = self.embed_query(query)
+        dense = self.vectorstore.similarity_search_with_score_by_vector(vector, k=fetch)
+        chunks, index = self._lexical
+        lexical = index.search(query, fetch)
+        
+        fused = {}
+        if dense:
+            distances = np.array([distance for _, distance in dense])
+            spread = np.ptp(distances) or 1.0
+            for (doc, _), similarity in zip(dense, (distances.max() - distances) / spread):
+                fused[doc.page_content] = [doc, self.hybrid_weight * similarity]
+        if lexical:
+            top = lexical[0][1]
+            for i, score in lexical:
+                chunk = chunks[i]
+                entry = fused.setdefault(chunk.page_content, [chunk, 0.0])
+                entry[1] += (1 - self.hybrid_weight) * score / top
+        
+        ranked = sorted(fused.values(), key=lambda entry: -entry[1])
+        return [doc for doc, _ in ranked[:k]]
+    
+    def clear_caches(self):
+        self._vector_cache.clear()
+        self._result_cache.clear()
+    
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        """Hit/miss/eviction counters of the vector and result caches, and signature table usage"""
+        return {'vectors': self._vector_cache.stats(), 'results': self._result_cache.stats(),
+                'signatures': {'size': len(self._signature_table[3]), 'hits': self._signature_hits,
+                               'misses': self._signature_misses}}
+    
+    def _refresh_signature_table(self, k: int = 3):
+        """Precompute top-k documents for common finding signatures against the current index.
+        
+        Bypasses the query caches, which the table would otherwise flood.
+        """
+        if self.precompute_findings <= 0:
+            return
+        generation, mode = self._index_generation, self.active_retrieval()
+        if mode is None:
+            return
+        start = time.perf_counter()
+        try:
+            signatures = common_signatures(self.precompute_findings)
+            queries = [signature_query(sig) for sig in signatures]
+            if mode == 'lexical':
+                found = [self._lexical_search(query, k) for query in queries]
+            else:
+                vectors = embed_in_batches(self.embeddings, queries)
+                if mode == 'dense':
+                    found = [self.vectorstore.similarity_search_by_vector(vector, k=k) for vector in vectors]
+                else:
+                    found = [self._hybrid_search(query, k, vector) for query, vector in zip(queries, vectors)]
+        except Exception as e:
+            print(f"Could not precompute signature table: {e}")
+            return
+        # A newer index may have been swapped in meanwhile; it refreshes the table itself
+        if generation == self._index_generation:
+            self._signature_table = (generation, mode, k, dict(zip(signatures, found)))
+            print(f"Precomputed {len(signatures)} finding signatures ({mode}) "
+                  f"in {time.perf_counter() - start:.2f}s")
+    
+    def _current_signature_table(self, k: int) -> Dict:
+        """The precomputed table if it matches the current index, mode and k, else {}"""
+        generation, mode, table_k, table = self._signature_table
+        if generation == self._index_generation and mode == self.active_retrieval() and table_k == k:
+            return table
+        return {}
+    
+    def search_signature(self, signature: Tuple[Tuple[str, str], ...], k: int = 3) -> List:
+        """Top-k documents for a finding signature: a table lookup when it was
+        precomputed for the current index, otherwise a live search
+        """
+        docs = self._current_signature_table(k).get(signature)
+        if docs is not None:
+            self._signature_hits += 1
+            return list(docs)
+        self._signature_misses += 1
+        with TELEMETRY.span('rag_search'):
+            return self.search(signature_query(signature), k)
     
     def _load_medical_knowledge(self) -> List[str]:
         """Load comprehensive medical knowledge for lab interpretation"""
@@ -173,32 +704,17 @@ class MedLabRAG:
         
         return knowledge_base
     
-    def enhance_analysis(self, categorized_tests: Dict, rule_based_analysis: Dict) -> str:
-        """Enhance analysis with RAG-retrieved knowledge"""
-        if not self.initialized or not self.vectorstore:
-            return "RAG system not available. Using rule-based analysis only."
+    @staticmethod
+    def build_query(categorized_tests: Dict, gender: str = 'male') -> Optional[str]:
+        """Retrieval query for one patient, or None if nothing is worth looking up"""
+        return signature_query(finding_signature(categorized_tests, gender))
+    
+    @staticmethod
+    def format_insights(docs: List) -> str:
+        context = "\n\n".join([doc.page_content for doc in docs])
         
-        try:
-            # Build query from abnormal findings
-            query_parts = []
-            for category, tests in categorized_tests.items():
-                for test, value in tests.items():
-                    if isinstance(value, (int, float)):
-                        # Simple threshold check
-                        if test in ['Hemoglobin', 'WBC', 'Platelets', 'Glucose_Fasting', 'HbA1c', 'Creatinine', 'TSH']:
-                            query_parts.append(f"{test} {value}")
-            
-            if not query_parts:
-                return "All parameters within normal limits. No additional insights needed."
-            
-            query = "Laboratory abnormalities: " + ", ".join(query_parts[:5])
-            
-            # Retrieve relevant documents
-            docs = self.vectorstore.similarity_search(query, k=3)
-            context = "\n\n".join([doc.page_content for doc in docs])
-            
-            # Generate enhanced insights
-            insights = f"""
+        # Generate enhanced insights
+        insights = f"""
             **AI-Enhanced Clinical Insights:**
             
             Based on pattern recognition and medical literature:
@@ -211,19 +727,124 @@ class MedLabRAG:
             3. Consider pre-analytical variables (fasting, medications, hemolysis)
             4. Age, sex, and ethnicity-specific reference ranges may apply
             """
+        
+        return insights
+    
+    def _wait_for_retrieval(self, timeout: Optional[float]) -> Optional[str]:
+        """Wait for the dense index if the configured mode needs it.
+        
+        Returns None once some retrieval backend can serve searches,
+        otherwise the message to show instead of insights.
+        """
+        if self.retrieval != 'lexical':
+            self._ready.wait(timeout)
+        if self.active_retrieval() is not None:
+            return None
+        if self.state == 'warming':
+            return RAG_WARMING_MESSAGE
+        return "RAG system not available. Using rule-based analysis only."
+    
+    @TELEMETRY.timed('rag_enhance_analysis')
+    def enhance_analysis(self, categorized_tests: Dict, rule_based_analysis: Dict,
+                         timeout: Optional[float] = None, gender: str = 'male') -> str:
+        """Enhance analysis with RAG-retrieved knowledge.
+        
+        While still warming up, waits up to timeout seconds (None waits
+        until loading finishes) and otherwise answers from the BM25 index.
+        Abnormal findings are judged against gender's reference ranges.
+        """
+        unavailable = self._wait_for_retrieval(timeout)
+        if unavailable:
+            return unavailable
+        
+        try:
+            # Look up documents for the abnormal findings
+            signature = finding_signature(categorized_tests, gender)
+            if not signature:
+                return NORMAL_FINDINGS_MESSAGE
             
-            return insights
+            return self.format_insights(self.search_signature(signature, k=3))
             
         except Exception as e:
             return f"RAG enhancement error: {str(e)}. Proceeding with standard analysis."
     
+    def search_batch(self, queries: List[str], k: int = 4, batch_size: int = 64) -> List[List]:
+        """Top-k documents for many queries.
+        
+        Cache misses are embedded batch_size queries at a time and, in dense
+        mode, searched with a single FAISS call; lexical and hybrid searches
+        run per query. Results are identical to search().
+        """
+        queries = [self.normalize_query(q) for q in queries]
+        mode = self.active_retrieval()
+        generation = self._index_generation
+        results = {}
+        for query in dict.fromkeys(queries):
+            docs = self._result_cache.get((generation, mode, query, k))
+            if docs is not None:
+                results[query] = docs
+        
+        pending = [q for q in dict.fromkeys(queries) if q not in results]
+        if pending and mode != 'lexical':
+            vectors = {q: self._vector_cache.get(q) for q in pending}
+            to_embed = [q for q, v in vectors.items() if v is None]
+            for i in range(0, len(to_embed), batch_size):
+                batch = to_embed[i:i + batch_size]
+                for query, vector in zip(batch, self.embeddings.embed_documents(batch)):
+                    self._vector_cache.put(query, vector)
+                    vectors[query] = vector
+        
+        if pending and mode != 'dense':
+            # Query vectors are cached now; BM25 and fusion are cheap per query
+            for query in pending:
+                results[query] = self.search(query, k)
+        elif pending:
+            matrix = np.asarray([vectors[q] for q in pending], dtype=np.float32)
+            _, indices = self.vectorstore.index.search(matrix, k)
+            docstore, ids = self.vectorstore.docstore, self.vectorstore.index_to_docstore_id
+            for query, row in zip(pending, indices):
+                docs = [docstore.search(ids[i]) for i in row if i != -1]
+                self._result_cache.put((generation, mode, query, k), docs)
+                results[query] = docs
+        
+        return [list(results[q]) for q in queries]
+    
+    def enhance_analysis_batch(self, categorized_tests_list: List[Dict], batch_size: int = 64,
+                               timeout: Optional[float] = None,
+                               genders: Optional[List[str]] = None) -> List[str]:
+        """enhance_analysis for many patients, in input order, with batched retrieval.
+        
+        genders holds one entry per patient ('male' for all when omitted).
+        Signatures missing from the precomputed table are searched together.
+        """
+        unavailable = self._wait_for_retrieval(timeout)
+        if unavailable:
+            return [unavailable] * len(categorized_tests_list)
+        
+        genders = genders or ['male'] * len(categorized_tests_list)
+        signatures = [finding_signature(tests, gender) for tests, gender in zip(categorized_tests_list, genders)]
+        try:
+            table = self._current_signature_table(3)
+            found = {sig: table[sig] for sig in dict.fromkeys(signatures) if sig in table}
+            self._signature_hits += sum(1 for sig in signatures if sig in found)
+            missing = [sig for sig in dict.fromkeys(signatures) if sig and sig not in found]
+            self._signature_misses += sum(1 for sig in signatures if sig and sig not in found)
+            found.update(zip(missing, self.search_batch([signature_query(sig) for sig in missing],
+                                                        k=3, batch_size=batch_size)))
+            return [
+                self.format_insights(found[sig]) if sig else NORMAL_FINDINGS_MESSAGE
+                for sig in signatures
+            ]
+        except Exception as e:
+            return [f"RAG enhancement error: {str(e)}. Proceeding with standard analysis."] * len(categorized_tests_list)
+    
     def query_knowledge_base(self, question: str) -> str:
         """Allow direct querying of medical knowledge base"""
-        if not self.initialized or not self.vectorstore:
+        if self.active_retrieval() is None:
             return "Knowledge base not available"
         
         try:
-            docs = self.vectorstore.similarity_search(question, k=2)
+            docs = self.search(question, k=2)
             return "\n\n".join([doc.page_content for doc in docs])
         except Exception as e:
             return f"Query error: {str(e)}"
@@ -0,0 +1,167 @@
+# reference_engine.py
+# Reference data compiled once at import: REFERENCE_RANGES and CRITICAL_VALUES
+# as NumPy arrays for vectorized flagging, and a test -> category index
+
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from medical_reference import REFERENCE_RANGES, CRITICAL_VALUES, LAB_TEST_CATEGORIES
+
+# Column order of the bound arrays; 'unknown' holds the range only when it
+# does not depend on sex
+SEXES = ('male', 'female', 'unknown')
+
+_SEX_ALIASES = {'male': 0, 'm': 0, 'female': 1, 'f': 1}
+
+
+def _sex_ranges(ref: Dict) -> Tuple[Tuple, Tuple]:
+    """(male, female) bounds of one REFERENCE_RANGES entry"""
+    if 'male' in ref and 'female' in ref:
+        return ref['male'], ref['female']
+    if 'range' in ref:
+        return ref['range'], ref['range']
+    # Smoking-dependent ranges (CEA): use the stricter non-smoker range
+    return ref['non-smoker'], ref['non-smoker']
+
+
+class ReferenceTable:
+    """Reference and critical ranges as (tests x sex) low/high arrays"""
+
+    def __init__(self, reference_ranges: Dict = REFERENCE_RANGES, critical_values: Dict = CRITICAL_VALUES):
+        self.tests = tuple(reference_ranges)
+        self.index = {test: i for i, test in enumerate(self.tests)}
+        self.units = {test: ref.get('unit', '') for test, ref in reference_ranges.items()}
+
+        n = len(self.tests)
+        self.low = np.full((n, len(SEXES)), np.nan)
+        self.high = np.full((n, len(SEXES)), np.nan)
+        self.critical_low = np.full(n, np.nan)
+        self.critical_high = np.full(n, np.nan)
+        # Original (int/float) bounds for display, keyed by (test, sex)
+        self._bounds = {}
+
+        for i, test in enumerate(self.tests):
+            male, female = _sex_ranges(reference_ranges[test])
+            self._bounds[(test, 'male')] = male
+            self._bounds[(test, 'female')] = female
+            self.low[i, :2] = male[0], female[0]
+            self.high[i, :2] = male[1], female[1]
+            if male == female:
+                self._bounds[(test, 'unknown')] = male
+                self.low[i, 2], self.high[i, 2] = male
+            if test in critical_values:
+                self.critical_low[i], self.critical_high[i] = critical_values[test]
+
+    def bounds(self, test: str, sex: str = 'male') -> Optional[Tuple]:
+        """(low, high) for one test, or None if the test has no reference range.
+
+        Sex-independent ranges are returned for any sex label.
+        """
+        return self._bounds.get((test, sex)) or self._bounds.get((test, 'unknown'))
+
+    def sex_index(self, sex: Sequence) -> np.ndarray:
+        """Map sex labels to bound-array columns; unrecognised labels map to 'unknown'"""
+        labels = pd.Series(sex, dtype='object').astype(str).str.strip().str.lower()
+        return labels.map(_SEX_ALIASES).fillna(2).to_numpy(dtype=np.intp)
+
+    def flag_frame(self, results: pd.DataFrame, sex_column: str = 'sex') -> Dict[str, pd.DataFrame]:
+        """Flag a patients x tests DataFrame in one vectorized pass.
+
+        Columns that are not in REFERENCE_RANGES are ignored; non-numeric
+        cells count as missing. Returns boolean DataFrames keyed 'low',
+        'normal', 'high' and 'critical' with the same index and test columns;
+        missing values are False in all four.
+        """
+        tests = [c for c in results.columns if c in self.index]
+        values = results[tests].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+        cols = np.fromiter((self.index[t] for t in tests), dtype=np.intp, count=len(tests))
+        sex = self.sex_index(results[sex_column])
+
+        low = self.low[cols[None, :], sex[:, None]]
+        high = self.high[cols[None, :], sex[:, None]]
+        present = ~np.isnan(values)
+
+        with np.errstate(invalid='ignore'):
+            is_low = values < low
+            is_high = values > high
+            is_normal = present & (values >= low) & (values <= high)
+            is_critical = (values < self.critical_low[cols]) | (values > self.critical_high[cols])
+
+        def frame(flags):
+            return pd.DataFrame(flags, index=results.index, columns=tests)
+
+        return {
+            'low': frame(is_low),
+            'normal': frame(is_normal),
+            'high': frame(is_high),
+            'critical': frame(is_critical),
+        }
+
+
+# Compiled once at import
+REFERENCE_TABLE = ReferenceTable()
+
+
+def reference_bounds(test: str, gender: str = 'male') -> Optional[Tuple]:
+    """(low, high) reference range for a test and gender"""
+    return REFERENCE_TABLE.bounds(test, gender)
+
+
+def flag_results(results: pd.DataFrame, sex_column: str = 'sex') -> Dict[str, pd.DataFrame]:
+    """Low/normal/high/critical flag matrices for a patients x tests DataFrame"""
+    return REFERENCE_TABLE.flag_frame(results, sex_column)
+
+
+# Category for tests not listed in LAB_TEST_CATEGORIES
+OTHER_CATEGORY = 'Other'
+
+# Output order of categorize_tests
+CATEGORY_ORDER = tuple(LAB_TEST_CATEGORIES) + (OTHER_CATEGORY,)
+
+
+def _build_category_index(categories: Dict[str, List[str]]) -> Mapping[str, str]:
+    """Reverse LAB_TEST_CATEGORIES into a read-only test -> category map"""
+    index = {}
+    for category, tests in categories.items():
+        for test in tests:
+            # First listing wins, as in the original linear scan
+            index.setdefault(test, category)
+    return MappingProxyType(index)
+
+
+CATEGORY_INDEX = _build_category_index(LAB_TEST_CATEGORIES)
+
+
+def validate_category_index(reference_ranges: Dict = REFERENCE_RANGES,
+                            categories: Dict[str, List[str]] = LAB_TEST_CATEGORIES):
+    """Check every reference-range test belongs to exactly one category"""
+    problems = []
+    for test in reference_ranges:
+        owners = [category for category, tests in categories.items() if test in tests]
+        if len(owners) != 1:
+            problems.append(f"{test}: {owners or 'no category'}")
+    if problems:
+        raise ValueError("Inconsistent LAB_TEST_CATEGORIES: " + "; ".join(problems))
+
+
+validate_category_index()
+
+
+def category_of(test: str) -> str:
+    """Category of a single test"""
+    return CATEGORY_INDEX.get(test, OTHER_CATEGORY)
+
+
+def categorize_columns(columns: Iterable[str]) -> Dict[str, List[str]]:
+    """Group column names (e.g. of a patients x tests DataFrame) by category.
+
+    Categories come back in CATEGORY_ORDER and only when non-empty; columns
+    keep their input order within a category.
+    """
+    grouped = {category: [] for category in CATEGORY_ORDER}
+    for column in columns:
+        grouped[CATEGORY_INDEX.get(column, OTHER_CATEGORY)].append(column)
+    return {category: cols for category, cols in grouped.items() if cols}
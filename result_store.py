@@ -0,0 +1,196 @@
+# result_store.py
+# SQLite store of per-patient lab results over time, queried as NumPy time series
+
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Bump when the schema changes; stored in PRAGMA user_version
+STORE_FORMAT_VERSION = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY,
+    patient TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    gender TEXT,
+    age INTEGER,
+    source TEXT,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    report_id INTEGER NOT NULL REFERENCES reports(id) ON DELETE CASCADE,
+    patient TEXT NOT NULL,
+    test TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    value REAL,
+    text TEXT
+);
+CREATE INDEX IF NOT EXISTS reports_patient_time ON reports (patient, taken_at);
+-- Range queries are answered from the index alone (value is included)
+CREATE INDEX IF NOT EXISTS results_patient_test_time ON results (patient, test, taken_at, value);
+"""
+
+# (times as datetime64[s], values as float64), oldest first
+Series = Tuple[np.ndarray, np.ndarray]
+
+
+def to_timestamp(value=None) -> float:
+    """Unix seconds for a datetime, date, ISO string or number; now if None.
+
+    Naive datetimes and dates are taken as UTC, matching how NumPy
+    displays the returned datetime64 values.
+    """
+    if value is None:
+        return time.time()
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).timestamp()
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc).timestamp()
+    raise TypeError(f"Unsupported timestamp {value!r}")
+
+
+def _empty_series() -> Series:
+    return np.array([], dtype='datetime64[s]'), np.array([], dtype=float)
+
+
+class ResultStore:
+    """Lab results keyed by patient, test and collection time.
+
+    One connection shared by all threads (guarded by a lock); the database
+    uses WAL so other processes can read while a batch run writes. Nothing
+    is held in memory beyond SQLite's page cache, capped at cache_kb.
+    """
+
+    def __init__(self, path: str = "medlab_results.sqlite3", cache_kb: int = 8 * 1024):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA foreign_keys = ON")
+        self._conn.execute(f"PRAGMA cache_size = -{int(cache_kb)}")
+        if path != ":memory:":
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+        version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, STORE_FORMAT_VERSION):
+            raise ValueError(f"{path}: result store format {version}, expected {STORE_FORMAT_VERSION}")
+        with self._conn:
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute(f"PRAGMA user_version = {STORE_FORMAT_VERSION}")
+
+    def add_report(self, patient: str, values: Dict, taken_at=None, gender: Optional[str] = None,
+                   age: Optional[int] = None, source: Optional[str] = None) -> int:
+        """Store one report's parsed values; returns its report id"""
+        return self.add_reports([{'patient': patient, 'values': values, 'taken_at': taken_at,
+                                  'gender': gender, 'age': age, 'source': source}])[0]
+
+    def add_reports(self, reports: Iterable[Dict]) -> List[int]:
+        """Store many reports in one transaction.
+
+        Each report is a dict with 'patient' and 'values' (test -> value) and
+        optionally 'taken_at', 'gender', 'age' and 'source'. Numeric values
+        become time-series points; other values are kept as text.
+        """
+        created = time.time()
+        ids, rows = [], []
+        with self._lock, self._conn:
+            for report in reports:
+                patient = str(report['patient'])
+                taken_at = to_timestamp(report.get('taken_at'))
+                cursor = self._conn.execute(
+                    "INSERT INTO reports (patient, taken_at, gender, age, source, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (patient, taken_at, report.get('gender'), report.get('age'), report.get('source'), created))
+                ids.append(cursor.lastrowid)
+                for test, value in report['values'].items():
+                    number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                    rows.append((cursor.lastrowid, patient, test, taken_at,
+                                 float(value) if number else None, None if number else str(value)))
+            self._conn.executemany(
+                "INSERT INTO results (report_id, patient, test, taken_at, value, text) VALUES (?, ?, ?, ?, ?, ?)",
+                rows)
+        return ids
+
+    @staticmethod
+    def _range(start, end) -> Tuple[str, list]:
+        clause, params = "", []
+        if start is not None:
+            clause += " AND taken_at >= ?"
+            params.append(to_timestamp(start))
+        if end is not None:
+            clause += " AND taken_at <= ?"
+            params.append(to_timestamp(end))
+        return clause, params
+
+    def series(self, patient: str, test: str, start=None, end=None) -> Series:
+        """Numeric results of one test for one patient, optionally within [start, end]"""
+        clause, params = self._range(start, end)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT taken_at, value FROM results WHERE patient = ? AND test = ? AND value IS NOT NULL"
+                + clause + " ORDER BY taken_at", [patient, test] + params).fetchall()
+        if not rows:
+            return _empty_series()
+        points = np.array(rows, dtype=float)
+        return points[:, 0].astype('datetime64[s]'), points[:, 1]
+
+    def history(self, patient: str, tests: Optional[Sequence[str]] = None, start=None, end=None) -> Dict[str, Series]:
+        """series() for several tests (all of the patient's tests by default) in one query"""
+        clause, params = self._range(start, end)
+        if tests is not None:
+            if not tests:
+                return {}
+            clause += f" AND test IN ({', '.join('?' * len(tests))})"
+            params.extend(tests)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT test, taken_at, value FROM results WHERE patient = ? AND value IS NOT NULL"
+                + clause + " ORDER BY test, taken_at", [patient] + params).fetchall()
+        if not rows:
+            return {}
+        names = np.array([row[0] for row in rows], dtype=object)
+        points = np.array([row[1:] for row in rows], dtype=float)
+        # Rows are grouped by test, so each test is one contiguous slice
+        starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+        ends = np.r_[starts[1:], len(rows)]
+        return {names[s]: (points[s:e, 0].astype('datetime64[s]'), points[s:e, 1]) for s, e in zip(starts, ends)}
+
+    def frame(self, patients: Optional[Sequence[str]] = None, tests: Optional[Sequence[str]] = None,
+              start=None, end=None) -> pd.DataFrame:
+        """Numeric results as a long DataFrame (patient, test, taken_at, value), e.g. for cohort delta checks"""
+        clause, params = self._range(start, end)
+        for column, wanted in (('patient', patients), ('test', tests)):
+            if wanted is not None:
+                clause += f" AND {column} IN ({', '.join('?' * len(wanted))})" if wanted else " AND 0"
+                params.extend(wanted)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT patient, test, taken_at, value FROM results WHERE value IS NOT NULL" + clause, params).fetchall()
+        return pd.DataFrame(rows, columns=['patient', 'test', 'taken_at', 'value'])
+
+    def patient_tests(self, patient: str) -> List[str]:
+        """Tests with at least one numeric result for the patient"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT test FROM results WHERE patient = ? AND value IS NOT NULL ORDER BY test",
+                (patient,)).fetchall()
+        return [row[0] for row in rows]
+
+    def report_count(self, patient: Optional[str] = None) -> int:
+        with self._lock:
+            if patient is None:
+                return self._conn.execute("SELECT COUNT(*) FROM reports").fetchone()[0]
+            return self._conn.execute("SELECT COUNT(*) FROM reports WHERE patient = ?", (patient,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
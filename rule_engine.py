@@ -0,0 +1,392 @@
+# rule_engine.py
+# Interpretation rules as data: category patterns and differential diagnoses,
+# compiled once at import into scalar and vectorized (patients x tests) evaluators
+#
+# A rule fires when every test in 'requires' is present, every comparison in
+# 'when' holds and, for rules with 'cases', emits the first case whose own
+# requires/when hold (an if/elif chain; a case without conditions is the else).
+# A comparison is (operand, op, threshold); the operand is a test name or a
+# (numerator, denominator) pair for a ratio. Comparisons only hold for numeric
+# values. Messages are str.format templates over the category's test values.
+
+import operator
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from telemetry import TELEMETRY
+
+_OPS = {'<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+URGENCY_ORDER = {'Critical': 0, 'High': 1, 'Moderate': 2, 'Low': 3}
+
+# Category -> rules, in output order. Thresholds are the clinical decision
+# points the analysis has always used; several differ from the
+# REFERENCE_RANGES limits (e.g. ALT 40 vs 56, ALP 120 vs 147, TSH 4.5 vs 4.0)
+# and can now be aligned here in one place.
+PATTERN_RULES = {
+    'Hematology': [
+        # Anemia classification
+        {'requires': ('Hemoglobin', 'MCV'), 'when': [('Hemoglobin', '<', 12)], 'cases': [
+            {'when': [('MCV', '<', 80)],
+             'message': "🔴 Microcytic anemia - consider iron deficiency, thalassemia, or anemia of chronic disease"},
+            {'when': [('MCV', '>', 100)],
+             'message': "🔴 Macrocytic anemia - consider B12/folate deficiency, liver disease, MDS, or hemolysis"},
+            {'message': "🟡 Normocytic anemia - consider acute blood loss, hemolysis, or early iron deficiency"},
+        ]},
+        {'when': [('RDW', '>', 14.5)],
+         'message': "📊 Elevated RDW suggests anisocytosis - seen in iron deficiency, mixed deficiencies, or post-transfusion"},
+        # Thrombocytopenia patterns
+        {'when': [('Platelets', '<', 150)], 'cases': [
+            {'when': [('MPV', '>', 11.5)],
+             'message': "🔴 Thrombocytopenia with high MPV suggests peripheral destruction (ITP, TTP)"},
+            {'requires': ('MPV',),
+             'message': "🔴 Thrombocytopenia with normal/low MPV suggests bone marrow failure or sequestration"},
+            {'message': "🟡 Thrombocytopenia - verify with peripheral smear for pseudothrombocytopenia"},
+        ]},
+        # Leukocytosis / leukopenia
+        {'requires': ('WBC',), 'cases': [
+            {'when': [('WBC', '>', 11), ('Neutrophils', '>', 70)],
+             'message': "🟡 Neutrophilic leukocytosis suggests bacterial infection, inflammation, or stress"},
+            {'when': [('WBC', '>', 11), ('Lymphocytes', '>', 40)],
+             'message': "🟡 Lymphocytosis suggests viral infection, lymphoid malignancy, or pertussis"},
+            {'when': [('WBC', '<', 4)],
+             'message': "🔴 Leukopenia - increased infection risk, consider viral infection or bone marrow suppression"},
+        ]},
+        {'when': [('Blasts', '>', 0)],
+         'message': "🚨 CRITICAL: {Blasts}% blasts detected - possible acute leukemia requiring immediate hematology referral"},
+    ],
+    'Liver_Function': [
+        # Hepatocellular vs cholestatic
+        {'requires': ('ALT', 'ALP'), 'cases': [
+            {'when': [('ALT', '>', 40), ('ALP', '<', 120)],
+             'message': "🔴 Hepatocellular pattern - suggests viral hepatitis, drug-induced injury, or ischemic hepatitis"},
+            {'when': [('ALP', '>', 120), ('ALT', '<', 40)],
+             'message': "🔴 Cholestatic pattern - suggests biliary obstruction, primary biliary cholangitis, or drug-induced cholestasis"},
+            {'when': [('ALT', '>', 40), ('ALP', '>', 120)],
+             'message': "🟡 Mixed hepatocellular-cholestatic pattern - suggests alcoholic hepatitis or acute viral hepatitis"},
+        ]},
+        # Bilirubin fractionation
+        {'requires': ('Direct_Bilirubin',), 'when': [('Total_Bilirubin', '>', 1.2)], 'cases': [
+            {'when': [(('Direct_Bilirubin', 'Total_Bilirubin'), '>', 0.5)],
+             'message': "🔴 Conjugated hyperbilirubinemia - suggests hepatocellular disease or biliary obstruction"},
+            {'message': "🟡 Unconjugated hyperbilirubinemia - suggests hemolysis, Gilbert syndrome, or ineffective erythropoiesis"},
+        ]},
+        # Synthetic function
+        {'when': [('Albumin', '<', 3.5)],
+         'message': "📉 Hypoalbuminemia suggests decreased synthetic function - chronic liver disease, malnutrition, or nephrotic syndrome"},
+        # INR is categorized under Coagulation, so categorize_tests never passes it here
+        {'when': [('INR', '>', 1.2)],
+         'message': "🔴 Elevated INR suggests impaired coagulation factor synthesis - severe liver disease or vitamin K deficiency"},
+    ],
+    'Kidney_Function': [
+        {'when': [('Creatinine', '>', 1.2)],
+         'message': "🔴 Elevated creatinine ({Creatinine}) suggests reduced GFR"},
+        {'requires': ('BUN',), 'when': [('Creatinine', '>', 1.2)], 'cases': [
+            {'when': [(('BUN', 'Creatinine'), '>', 20)],
+             'message': "📊 BUN:Creatinine ratio >20 suggests prerenal azotemia (dehydration, CHF, GI bleeding)"},
+            {'when': [(('BUN', 'Creatinine'), '<', 10)],
+             'message': "📊 BUN:Creatinine ratio <10 suggests intrinsic renal disease or liver disease"},
+        ]},
+        {'when': [('eGFR', '<', 60)],
+         'message': "🔴 eGFR {eGFR} indicates CKD G3a-G5 - evaluate for complications"},
+        # Electrolyte disturbances
+        {'requires': ('Potassium',), 'cases': [
+            {'when': [('Potassium', '>', 5.0)],
+             'message': "🚨 Hyperkalemia ({Potassium}) - risk of cardiac arrhythmia, requires urgent management"},
+            {'when': [('Potassium', '<', 3.5)],
+             'message': "🟡 Hypokalemia ({Potassium}) - consider diuretic use, GI losses, or renal wasting"},
+        ]},
+    ],
+    'Metabolic': [
+        {'requires': ('HbA1c',), 'cases': [
+            {'when': [('HbA1c', '>=', 6.5)], 'message': "🔴 HbA1c {HbA1c}% meets criteria for diabetes mellitus"},
+            {'when': [('HbA1c', '>=', 5.7)],
+             'message': "🟡 HbA1c {HbA1c}% indicates prediabetes - lifestyle intervention recommended"},
+        ]},
+        {'requires': ('Glucose_Fasting',), 'cases': [
+            {'when': [('Glucose_Fasting', '>=', 126)],
+             'message': "🔴 Fasting glucose {Glucose_Fasting} mg/dL meets diabetes criteria"},
+            {'when': [('Glucose_Fasting', '>=', 100)],
+             'message': "🟡 Impaired fasting glucose ({Glucose_Fasting}) - prediabetes"},
+        ]},
+    ],
+    'Endocrine': [
+        {'requires': ('Free_T4',), 'when': [('TSH', '>', 4.5)], 'cases': [
+            {'when': [('Free_T4', '<', 0.8)], 'message': "🔴 Primary hypothyroidism - elevated TSH with low FT4"},
+            {'message': "🟡 Subclinical hypothyroidism - elevated TSH with normal FT4"},
+        ]},
+        {'when': [('TSH', '>', 4.5), ('Anti_TPO', '>', 35)],
+         'message': "📊 Positive Anti-TPO suggests autoimmune (Hashimoto's) thyroiditis"},
+        {'requires': ('Free_T4',), 'when': [('TSH', '<', 0.4)], 'cases': [
+            {'when': [('Free_T4', '>', 1.8)], 'message': "🔴 Primary hyperthyroidism - suppressed TSH with elevated FT4"},
+            {'message': "🟡 Subclinical hyperthyroidism - suppressed TSH with normal FT4"},
+        ]},
+    ],
+    'Lipid_Profile': [
+        {'when': [('LDL', '>', 100)], 'message': "🟡 Elevated LDL ({LDL}) - increased cardiovascular risk"},
+        {'when': [('HDL', '<', 40)], 'message': "🟡 Low HDL - cardiovascular risk factor"},
+        {'when': [('Triglycerides', '>', 150)], 'cases': [
+            {'when': [('Triglycerides', '>', 500)],
+             'message': "🔴 Severe hypertriglyceridemia ({Triglycerides}) - pancreatitis risk"},
+            {'message': "🟡 Elevated triglycerides - metabolic syndrome component"},
+        ]},
+    ],
+    'Immunology_Rheumatology': [
+        # Rheumatoid arthritis
+        {'when': [('RF', '>', 20)], 'message': "📊 Positive RF supports rheumatoid arthritis diagnosis"},
+        {'when': [('Anti_CCP', '>', 20)], 'message': "📊 Anti-CCP positive - highly specific for rheumatoid arthritis"},
+        # Lupus
+        {'requires': ('ANA',),
+         'message': "📊 Positive ANA - if clinically suspected, check specific autoantibodies (dsDNA, Sm, RNP)"},
+        {'when': [('dsDNA', '>', 100)], 'message': "🔴 Elevated anti-dsDNA - specific for systemic lupus erythematosus"},
+        # Inflammation
+        {'when': [('ESR', '>', 20)], 'message': "📊 Elevated ESR ({ESR}) indicates active inflammation"},
+        {'when': [('CRP', '>', 10)], 'message': "📊 Elevated CRP ({CRP}) suggests acute inflammation or infection"},
+    ],
+}
+
+# Differential diagnoses, in output order before sorting by urgency.
+# 'supporting_evidence' entries are templates like pattern messages.
+DIAGNOSIS_RULES = [
+    {'category': 'Hematology', 'when': [('Blasts', '>', 5)], 'diagnosis': {
+        'condition': 'Acute Leukemia',
+        'probability': 'High',
+        'urgency': 'Critical',
+        'supporting_evidence': ["{Blasts}% blasts in peripheral blood"],
+        'next_step': 'Urgent hematology referral, bone marrow biopsy, flow cytometry'}},
+    {'category': 'Hematology', 'when': [('Hemoglobin', '<', 7)], 'diagnosis': {
+        'condition': 'Severe Anemia',
+        'probability': 'Confirmed',
+        'urgency': 'High',
+        'supporting_evidence': ["Hemoglobin {Hemoglobin} g/dL"],
+        'next_step': 'Transfusion consideration, iron studies, B12/folate, reticulocyte count'}},
+    {'category': 'Metabolic', 'when': [('HbA1c', '>=', 6.5)], 'diagnosis': {
+        'condition': 'Diabetes Mellitus',
+        'probability': 'High',
+        'urgency': 'Moderate',
+        'supporting_evidence': ["HbA1c {HbA1c}%"],
+        'next_step': 'Confirm with repeat testing, ophthalmology referral, urine microalbumin, lipid panel'}},
+    {'category': 'Kidney_Function', 'when': [('eGFR', '<', 30)], 'diagnosis': {
+        'condition': 'Stage 4-5 Chronic Kidney Disease',
+        'probability': 'High',
+        'urgency': 'High',
+        'supporting_evidence': ["eGFR {eGFR} mL/min"],
+        'next_step': 'Nephrology referral, renal ultrasound, anemia workup, bone metabolism assessment'}},
+    {'category': 'Liver_Function', 'when': [('Total_Bilirubin', '>', 3)], 'diagnosis': {
+        'condition': 'Jaundice/Hepatic Dysfunction',
+        'probability': 'High',
+        'urgency': 'Moderate',
+        'supporting_evidence': ["Bilirubin {Total_Bilirubin} mg/dL"],
+        'next_step': 'Hepatitis serologies, abdominal ultrasound, INR, albumin'}},
+]
+
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float))
+
+
+def _operand_tests(operand) -> Tuple[str, ...]:
+    return operand if isinstance(operand, tuple) else (operand,)
+
+
+class _Clause:
+    """One conjunction: tests that must be present plus comparisons"""
+
+    def __init__(self, spec: Dict):
+        comparisons = spec.get('when', [])
+        for _, op, _ in comparisons:
+            if op not in _OPS:
+                raise ValueError(f"Unknown comparison {op!r} in rule {spec}")
+        self.comparisons = [(_operand_tests(operand), _OPS[op], threshold)
+                            for operand, op, threshold in comparisons]
+        tests = list(spec.get('requires', ()))
+        for operand, _, _ in self.comparisons:
+            tests.extend(operand)
+        self.tests = tuple(dict.fromkeys(tests))
+        self.required = frozenset(self.tests)
+
+    def holds(self, tests: Dict) -> bool:
+        if not self.required <= tests.keys():
+            return False
+        for operand, compare, threshold in self.comparisons:
+            value = tests[operand[0]]
+            if not isinstance(value, (int, float)):
+                return False
+            if len(operand) == 2:
+                denominator = tests[operand[1]]
+                if not isinstance(denominator, (int, float)) or denominator == 0:
+                    return False
+                value = value / denominator
+            if not compare(value, threshold):
+                return False
+        return True
+
+    def mask(self, present: Dict[str, np.ndarray], numbers: Dict[str, np.ndarray], size: int) -> np.ndarray:
+        result = np.ones(size, dtype=bool)
+        for test in self.tests:
+            result &= present[test]
+        for operand, compare, threshold in self.comparisons:
+            if len(operand) == 2:
+                numerator, denominator = numbers[operand[0]], numbers[operand[1]]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    value = np.where(denominator != 0, numerator / denominator, np.nan)
+            else:
+                value = numbers[operand[0]]
+            with np.errstate(invalid='ignore'):
+                result &= compare(value, threshold)
+        return result
+
+
+class _Rule:
+    def __init__(self, spec: Dict, outputs: Sequence):
+        self.guard = _Clause(spec)
+        cases = spec.get('cases') or [{}]
+        self.cases = [_Clause(case) for case in cases]
+        self.outputs = list(outputs)
+        # Tests needed by the guard or by every case: without them the rule cannot fire
+        self.inputs = self.guard.required | frozenset.intersection(*(case.required for case in self.cases))
+
+    def first_case(self, tests: Dict) -> Optional[int]:
+        if not self.guard.holds(tests):
+            return None
+        for i, case in enumerate(self.cases):
+            if case.holds(tests):
+                return i
+        return None
+
+    def case_masks(self, present, numbers, size: int) -> List[np.ndarray]:
+        """Per case, the patients for which it is the first case that holds"""
+        remaining = self.guard.mask(present, numbers, size)
+        masks = []
+        for case in self.cases:
+            fired = remaining & case.mask(present, numbers, size)
+            remaining &= ~fired
+            masks.append(fired)
+        return masks
+
+
+def _format_diagnosis(diagnosis: Dict, tests: Dict) -> Dict:
+    formatted = dict(diagnosis)
+    formatted['supporting_evidence'] = [evidence.format(**tests) for evidence in diagnosis['supporting_evidence']]
+    return formatted
+
+
+class RuleEngine:
+    """PATTERN_RULES and DIAGNOSIS_RULES compiled for evaluation.
+
+    patterns()/diagnoses() evaluate one patient and skip rules whose input
+    tests are absent; evaluate_batch() evaluates many patients with one
+    NumPy predicate per comparison and gives the same output per patient.
+    """
+
+    def __init__(self, pattern_rules: Dict = PATTERN_RULES, diagnosis_rules: List = DIAGNOSIS_RULES):
+        self.pattern_rules = {
+            category: [_Rule(spec, [case.get('message', spec.get('message')) for case in spec.get('cases') or [{}]])
+                       for spec in rules]
+            for category, rules in pattern_rules.items()
+        }
+        self.diagnosis_rules = [(spec['category'], _Rule(spec, [spec['diagnosis']])) for spec in diagnosis_rules]
+        # (category, test) columns referenced by any rule, grouped by category
+        columns = {}
+        for category, rules in self.pattern_rules.items():
+            for rule in rules:
+                for clause in [rule.guard] + rule.cases:
+                    columns.setdefault(category, {}).update(dict.fromkeys(clause.tests))
+        for category, rule in self.diagnosis_rules:
+            columns.setdefault(category, {}).update(dict.fromkeys(rule.guard.tests))
+        self.columns = [(category, test) for category, tests in columns.items() for test in tests]
+        self._column_index = {category: {} for category in columns}
+        for j, (category, test) in enumerate(self.columns):
+            self._column_index[category][test] = j
+
+    @property
+    def categories(self) -> Tuple[str, ...]:
+        """Categories that have pattern rules"""
+        return tuple(self.pattern_rules)
+
+    def patterns(self, category: str, tests: Dict) -> List[str]:
+        """Pattern messages for one category's tests"""
+        messages = []
+        keys = tests.keys()
+        with TELEMETRY.span('rule_patterns', category):
+            for rule in self.pattern_rules.get(category, ()):
+                if not rule.inputs <= keys:
+                    continue
+                case = rule.first_case(tests)
+                if case is not None and rule.outputs[case] is not None:
+                    messages.append(rule.outputs[case].format(**tests))
+        return messages
+
+    def diagnoses(self, categorized_tests: Dict) -> List[Dict]:
+        """Differential diagnoses, most urgent first"""
+        found = []
+        for category, rule in self.diagnosis_rules:
+            tests = categorized_tests.get(category)
+            if tests and rule.inputs <= tests.keys() and rule.first_case(tests) is not None:
+                found.append(_format_diagnosis(rule.outputs[0], tests))
+        return sorted(found, key=lambda dx: URGENCY_ORDER.get(dx['urgency'], 4))
+
+    def evaluate_batch(self, categorized_list: Sequence[Dict]) -> List[Dict]:
+        """{'patterns': {category: messages}, 'diagnoses': [...]} per patient.
+
+        Patterns are listed for every category with rules that the patient
+        has tests in, as generate_comprehensive_analysis reports them.
+        """
+        size = len(categorized_list)
+        results = []
+        # (column, patient) matrices: key present, and numeric value or NaN
+        rows, cols, values = [], [], []
+        for row, patient in enumerate(categorized_list):
+            patterns = {}
+            for category, tests in patient.items():
+                if tests and category in self.pattern_rules:
+                    patterns[category] = []
+                index = self._column_index.get(category)
+                if not index:
+                    continue
+                for test, value in tests.items():
+                    j = index.get(test)
+                    if j is not None:
+                        rows.append(row)
+                        cols.append(j)
+                        values.append(value if isinstance(value, (int, float)) else np.nan)
+            results.append({'patterns': patterns, 'diagnoses': []})
+        present = np.zeros((len(self.columns), size), dtype=bool)
+        numbers = np.full((len(self.columns), size), np.nan)
+        cols, rows = np.array(cols, dtype=np.intp), np.array(rows, dtype=np.intp)
+        present[cols, rows] = True
+        numbers[cols, rows] = np.array(values, dtype=float)
+
+        for category, rules in self.pattern_rules.items():
+            index = self._column_index[category]
+            view_present = {test: present[j] for test, j in index.items()}
+            view_numbers = {test: numbers[j] for test, j in index.items()}
+            for rule in rules:
+                # Only rules whose inputs some patient has are evaluated
+                if not all(view_present[test].any() for test in rule.inputs):
+                    continue
+                for message, mask in zip(rule.outputs, rule.case_masks(view_present, view_numbers, size)):
+                    if message is None:
+                        continue
+                    for row in np.flatnonzero(mask).tolist():
+                        results[row]['patterns'][category].append(
+                            message.format(**categorized_list[row][category]) if '{' in message else message)
+
+        for category, rule in self.diagnosis_rules:
+            index = self._column_index[category]
+            view_present = {test: present[index[test]] for test in rule.guard.tests}
+            view_numbers = {test: numbers[index[test]] for test in rule.guard.tests}
+            if not all(view_present[test].any() for test in rule.inputs):
+                continue
+            mask, = rule.case_masks(view_present, view_numbers, size)
+            for row in np.flatnonzero(mask).tolist():
+                results[row]['diagnoses'].append(_format_diagnosis(rule.outputs[0], categorized_list[row][category]))
+
+        for result in results:
+            result['diagnoses'].sort(key=lambda dx: URGENCY_ORDER.get(dx['urgency'], 4))
+        return results
+
+
+# Compiled once at import
+RULE_ENGINE = RuleEngine()
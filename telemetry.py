@@ -0,0 +1,219 @@
+# telemetry.py
+# Per-stage timing spans recorded into in-process histograms, exported as
+# Prometheus text or a Chrome/Perfetto JSON trace
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Histogram bucket upper bounds in seconds (Prometheus 'le' labels)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Most recent spans kept for the JSON trace
+DEFAULT_TRACE_SIZE = 10_000
+
+# Shared by every disabled span, so a disabled span allocates nothing
+_NOOP_SPAN = nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram with exact count, sum, min and max"""
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Estimate by linear interpolation inside the bucket holding rank q,
+        clamped to the observed min and max
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                low = self.buckets[i - 1] if i else 0.0
+                high = self.buckets[i] if i < len(self.buckets) else self.max
+                estimate = low + (high - low) * (rank - seen) / count
+                return min(max(estimate, self.min), self.max)
+            seen += count
+        return self.max
+
+
+class _Span:
+    __slots__ = ('telemetry', 'name', 'detail', 'start')
+
+    def __init__(self, telemetry: 'Telemetry', name: str, detail: str):
+        self.telemetry = telemetry
+        self.name = name
+        self.detail = detail
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.telemetry.record(self.name, time.perf_counter() - self.start, self.start, self.detail)
+        return False
+
+
+class Telemetry:
+    """Process-wide timing spans.
+
+    Spans are keyed by a stage name plus an optional detail (e.g. the
+    category for rule patterns). While disabled, span() returns a shared
+    no-op context manager and timed() functions call straight through, so
+    instrumentation costs one attribute check.
+    """
+
+    def __init__(self, enabled: bool = False, buckets: Tuple[float, ...] = DEFAULT_BUCKETS,
+                 trace_size: int = DEFAULT_TRACE_SIZE):
+        self.enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], Histogram] = {}
+        self._trace = deque(maxlen=trace_size)
+        # Trace timestamps are relative to this perf_counter reading
+        self._epoch = time.perf_counter()
+        self._epoch_unix = time.time()
+
+    def span(self, name: str, detail: str = ''):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, detail)
+
+    def timed(self, name: str) -> Callable:
+        """Decorator recording every call of a function as a span"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start, start)
+            return wrapper
+        return decorator
+
+    def record(self, name: str, seconds: float, start: Optional[float] = None, detail: str = ''):
+        with self._lock:
+            histogram = self._histograms.get((name, detail))
+            if histogram is None:
+                histogram = self._histograms[(name, detail)] = Histogram(self.buckets)
+            histogram.observe(seconds)
+            self._trace.append((name, detail, time.perf_counter() - seconds if start is None else start,
+                                seconds, threading.get_ident()))
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._trace.clear()
+
+    def summary(self) -> List[Dict]:
+        """One row per stage: count, total, mean, p50, p95 and max in milliseconds"""
+        with self._lock:
+            items = sorted(self._histograms.items())
+            return [{
+                'stage': name + (f" [{detail}]" if detail else ""),
+                'count': h.count,
+                'total_ms': round(h.sum * 1000, 3),
+                'mean_ms': round(h.sum / h.count * 1000, 3),
+                'p50_ms': round(h.quantile(0.5) * 1000, 3),
+                'p95_ms': round(h.quantile(0.95) * 1000, 3),
+                'max_ms': round(h.max * 1000, 3),
+            } for (name, detail), h in items]
+
+    def prometheus_text(self, metric: str = 'medlab_stage_duration_seconds') -> str:
+        """Histograms in the Prometheus text exposition format"""
+        lines = [f"# HELP {metric} Time spent in each pipeline stage",
+                 f"# TYPE {metric} histogram"]
+        with self._lock:
+            for (name, detail), h in sorted(self._histograms.items()):
+                labels = f'stage="{_escape(name)}"' + (f',detail="{_escape(detail)}"' if detail else '')
+                cumulative = 0
+                for bound, count in zip(h.buckets + (float('inf'),), h.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{metric}_bucket{{{labels},le="{le}"}} {cumulative}')
+                lines.append(f'{metric}_sum{{{labels}}} {h.sum!r}')
+                lines.append(f'{metric}_count{{{labels}}} {h.count}')
+        return "\n".join(lines) + "\n"
+
+    def chrome_trace(self) -> Dict:
+        """Recent spans in the Trace Event format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        with self._lock:
+            spans = list(self._trace)
+        return {
+            'traceEvents': [{
+                'name': name, 'cat': 'medlab', 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': round((start - self._epoch) * 1e6, 1), 'dur': round(seconds * 1e6, 1),
+                **({'args': {'detail': detail}} if detail else {}),
+            } for name, detail, start, seconds, tid in spans],
+            'displayTimeUnit': 'ms',
+            'otherData': {'epoch_unix': self._epoch_unix},
+        }
+
+    def chrome_trace_json(self) -> str:
+        return json.dumps(self.chrome_trace())
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def start_metrics_server(telemetry: 'Telemetry', port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    """Serve /metrics (Prometheus text) and /trace (JSON) from a daemon thread"""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path == '/metrics':
+                body, content_type = telemetry.prometheus_text(), 'text/plain; version=0.0.4'
+            elif self.path == '/trace':
+                body, content_type = telemetry.chrome_trace_json(), 'application/json'
+            else:
+                self.send_error(404)
+                return
+            data = body.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+# Shared by the app, parser, OCR pipeline, rule engine and RAG
+TELEMETRY = Telemetry(enabled=os.environ.get("MEDLAB_TELEMETRY", "0") == "1")
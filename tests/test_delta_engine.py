@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from delta_engine import aki_stages, delta_frame
+
+HOUR = 3600.0
+DAY = 86400.0
+
+
+def _creatinine(values, hours):
+    return pd.DataFrame({'patient': 'p1', 'test': 'Creatinine', 'value': values,
+                         'taken_at': [h * HOUR for h in hours]})
+
+
+def test_aki_rise_of_exactly_0_3_within_48h():
+    # 1.2 - 0.9 == 0.29999999999999993 in floating point
+    assert aki_stages(np.array([1.2]), np.array([0.9]), np.array([0.9]))[0] == 1
+    assert delta_frame(_creatinine([0.9, 1.2], [0, 24]))['aki_stage'].tolist() == [0, 1]
+
+
+@pytest.mark.parametrize('baseline, current, stage', [
+    (0.8, 1.2, 1),   # 1.5x: 1.2 / 0.8 == 1.4999999999999998
+    (0.7, 1.4, 2),   # 2.0x
+    (0.4, 1.2, 3),   # 3.0x: 1.2 / 0.4 == 2.9999999999999996
+])
+def test_aki_stage_at_exact_baseline_ratio(baseline, current, stage):
+    assert aki_stages(np.array([current]), np.array([np.nan]), np.array([baseline]))[0] == stage
+    # Five days apart: outside the 48-hour rise window, inside the 7-day baseline
+    assert delta_frame(_creatinine([baseline, current], [0, 120]))['aki_stage'].tolist() == [0, stage]
+
+
+def test_aki_just_below_thresholds():
+    assert aki_stages(np.array([1.19]), np.array([0.9]), np.array([0.9]))[0] == 0
+    assert aki_stages(np.array([1.19]), np.array([np.nan]), np.array([0.8]))[0] == 0
+
+
+def test_delta_limit_at_exact_boundary():
+    # Potassium limit is an absolute 1.0: 4.1 - 3.1 == 0.9999999999999996
+    frame = pd.DataFrame({'patient': 'p1', 'test': 'Potassium', 'value': [3.1, 4.1], 'taken_at': [0, DAY]})
+    assert delta_frame(frame)['delta_flag'].tolist() == [False, True]
+    # WBC limit is 50%: 6.6 -> 9.9 is +50.00000000000001%, 9.9 -> 4.95 is -50%
+    frame = pd.DataFrame({'patient': 'p1', 'test': 'WBC', 'value': [6.6, 9.9, 4.95], 'taken_at': [0, DAY, 2 * DAY]})
+    assert delta_frame(frame)['delta_flag'].tolist() == [False, True, True]
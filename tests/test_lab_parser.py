@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+import batch_cli
+from lab_parser import merge_lab_values, parse_lab_values
+from ocr_jobs import MemoryUpload
+
+PAGES = [
+    "CBC\nHemoglobin: 13.5 g/dL\nWBC: 7.2\n",
+    "Hemoglobin: 9.1 g/dL\nPlatelets: 250\nSodium: 140\n",
+    "WBC: 11.0\nPotassium: 4.1\n",
+]
+
+
+def test_merging_page_parses_matches_full_parse():
+    parsed = {}
+    for page in PAGES:
+        parsed = merge_lab_values(parsed, parse_lab_values(page))
+    full = parse_lab_values("".join(PAGES))
+    assert parsed == full
+    assert list(parsed) == list(full)
+    # First-seen values win
+    assert parsed['Hemoglobin'] == 13.5 and parsed['WBC'] == 7.2
+
+
+@pytest.fixture(scope='module')
+def app(tmp_path_factory):
+    os.environ['MEDLAB_OCR_CACHE_DIR'] = str(tmp_path_factory.mktemp('ocr_cache'))
+    return batch_cli.load_app(use_rag=False)
+
+
+def extract_windows(app, monkeypatch, pages):
+    """Every yield of iter_document_extraction over OCR'd pages, one page per window"""
+    def fake_pdf_text(data, **kwargs):
+        for first, page in enumerate(pages):
+            yield first, len(pages), [page], ['ocr']
+
+    monkeypatch.setattr(app, 'iter_pdf_text', fake_pdf_text)
+    upload = MemoryUpload('report.pdf', 'application/pdf', b'%PDF')
+    return list(app.iter_document_extraction(upload, use_cache=False))
+
+
+def full_text(pages):
+    return "".join(page + "\n" for page in pages)
+
+
+def test_label_and_value_split_across_ocr_page_break(app, monkeypatch):
+    # Tesseract ends every page with "\n\f"
+    pages = ["Sodium 140\nHemoglobin:\n\f", "13.5 g/dL\nWBC 7\n\f", "Potassium 4.1\n\f"]
+    yields = extract_windows(app, monkeypatch, pages)
+    # Found by the intermediate window, not only by the final full parse
+    assert yields[1][3]['Hemoglobin'] == 13.5
+    final = yields[-1]
+    assert final[2] == full_text(pages)
+    assert final[3] == parse_lab_values(full_text(pages))
+    assert final[3]['Hemoglobin'] == 13.5
+
+
+def test_multi_word_ana_value_at_window_edge(app, monkeypatch):
+    pages = ["Sodium 140\nANA: Positive 1\n\f", "160 speckled pattern\nWBC 7\n\f"]
+    final = extract_windows(app, monkeypatch, pages)[-1]
+    expected = parse_lab_values(full_text(pages))
+    assert final[3] == expected
+    assert list(final[3]) == list(expected)
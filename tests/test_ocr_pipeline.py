@@ -0,0 +1,18 @@
+from ocr_pipeline import has_usable_text
+
+ROWS = [("Hemoglobin", 13.5, "g/dL", "12-16"), ("WBC", 7.2, "10^3/uL", "4-11"),
+        ("Platelets", 250, "10^3/uL", "150-400"), ("Sodium", 140, "mEq/L", "135-145")]
+
+
+def test_column_aligned_table_uses_text_layer():
+    # Padding spaces make up most of the characters of a column-aligned table
+    page = "\n".join(f"{name:<28}{value:>10}  {unit:<14}{reference:<14}" for name, value, unit, reference in ROWS)
+    assert sum(ch.isalnum() for ch in page) < len(page.strip()) // 3
+    assert has_usable_text(page)
+
+
+def test_unusable_text_layers_fall_back_to_ocr():
+    assert not has_usable_text("")
+    assert not has_usable_text("Page 1")
+    assert not has_usable_text("(cid:12)(cid:5)(cid:44) " * 10)
+    assert not has_usable_text("\x01\x02\x03\x04\x05\x06 ab" * 20)
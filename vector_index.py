@@ -0,0 +1,132 @@
+# vector_index.py
+# FAISS index construction for MedLabRAG: flat, IVF, HNSW and IVF-PQ
+
+import math
+from typing import Dict, Optional
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# 'flat' is exact; the others trade recall for search speed and/or memory
+INDEX_TYPES = ('flat', 'ivf', 'hnsw', 'pq')
+
+DEFAULT_INDEX_PARAMS = {
+    # IVF / PQ: inverted lists (capped at 4*sqrt(n)) and lists probed per query
+    'nlist': 1024,
+    'nprobe': 16,
+    # HNSW: graph degree and build/search beam widths
+    'hnsw_m': 32,
+    'ef_construction': 200,
+    'ef_search': 128,
+    # PQ: sub-quantizers per vector and bits per code
+    'pq_m': 48,
+    'pq_bits': 8,
+    # IVF and PQ need enough vectors to train; smaller corpora get a flat index
+    'min_train': 1000,
+}
+
+
+def resolve_params(params: Optional[Dict] = None) -> Dict:
+    unknown = set(params or {}) - set(DEFAULT_INDEX_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown index parameters: {sorted(unknown)}")
+    return {**DEFAULT_INDEX_PARAMS, **(params or {})}
+
+
+def index_kind(index) -> str:
+    """INDEX_TYPES name of a built FAISS index"""
+    if isinstance(index, faiss.IndexHNSW):
+        return 'hnsw'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'pq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivf'
+    return 'flat'
+
+
+def effective_type(index_type: str, count: int, params: Dict) -> str:
+    """Index type actually built for count vectors"""
+    if index_type in ('ivf', 'pq') and count < max(params['min_train'], 2 ** params['pq_bits']):
+        return 'flat'
+    return index_type
+
+
+def _pq_subquantizers(dim: int, wanted: int) -> int:
+    """Largest divisor of dim not above wanted"""
+    return max(m for m in range(1, min(wanted, dim) + 1) if dim % m == 0)
+
+
+def build_index(vectors: np.ndarray, index_type: str = 'flat', params: Optional[Dict] = None):
+    """Train (where needed) and fill a FAISS index with L2 distances.
+
+    Returns an empty IndexFlatL2 for an empty vector matrix.
+    """
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"index_type must be one of {INDEX_TYPES}, got {index_type!r}")
+    params = resolve_params(params)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    count, dim = vectors.shape
+    index_type = effective_type(index_type, count, params)
+
+    if index_type == 'hnsw':
+        index = faiss.IndexHNSWFlat(dim, params['hnsw_m'])
+        index.hnsw.efConstruction = params['ef_construction']
+    elif index_type in ('ivf', 'pq'):
+        nlist = max(1, min(params['nlist'], int(4 * math.sqrt(count))))
+        quantizer = faiss.IndexFlatL2(dim)
+        if index_type == 'ivf':
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_subquantizers(dim, params['pq_m']),
+                                     params['pq_bits'])
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dim)
+
+    if count:
+        index.add(vectors)
+    configure_search(index, params)
+    return index
+
+
+def configure_search(index, params: Optional[Dict] = None):
+    """Apply query-time parameters, which are not all persisted with the index"""
+    params = resolve_params(params)
+    kind = index_kind(index)
+    if kind == 'hnsw':
+        index.hnsw.efSearch = params['ef_search']
+    elif kind in ('ivf', 'pq'):
+        index.nprobe = min(params['nprobe'], index.nlist)
+
+
+def supports_removal(index) -> bool:
+    """Whether LangChain's FAISS.delete is safe: it assumes removal renumbers
+    the remaining vectors, which only flat indexes do
+    """
+    return index_kind(index) == 'flat'
+
+
+def reconstruct_all(index) -> np.ndarray:
+    """Stored vectors in index order; exact except for PQ, which decodes its codes"""
+    if index_kind(index) in ('ivf', 'pq'):
+        index.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def refill(index, vectors: np.ndarray, params: Optional[Dict] = None):
+    """Copy of a trained index holding only vectors, reusing its training"""
+    refilled = faiss.clone_index(index)
+    refilled.reset()
+    if len(vectors):
+        refilled.add(np.ascontiguousarray(vectors, dtype=np.float32))
+    configure_search(refilled, params)
+    return refilled
+
+
+def index_bytes(index) -> int:
+    """Serialized size of an index, a proxy for its memory footprint"""
+    return int(faiss.serialize_index(index).nbytes)